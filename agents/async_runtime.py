@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+from agents import llm_registry
+from agents.guardian import AsyncGuardianAgent
+from agents.message_pool import MessagePool
+from agents.mission_planner import AsyncMissionPlannerAgent
+from agents.navigator import AsyncNavigatorAgent
+from agents.vision_agent import AsyncVisionAgent
+
+
+def _any(msg):
+    return True
+
+
+class AsyncMessagePool:
+    """
+    asyncio front-end over a MessagePool.
+
+    Storage, retention and journaling stay in the wrapped pool; this class adds
+    awaitable subscribe()/post(). Waiters are woken through a pool listener, so
+    posts coming from worker threads (e.g. LangChain running a sync tool in an
+    executor) wake coroutines on the loop as well.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else MessagePool()
+        self.loop = None
+        # msg_type -> set of asyncio.Event of coroutines blocked in subscribe()
+        self.waiters = {}
+        self.pool.add_listener(self._on_change)
+
+    def _on_change(self, msg_type):
+        if self.loop is not None and self.waiters.get(msg_type):
+            self.loop.call_soon_threadsafe(self._wake, msg_type)
+
+    def _wake(self, msg_type):
+        for event in self.waiters.get(msg_type, ()):
+            event.set()
+
+    def build_message(self, msg_type, content):
+        return self.pool.build_message(msg_type, content)
+
+    async def post(self, message):
+        return self.pool.post(message)
+
+    def post_nowait(self, message):
+        return self.pool.post(message)
+
+    async def subscribe(self, msg_types, predicate=None, timeout=None):
+        """Awaitable MessagePool.subscribe()."""
+        if isinstance(msg_types, str):
+            msg_types = (msg_types,)
+        self.loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        event = asyncio.Event()
+        for msg_type in msg_types:
+            self.waiters.setdefault(msg_type, set()).add(event)
+        try:
+            while True:
+                # Clear before looking so a post racing with the check is not lost
+                event.clear()
+                matched = self.pool.find(predicate or _any, msg_types)
+                if matched:
+                    return matched
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return []
+        finally:
+            for msg_type in msg_types:
+                self.waiters[msg_type].discard(event)
+
+    def get(self, msg_id):
+        return self.pool.get(msg_id)
+
+    def get_all(self):
+        return self.pool.get_all()
+
+    def get_type(self, msg_type):
+        return self.pool.get_type(msg_type)
+
+    def find(self, predicate, msg_types=None):
+        return self.pool.find(predicate, msg_types)
+
+    def update(self, msg_id, **changes):
+        return self.pool.update(msg_id, **changes)
+
+    def mark_executed(self, msg_id):
+        return self.pool.mark_executed(msg_id)
+
+    def remove_type(self, msg_type):
+        return self.pool.remove_type(msg_type)
+
+    def remove_message(self, message):
+        return self.pool.remove_message(message)
+
+    def clear(self):
+        return self.pool.clear()
+
+    def compact(self):
+        return self.pool.compact()
+
+    def stats(self):
+        return self.pool.stats()
+
+    def history(self):
+        return self.pool.history()
+
+    def __len__(self):
+        return len(self.pool)
+
+
+async def run_agents(pool, pipelined=False, plan_cache=None, streaming=False, warm_llm=False,
+                     speculative=False, frame_cache=None, frame_settings=None,
+                     local_perception=None, prefetch=None):
+    """Run Guardian, Navigator, Vision and the interactive MissionPlanner on one event loop."""
+    message_pool = AsyncMessagePool(pool)
+    tasks = [
+        AsyncGuardianAgent(message_pool).start(),
+        AsyncNavigatorAgent(message_pool, pipelined=pipelined, speculative=speculative).start(),
+        AsyncVisionAgent(message_pool, frame_cache=frame_cache, frame_settings=frame_settings,
+                         local_perception=local_perception, prefetch=prefetch).start(),
+    ]
+    if warm_llm:
+        tasks.append(asyncio.create_task(llm_registry.awarm_up()))
+    await asyncio.sleep(1)
+    try:
+        await AsyncMissionPlannerAgent(message_pool, plan_cache=plan_cache, streaming=streaming).run()
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,109 @@
+import collections
+import threading
+import time
+
+from agents.ttl_cache import TTLCache
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = np = None
+
+# Upper bounds of the nearest-distance histogram reported by FrameCache.stats()
+DISTANCE_BUCKETS = (0, 2, 4, 6, 8, 12, 16, 24, 32, 64)
+
+
+def opencv_available():
+    return cv2 is not None
+
+
+def difference_hash(frame, hash_size=8):
+    """
+    dHash of a JPEG frame: ``hash_size`` rows of left-right brightness steps
+    in the downsampled grayscale image, as an int of hash_size² bits. None
+    when the frame cannot be decoded or OpenCV is not installed.
+    """
+    if cv2 is None:
+        return None
+    # Decoding at 1/4 resolution is several times cheaper and loses nothing at 9x8
+    image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class FrameCache:
+    """
+    Scene descriptions of recent camera frames, keyed by difference hash.
+
+    lookup() returns the description of the closest stored frame if it is
+    within ``max_distance`` differing hash bits. Entries expire ``ttl``
+    seconds after the description was generated, however often they are
+    reused, so a hovering drone still gets a fresh description now and then.
+    stats() reports the hit rate, hashing and LLM time, and a histogram of
+    nearest distances for tuning max_distance.
+    """
+
+    def __init__(self, max_distance=8, ttl=5.0, maxsize=16, hash_size=8):
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.distances = collections.Counter()
+        self.hash_seconds = 0.0
+        self.llm_seconds = 0.0
+
+    def hash(self, frame):
+        start = time.perf_counter()
+        frame_hash = difference_hash(frame, self.hash_size)
+        with self.lock:
+            self.hash_seconds += time.perf_counter() - start
+            self.counters["hashed" if frame_hash is not None else "unhashed"] += 1
+        return frame_hash
+
+    def lookup(self, frame_hash):
+        """Return (description or None, distance to the closest live frame or None)."""
+        if frame_hash is None:
+            return None, None
+        nearest = min(((hamming(frame_hash, key), description) for key, description in self.entries.items()),
+                      key=lambda entry: entry[0], default=(None, None))
+        distance, description = nearest
+        with self.lock:
+            if distance is not None:
+                bucket = next((b for b in DISTANCE_BUCKETS if distance <= b), DISTANCE_BUCKETS[-1])
+                self.distances[bucket] += 1
+            if distance is not None and distance <= self.max_distance:
+                self.counters["hits"] += 1
+                return description, distance
+            self.counters["misses"] += 1
+        return None, distance
+
+    def store(self, frame_hash, description, llm_seconds=0.0):
+        """Remember the description of a frame the LLM took ``llm_seconds`` to describe."""
+        with self.lock:
+            self.llm_seconds += llm_seconds
+            self.counters["described"] += 1
+        if frame_hash is not None:
+            self.entries.put(frame_hash, description)
+
+    def stats(self):
+        with self.lock:
+            stats = {"hits": 0, "misses": 0, "described": 0, "hashed": 0, "unhashed": 0}
+            stats.update(self.counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["mean_hash_ms"] = self.hash_seconds / stats["hashed"] * 1000 if stats["hashed"] else 0.0
+            mean_llm = self.llm_seconds / stats["described"] if stats["described"] else 0.0
+            stats["mean_llm_latency"] = mean_llm
+            stats["latency_saved"] = stats["hits"] * mean_llm
+            stats["nearest_distance"] = {f"<={bucket}": self.distances[bucket] for bucket in DISTANCE_BUCKETS}
+            stats["size"] = len(self.entries)
+            return stats
@@ -0,0 +1,136 @@
+import math
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = np = None
+
+DETAIL_LEVELS = ("auto", "low", "high")
+# Where FrameSettings are applied: re-encoded by VisionAgent, or requested from /camera_image
+PREPARE_ON = ("agent", "backend")
+
+
+def parse_roi(spec):
+    """(x0, y0, x1, y1) fractions of the frame from "x0,y0,x1,y1"."""
+    roi = tuple(float(value) for value in spec.split(","))
+    if len(roi) != 4 or not (0 <= roi[0] < roi[2] <= 1 and 0 <= roi[1] < roi[3] <= 1):
+        raise ValueError(f"ROI must be x0,y0,x1,y1 fractions with x0 < x1 and y0 < y1, got {spec!r}")
+    return roi
+
+
+class FrameSettings:
+    """
+    How a camera frame is prepared before it is sent to the vision LLM.
+
+    The frame is cropped to ``roi`` (fractions of the frame), converted to
+    grayscale, scaled down to fit ``max_width`` x ``max_height`` (never up)
+    and re-encoded at JPEG ``quality``. ``detail`` is the OpenAI image detail
+    level; "low" is billed as a fixed 85 tokens whatever the resolution.
+    With ``prepare_on="backend"`` the settings are sent to /camera_image as
+    query parameters and the backend encodes the frame only once.
+    The defaults leave the frame as the camera sent it.
+    """
+
+    def __init__(self, max_width=None, max_height=None, quality=None, roi=None, grayscale=False,
+                 detail="auto", prepare_on="agent"):
+        if detail not in DETAIL_LEVELS:
+            raise ValueError(f"detail must be one of {DETAIL_LEVELS}, got {detail!r}")
+        if prepare_on not in PREPARE_ON:
+            raise ValueError(f"prepare_on must be one of {PREPARE_ON}, got {prepare_on!r}")
+        if quality is not None and not 1 <= quality <= 100:
+            raise ValueError(f"JPEG quality must be within 1-100, got {quality}")
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.roi = parse_roi(roi) if isinstance(roi, str) else roi
+        self.grayscale = grayscale
+        self.detail = detail
+        self.prepare_on = prepare_on
+
+    def changes_frame(self):
+        return bool(self.max_width or self.max_height or self.quality or self.roi or self.grayscale)
+
+    def query(self):
+        """/camera_image query parameters asking the backend for the prepared frame."""
+        params = {}
+        if self.max_width:
+            params["width"] = self.max_width
+        if self.max_height:
+            params["height"] = self.max_height
+        if self.quality:
+            params["quality"] = self.quality
+        if self.roi:
+            params["roi"] = ",".join(f"{value:g}" for value in self.roi)
+        if self.grayscale:
+            params["gray"] = 1
+        return params
+
+    def __repr__(self):
+        options = ", ".join(f"{key}={value!r}" for key, value in vars(self).items())
+        return f"FrameSettings({options})"
+
+
+def prepare_image(image, settings):
+    """Crop, grayscale and downscale a decoded BGR/grayscale image."""
+    if settings.roi:
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = settings.roi
+        image = image[int(y0 * height):max(int(y1 * height), int(y0 * height) + 1),
+                      int(x0 * width):max(int(x1 * width), int(x0 * width) + 1)]
+    if settings.grayscale and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = image.shape[:2]
+    scale = min(settings.max_width / width if settings.max_width else 1.0,
+                settings.max_height / height if settings.max_height else 1.0)
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def prepare_frame(frame, settings):
+    """
+    JPEG ``frame`` prepared according to ``settings``. The frame is returned
+    unchanged when the settings do not change it, OpenCV is not installed or
+    the frame cannot be decoded.
+    """
+    if cv2 is None or not settings.changes_frame():
+        return frame
+    image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return frame
+    image = prepare_image(image, settings)
+    params = [cv2.IMWRITE_JPEG_QUALITY, settings.quality] if settings.quality else []
+    ok, jpeg = cv2.imencode(".jpg", image, params)
+    return jpeg.tobytes() if ok else frame
+
+
+def frame_size(frame):
+    """(width, height) from the start-of-frame segment of a JPEG, or None."""
+    i = 2
+    while i + 9 < len(frame):
+        if frame[i] != 0xFF:
+            return None
+        marker = frame[i + 1]
+        # SOFn markers; C4, C8 and CC share the range but are not frame headers
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return int.from_bytes(frame[i + 7:i + 9], "big"), int.from_bytes(frame[i + 5:i + 7], "big")
+        i += 2 + int.from_bytes(frame[i + 2:i + 4], "big")
+    return None
+
+
+def image_tokens(width, height, detail="auto"):
+    """
+    Input tokens OpenAI bills for a ``width`` x ``height`` image: 85 at
+    "low" detail, otherwise 85 plus 170 per 512px tile after the image is
+    fitted into 2048x2048 and its short side scaled down to 768.
+    """
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
@@ -1,21 +1,133 @@
-from langchain_community.chat_models import ChatOpenAI
 from langchain_core.messages import HumanMessage
+import asyncio
+import hashlib
 import threading
 import time
 from tools import drone_tools
+from agents.ttl_cache import TTLCache
+from agents.guardian_rules import GuardianRules
+from agents.json_stream import entry_number, json_from_llm
+from agents import llm_metrics
+from agents.llm_registry import get_llm
+from agents.llm_scheduler import scheduled
 import copy
 
+# Pool message with the rules' tracked state, see GuardianAgent.save_rules()
+RULES_STATE_TYPE = "guardian_rules_state"
+
+
+def _pending_action(msg):
+    return not msg["content"].get("executed")
+
+
+def _position(telemetry):
+    """(north, east, down) from a /telemetry answer, or None."""
+    try:
+        return tuple(float(telemetry[axis]) for axis in ("north", "east", "down"))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _normalize_parameters(parameters):
+    if isinstance(parameters, (list, tuple)):
+        return tuple(_normalize_parameters(p) for p in parameters)
+    try:
+        return round(float(parameters), 2)
+    except (TypeError, ValueError):
+        return parameters if parameters is None else str(parameters)
+
+
 class GuardianAgent:
-    def __init__(self, message_pool=None):
+    def __init__(self, message_pool=None, cache_size=512, cache_ttl=600.0, rules=None, settle_time=2.0):
+        """
+        Only 'OK' verdicts are cached, for ``cache_ttl`` seconds; cache_size=0
+        turns the validation cache off. ``rules`` (agents.guardian_rules) are
+        checked before the cache and the LLM. After each executed action the
+        Guardian waits ``settle_time`` seconds for the drone to carry it out.
+        """
         self.message_pool = message_pool
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.2,
-            max_tokens=300,
-        )
+        self.llm = scheduled(get_llm("gpt-4o-mini", temperature=0.2, max_tokens=300), "guardian")
+        self.callbacks = llm_metrics.callbacks("guardian")
+        self.validation_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.rules = rules if rules is not None else GuardianRules()
+        self.settle_time = settle_time
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        # validation_key -> verdict fetched ahead of time by a batched request
+        self.batch_verdicts = {}
+        self.rules_state_id = None
 
-    def validate(self, mission_step, planned_action, vision_context=None, parameters=None):
-        prompt = f"""
+    def restore_rules(self, telemetry):
+        """
+        Bring the rules' tracked state up to date after a restart (e.g. a
+        resumed --journal): from ``telemetry`` when the backend answered,
+        otherwise from the last guardian_rules_state message save_rules()
+        left in the pool. Validations are no help here: compaction archives
+        them and the archive is not journaled.
+        """
+        saved = self.message_pool.get_type(RULES_STATE_TYPE)
+        if saved:
+            self.rules_state_id = saved[-1]["id"]
+        position = _position(telemetry)
+        if position is not None:
+            self.rules.seed(*position)
+        elif saved:
+            self.rules.load_state(saved[-1]["content"])
+        if self.rules.airborne:
+            print(f"[GUARDIAN] Drone is airborne at {self.rules.altitude:.1f} m "
+                  f"({'telemetry' if position is not None else 'saved rules state'})")
+
+    def save_rules(self):
+        """Keep the rules' tracked state in the pool, and so in its journal, for restore_rules()."""
+        msg = self.message_pool.build_message(RULES_STATE_TYPE, self.rules.state())
+        # Replace the previous state rather than piling them up in the pool
+        if self.rules_state_id is not None:
+            msg["id"] = self.rules_state_id
+        self.rules_state_id = self.message_pool.post(msg)
+
+    def record_action(self, action, parameters):
+        self.rules.record(action, parameters)
+        self.save_rules()
+
+    def local_validation(self, mission_step, planned_action, parameters=None):
+        verdict = self.rules.check(mission_step, planned_action, parameters)
+        if verdict is not None:
+            stats = self.decision_stats()
+            print(f"[GUARDIAN] Decided locally by rules ({stats['local_share']:.0%} of decisions so far, "
+                  f"~{stats['latency_saved']:.1f}s of LLM time saved)")
+        return verdict
+
+    def decision_stats(self):
+        local = self.rules.stats["approved"] + self.rules.stats["rejected"]
+        total = local + self.rules.stats["deferred"]
+        mean_llm = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+        return {
+            "local": local,
+            "llm": self.llm_calls,
+            "local_share": local / total if total else 0.0,
+            "mean_llm_latency": mean_llm,
+            "latency_saved": local * mean_llm,
+        }
+
+    def validation_key(self, mission_step, planned_action, vision_context=None, parameters=None):
+        step = mission_step.get("cel") if isinstance(mission_step, dict) else mission_step
+        step = " ".join(str(step).lower().split())
+        vision_digest = hashlib.sha1(str(vision_context).encode("utf-8")).hexdigest()
+        return (step, planned_action, _normalize_parameters(parameters), vision_digest)
+
+    def cached_validation(self, key):
+        validation = self.validation_cache.get(key)
+        if validation is not None:
+            stats = self.validation_cache.stats()
+            print(f"[GUARDIAN] Validation cache hit ({stats['hits']} hits / {stats['misses']} misses)")
+        return validation
+
+    def remember_validation(self, key, validation):
+        if validation == "OK":
+            self.validation_cache.put(key, validation)
+
+    def validation_prompt(self, mission_step, planned_action, vision_context=None, parameters=None):
+        return f"""
             Jesteś agentem Guardian. Twoim zadaniem jest sprawdzić, czy planowana akcja nawigatora jest logiczna i poprawna względem kroku misji.
             Sprawdź, czy planowana akcja jest zgodna z kontekstem wizyjnym i czy nie narusza zasad bezpieczeństwa.
 
@@ -33,64 +145,272 @@ class GuardianAgent:
 
             Odpowiedz tylko 'OK' jeśli akcja jest logiczna i poprawna w danym kontekście wizyjnym. Jeśli nie, napisz krótko dlaczego odrzucasz akcję.
             """
+
+    def group_actions(self, messages):
+        """Split pending drone_action messages by mission, keeping posting order."""
+        groups = {}
+        for msg in messages:
+            content = msg["content"]
+            step = content.get("step")
+            mission = content.get("mission_id")
+            if mission is None:
+                mission = ("step", step.get("id") if isinstance(step, dict) else str(step))
+            groups.setdefault(mission, []).append(msg)
+        return list(groups.values())
+
+    def batch_candidates(self, messages):
+        """
+        The actions of one group that will have to go to the LLM. Rules are
+        evaluated on a copy of the tracked state, assuming every earlier
+        action of the group gets approved and executed.
+        """
+        simulated = copy.copy(self.rules)
+        items = {}
+        for msg in messages:
+            content = msg["content"]
+            action = content.get("action")
+            parameters = content.get("parameters")
+            verdict = simulated.evaluate(content.get("step"), action, parameters)
+            if verdict is None:
+                key = self.validation_key(content.get("step"), action, content.get("vision_context"), parameters)
+                if key not in self.validation_cache and key not in self.batch_verdicts:
+                    items.setdefault(key, content)
+            if verdict is None or verdict == "OK":
+                simulated.record(action, parameters)
+        return list(items.items())
+
+    def batch_prompt(self, items):
+        actions = "\n".join(
+            f"            {nr}. Krok misji: {content.get('step')} | "
+            f"Kontekst wizyjny: {content.get('vision_context')} | "
+            f"Planowana akcja: {content.get('action')} | "
+            f"Parametry: {content.get('parameters') if content.get('parameters') else 'Brak parametrów'}"
+            for nr, (_, content) in enumerate(items, start=1)
+        )
+        return f"""
+            Jesteś agentem Guardian. Twoim zadaniem jest sprawdzić, czy planowane akcje nawigatora są logiczne i poprawne względem kroków misji.
+            Dla każdej akcji sprawdź, czy jest zgodna z kontekstem wizyjnym i czy nie narusza zasad bezpieczeństwa.
+            Akcje są wykonywane po kolei, w podanej kolejności.
+
+            Planowane akcje:
+{actions}
+
+            Zwróć wynik w postaci listy JSON z jednym elementem dla każdej akcji. Pole "werdykt" ma zawierać tylko 'OK'
+            jeśli akcja jest logiczna i poprawna w danym kontekście wizyjnym, a jeśli nie - krótkie uzasadnienie odrzucenia.
+
+            Przykład formatu:
+            [
+            {{ "nr": 1, "werdykt": "OK" }},
+            {{ "nr": 2, "werdykt": "Przed dronem jest przeszkoda" }}
+            ]
+            """
+
+    def store_batch_verdicts(self, items, content):
+        try:
+            verdicts = json_from_llm(content)
+            for entry in verdicts:
+                nr = entry_number(entry, len(items))
+                if nr is None:
+                    # Python would take nr=0 or -1 as the last action; leave it to a request of its own
+                    print(f"[GUARDIAN] Ignoring batch verdict with a bad number: {entry}")
+                    continue
+                key, _ = items[nr - 1]
+                self.batch_verdicts[key] = str(entry["werdykt"]).strip()
+        except Exception as e:
+            # Actions without a verdict fall back to one request each
+            print(f"[GUARDIAN] Could not parse batch validation ({e}), validating one by one")
+
+    def prefetch_verdicts(self, messages):
+        for group in self.group_actions(messages):
+            items = self.batch_candidates(group)
+            if len(items) < 2:
+                continue
+            print(f"[GUARDIAN] Validating {len(items)} actions in one request")
+            start = time.perf_counter()
+            response = self.llm.invoke([HumanMessage(content=self.batch_prompt(items))],
+                                       config={"callbacks": self.callbacks})
+            self.llm_calls += 1
+            self.llm_seconds += time.perf_counter() - start
+            self.store_batch_verdicts(items, response.content)
+
+    def batched_validation(self, key):
+        verdict = self.batch_verdicts.pop(key, None)
+        if verdict is not None:
+            self.remember_validation(key, verdict)
+        return verdict
+
+    def validate(self, mission_step, planned_action, vision_context=None, parameters=None):
+        verdict = self.local_validation(mission_step, planned_action, parameters)
+        if verdict is not None:
+            return verdict
+        key = self.validation_key(mission_step, planned_action, vision_context, parameters)
+        cached = self.cached_validation(key)
+        if cached is not None:
+            return cached
+        batched = self.batched_validation(key)
+        if batched is not None:
+            return batched
+        prompt = self.validation_prompt(mission_step, planned_action, vision_context, parameters)
         message = HumanMessage(content=prompt)
-        response = self.llm.invoke([message])
-        return response.content.strip()
+        start = time.perf_counter()
+        response = self.llm.invoke([message], config={"callbacks": self.callbacks})
+        self.llm_calls += 1
+        self.llm_seconds += time.perf_counter() - start
+        validation = response.content.strip()
+        self.remember_validation(key, validation)
+        return validation
 
     def execute_action(self, action, parameters=None):
+        """Run an approved action on the drone; True when the backend accepted it."""
         if action == "takeoff":
-            drone_tools.takeoff(parameters)
-            print(f"[GUARDIAN] Drone action '{action}' executed with parameters: {parameters}")
+            reply = drone_tools.takeoff(parameters)
         elif action == "fly_to":
-            drone_tools.fly_to(parameters)
-            print(f"[GUARDIAN] Drone action '{action}' executed with parameters: {parameters}")
+            reply = drone_tools.fly_to(parameters)
         elif action == "land":
-            drone_tools.land()
-            print(f"[GUARDIAN] Drone action '{action}' executed with parameters: {parameters}")
+            reply = drone_tools.land()
         else:
             print(f"[GUARDIAN] Unknown action: {action}. No execution performed.")
-        time.sleep(2)
+            return False
+        if not drone_tools.succeeded(reply):
+            print(f"[GUARDIAN] Drone action '{action}' failed: {reply}")
+            return False
+        print(f"[GUARDIAN] Drone action '{action}' executed with parameters: {parameters}")
+        time.sleep(self.settle_time)
+        return True
+
+    def validation_message(self, msg, validation):
+        step = msg["content"].get("step")
+        action = msg["content"].get("action")
+        parameters = msg["content"].get("parameters", None)
+        if validation != "OK":
+            print(f"[GUARDIAN] Guardian validation failed for step '{step['cel']}': {validation}")
+        else:
+            print(f"[GUARDIAN] Guardian validation passed for step '{step['cel']}'")
+        return self.message_pool.build_message(
+            "guardian_validation",
+            {"action_id": msg["id"],
+            "mission_id": msg["content"].get("mission_id"),
+            "step": step,
+            "action": action,
+            "parameters": parameters,
+            "validation": validation,
+            "logged": False}
+        )
+
     def read_messages(self):
+        self.restore_rules(drone_tools.telemetry())
         while True:
-            messages = self.message_pool.get_all()
+            messages = self.message_pool.subscribe("drone_action", _pending_action)
+            self.prefetch_verdicts(messages)
             for msg in messages:
-                if msg["msg_type"] == "drone_action" and not msg["content"].get("executed"):
+                if _pending_action(msg):
                     step = msg["content"].get("step")
                     action = msg["content"].get("action")
                     parameters = msg["content"].get("parameters", None)
                     vision_context = msg["content"].get("vision_context")
                     validation = self.validate(step, action, vision_context, parameters)
-                    if validation != "OK":
-                        print(f"[GUARDIAN] Guardian validation failed for step '{step['cel']}': {validation}")
-                        result_msg = self.message_pool.build_message(
-                            "guardian_validation",
-                            {"step": step,
-                            "action": action,
-                            "parameters": parameters,
-                            "validation": validation,
-                            "logged": False}
-                        )
-                    else:
-                        print(f"[GUARDIAN] Guardian validation passed for step '{step['cel']}'")
-                        self.execute_action(action, parameters)
-                        result_msg = self.message_pool.build_message(
-                            "guardian_validation",
-                            {"step": step,
-                            "action": action,
-                            "parameters": parameters,
-                            "validation": "OK",
-                            "logged": False}
-                        )
-                 
-                    modified_msg = msg.copy()
-                    modified_msg["content"]["executed"] = True
-
-                    self.message_pool.post(modified_msg)
+                    result_msg = self.validation_message(msg, validation)
+                    # The rules track what the drone did, not what it was asked to do
+                    if validation == "OK" and self.execute_action(action, parameters):
+                        self.record_action(action, parameters)
+
+                    self.message_pool.mark_executed(msg["id"])
                     self.message_pool.post(result_msg)
-                    self.message_pool.remove_message(msg)
-            time.sleep(1)
+            # Verdicts the rules made unnecessary must not answer a later action with the same key
+            self.batch_verdicts.clear()
 
     def start(self):
         guardian_thread = threading.Thread(target=self.read_messages, daemon=True)
         guardian_thread.start()
         print("[GUARDIAN] Guardian agent started and listening for planned actions...")
+
+
+class AsyncGuardianAgent(GuardianAgent):
+    """GuardianAgent for the asyncio runtime (agents.async_runtime)."""
+
+    async def save_rules(self):
+        msg = self.message_pool.build_message(RULES_STATE_TYPE, self.rules.state())
+        if self.rules_state_id is not None:
+            msg["id"] = self.rules_state_id
+        self.rules_state_id = await self.message_pool.post(msg)
+
+    async def record_action(self, action, parameters):
+        self.rules.record(action, parameters)
+        await self.save_rules()
+
+    async def prefetch_verdicts(self, messages):
+        for group in self.group_actions(messages):
+            items = self.batch_candidates(group)
+            if len(items) < 2:
+                continue
+            print(f"[GUARDIAN] Validating {len(items)} actions in one request")
+            start = time.perf_counter()
+            response = await self.llm.ainvoke([HumanMessage(content=self.batch_prompt(items))],
+                                              config={"callbacks": self.callbacks})
+            self.llm_calls += 1
+            self.llm_seconds += time.perf_counter() - start
+            self.store_batch_verdicts(items, response.content)
+
+    async def validate(self, mission_step, planned_action, vision_context=None, parameters=None):
+        verdict = self.local_validation(mission_step, planned_action, parameters)
+        if verdict is not None:
+            return verdict
+        key = self.validation_key(mission_step, planned_action, vision_context, parameters)
+        cached = self.cached_validation(key)
+        if cached is not None:
+            return cached
+        batched = self.batched_validation(key)
+        if batched is not None:
+            return batched
+        prompt = self.validation_prompt(mission_step, planned_action, vision_context, parameters)
+        start = time.perf_counter()
+        response = await self.llm.ainvoke([HumanMessage(content=prompt)], config={"callbacks": self.callbacks})
+        self.llm_calls += 1
+        self.llm_seconds += time.perf_counter() - start
+        validation = response.content.strip()
+        self.remember_validation(key, validation)
+        return validation
+
+    async def execute_action(self, action, parameters=None):
+        if action == "takeoff":
+            reply = await drone_tools.atakeoff(parameters)
+        elif action == "fly_to":
+            reply = await drone_tools.afly_to(parameters)
+        elif action == "land":
+            reply = await drone_tools.aland()
+        else:
+            print(f"[GUARDIAN] Unknown action: {action}. No execution performed.")
+            return False
+        if not drone_tools.succeeded(reply):
+            print(f"[GUARDIAN] Drone action '{action}' failed: {reply}")
+            return False
+        print(f"[GUARDIAN] Drone action '{action}' executed with parameters: {parameters}")
+        await asyncio.sleep(self.settle_time)
+        return True
+
+    async def read_messages(self):
+        self.restore_rules(await drone_tools.atelemetry())
+        while True:
+            messages = await self.message_pool.subscribe("drone_action", _pending_action)
+            await self.prefetch_verdicts(messages)
+            for msg in messages:
+                if _pending_action(msg):
+                    step = msg["content"].get("step")
+                    action = msg["content"].get("action")
+                    parameters = msg["content"].get("parameters", None)
+                    vision_context = msg["content"].get("vision_context")
+                    validation = await self.validate(step, action, vision_context, parameters)
+                    result_msg = self.validation_message(msg, validation)
+                    # The rules track what the drone did, not what it was asked to do
+                    if validation == "OK" and await self.execute_action(action, parameters):
+                        await self.record_action(action, parameters)
+
+                    self.message_pool.mark_executed(msg["id"])
+                    await self.message_pool.post(result_msg)
+            # Verdicts the rules made unnecessary must not answer a later action with the same key
+            self.batch_verdicts.clear()
+
+    def start(self):
+        task = asyncio.get_running_loop().create_task(self.read_messages())
+        print("[GUARDIAN] Guardian agent started and listening for planned actions...")
+        return task
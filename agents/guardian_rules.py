@@ -0,0 +1,135 @@
+import collections
+import math
+
+# Words that make a mission step depend on what the camera sees
+CONDITION_WORDS = ("jeśli", "jezeli", "jeżeli", "jesli", "gdy", "kiedy", "o ile", "if ")
+# Above this altitude (m) telemetry counts the drone as airborne, see seed()
+AIRBORNE_ALTITUDE = 0.3
+
+
+def _step_text(mission_step):
+    step = mission_step.get("cel") if isinstance(mission_step, dict) else mission_step
+    return str(step or "").lower()
+
+
+def _as_vector(parameters):
+    if isinstance(parameters, str):
+        parameters = parameters.replace(",", " ").split()
+    if isinstance(parameters, dict):
+        parameters = [parameters.get("north"), parameters.get("east"), parameters.get("down")]
+    try:
+        north, east, down = (float(p) for p in parameters)
+    except (TypeError, ValueError):
+        return None
+    if not all(math.isfinite(p) for p in (north, east, down)):
+        return None
+    return north, east, down
+
+
+class GuardianRules:
+    """
+    Deterministic checks run by the Guardian before asking the LLM.
+
+    check() returns 'OK', a rejection reason, or None when the answer depends
+    on the scene and the LLM has to decide. Position is tracked in the NED
+    frame relative to the takeoff point from the actions the Guardian
+    actually executed (see record()).
+    """
+
+    def __init__(self, min_altitude=0.5, max_altitude=120.0, max_step_distance=50.0,
+                 max_displacement=200.0, require_takeoff=True, approve_locally=("takeoff", "land")):
+        self.min_altitude = min_altitude
+        self.max_altitude = max_altitude
+        self.max_step_distance = max_step_distance
+        self.max_displacement = max_displacement
+        self.require_takeoff = require_takeoff
+        self.approve_locally = tuple(approve_locally)
+
+        self.airborne = False
+        self.north = self.east = self.altitude = 0.0
+        self.stats = collections.Counter()
+
+    def check(self, mission_step, action, parameters=None):
+        verdict = self.evaluate(mission_step, action, parameters)
+        if verdict is None:
+            self.stats["deferred"] += 1
+        elif verdict == "OK":
+            self.stats["approved"] += 1
+        else:
+            self.stats["rejected"] += 1
+        return verdict
+
+    def evaluate(self, mission_step, action, parameters=None):
+        """Like check() but without counting the decision."""
+        conditional = any(word in _step_text(mission_step) for word in CONDITION_WORDS)
+
+        if action == "takeoff":
+            try:
+                altitude = float(parameters if parameters is not None else 2.0)
+            except (TypeError, ValueError):
+                return f"Niepoprawna wysokość startu: {parameters}."
+            if not math.isfinite(altitude):
+                return f"Niepoprawna wysokość startu: {parameters}."
+            if altitude < self.min_altitude:
+                return f"Wysokość startu {altitude} m jest mniejsza niż minimum {self.min_altitude} m."
+            if altitude > self.max_altitude:
+                return f"Wysokość startu {altitude} m przekracza limit {self.max_altitude} m."
+            if self.airborne and self.require_takeoff:
+                return "Dron jest już w powietrzu, ponowny start jest niedozwolony."
+            return "OK" if "takeoff" in self.approve_locally and not conditional else None
+
+        if action == "fly_to":
+            vector = _as_vector(parameters)
+            if vector is None:
+                return f"Niepoprawne parametry lotu: {parameters}. Oczekiwano [north, east, down]."
+            if not self.airborne and self.require_takeoff:
+                return "Dron nie wystartował, lot jest niemożliwy przed startem."
+            north, east, down = vector
+            distance = math.sqrt(north ** 2 + east ** 2 + down ** 2)
+            if distance > self.max_step_distance:
+                return f"Pojedynczy ruch {distance:.1f} m przekracza limit {self.max_step_distance} m."
+            altitude = self.altitude - down
+            if self.airborne and altitude <= 0:
+                return f"Ruch sprowadziłby drona na wysokość {altitude:.1f} m, czyli pod ziemię."
+            if altitude > self.max_altitude:
+                return f"Ruch wyniósłby drona na {altitude:.1f} m, powyżej limitu {self.max_altitude} m."
+            displacement = math.hypot(self.north + north, self.east + east)
+            if displacement > self.max_displacement:
+                return f"Dron oddaliłby się o {displacement:.1f} m od miejsca startu, limit to {self.max_displacement} m."
+            return "OK" if "fly_to" in self.approve_locally and not conditional else None
+
+        if action == "land":
+            if not self.airborne and self.require_takeoff:
+                return "Dron nie jest w powietrzu, lądowanie jest niemożliwe."
+            return "OK" if "land" in self.approve_locally and not conditional else None
+
+        return f"Nieznana akcja: {action}."
+
+    def seed(self, north, east, down):
+        """Take the tracked state from telemetry (NED, relative to the takeoff point)."""
+        self.north, self.east, self.altitude = north, east, -down
+        self.airborne = self.altitude > AIRBORNE_ALTITUDE
+
+    def state(self):
+        """The tracked state as a JSON-serialisable dict, see load_state()."""
+        return {"airborne": self.airborne, "north": self.north, "east": self.east, "altitude": self.altitude}
+
+    def load_state(self, state):
+        self.airborne = bool(state["airborne"])
+        self.north, self.east, self.altitude = (float(state[key]) for key in ("north", "east", "altitude"))
+
+    def record(self, action, parameters=None):
+        """Update the tracked state after the Guardian executed an approved action."""
+        if action == "takeoff":
+            self.airborne = True
+            self.north = self.east = 0.0
+            self.altitude = float(parameters if parameters is not None else 2.0)
+        elif action == "fly_to":
+            vector = _as_vector(parameters)
+            if vector is not None:
+                self.north += vector[0]
+                self.east += vector[1]
+                self.altitude -= vector[2]
+        elif action == "land":
+            self.airborne = False
+            self.altitude = 0.0
@@ -0,0 +1,88 @@
+import json
+
+
+def json_from_llm(text):
+    """Parse a complete JSON answer, with or without a ```json fence around it."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.index("\n") + 1:] if "\n" in text else text
+    return json.loads(text)
+
+
+def entry_number(entry, count):
+    """The 1-based "nr" of an entry in a batched answer, or None unless it is within 1..``count``."""
+    try:
+        nr = int(entry["nr"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return nr if 1 <= nr <= count else None
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for a JSON array of objects arriving in chunks.
+
+    feed() returns the objects completed by the new chunk, so each plan step
+    can be used before the closing ``]`` arrives. Text before the array (e.g.
+    a ```json fence) is skipped; elements that are not objects are ignored.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.element = []
+        self.text = []
+
+    def feed(self, chunk):
+        self.text.append(chunk)
+        completed = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if char == "[":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.depth > 1:
+                self.element.append(char)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if self.depth == 1:
+                    self.element = [char]
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1:
+                    element = self._decode("".join(self.element))
+                    if isinstance(element, dict):
+                        completed.append(element)
+                    self.element = []
+                elif self.depth == 0:
+                    self.finished = True
+        return completed
+
+    def _decode(self, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def getvalue(self):
+        """Everything fed so far."""
+        return "".join(self.text)
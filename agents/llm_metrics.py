@@ -0,0 +1,210 @@
+import collections
+import http.server
+import json
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# USD per 1k (prompt, completion) tokens, used for the cost estimate only
+PRICES = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+def _price(model):
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their base model
+    for name in sorted(PRICES, key=len, reverse=True):
+        if model == name or model.startswith(f"{name}-"):
+            return PRICES[name]
+    return 0.0, 0.0
+
+
+def _token_usage(response):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+    return prompt, completion
+
+
+class LLMMetrics:
+    """
+    Per (agent, model) LLM call counts, latency histogram, tokens, cost and
+    errors, plus the time calls waited in agents.llm_scheduler.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = collections.defaultdict(self._new_series)
+
+    def _new_series(self):
+        return {"calls": 0, "errors": 0, "latency_sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+                "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                "queued": 0, "queue_sum": 0.0, "queue_max": 0.0}
+
+    def record(self, agent, model, latency, prompt_tokens=0, completion_tokens=0, error=False):
+        prompt_price, completion_price = _price(model)
+        with self.lock:
+            series = self.series[(agent, model)]
+            series["calls"] += 1
+            series["errors"] += error
+            series["latency_sum"] += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    series["buckets"][i] += 1
+            series["prompt_tokens"] += prompt_tokens
+            series["completion_tokens"] += completion_tokens
+            series["cost"] += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def record_queue(self, agent, model, waited):
+        with self.lock:
+            series = self.series[(agent, model)]
+            series["queued"] += 1
+            series["queue_sum"] += waited
+            series["queue_max"] = max(series["queue_max"], waited)
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                {"agent": agent, "model": model, **series,
+                 "mean_latency": series["latency_sum"] / series["calls"] if series["calls"] else 0.0,
+                 "mean_queue": series["queue_sum"] / series["queued"] if series["queued"] else 0.0,
+                 "buckets": dict(zip(map(str, LATENCY_BUCKETS), series["buckets"]))}
+                for (agent, model), series in sorted(self.series.items())
+            ]
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        counters = (
+            ("llm_calls_total", "calls", "LLM calls"),
+            ("llm_errors_total", "errors", "LLM calls that raised"),
+            ("llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens"),
+            ("llm_completion_tokens_total", "completion_tokens", "Completion tokens"),
+            ("llm_cost_usd_total", "cost", "Estimated cost in USD"),
+            ("llm_queue_seconds_total", "queue_sum", "Seconds LLM calls waited in the scheduler"),
+            ("llm_queued_total", "queued", "LLM calls admitted by the scheduler"),
+        )
+        snapshot = self.snapshot()
+        for name, field, help_text in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{agent="{s["agent"]}",model="{s["model"]}"}} {s[field]}' for s in snapshot]
+        lines += ["# HELP llm_latency_seconds LLM call latency", "# TYPE llm_latency_seconds histogram"]
+        for s in snapshot:
+            labels = f'agent="{s["agent"]}",model="{s["model"]}"'
+            for bound, count in s["buckets"].items():
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f'llm_latency_seconds_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"llm_latency_seconds_sum{{{labels}}} {s['latency_sum']}")
+            lines.append(f"llm_latency_seconds_count{{{labels}}} {s['calls']}")
+        lines += ["# HELP llm_queue_seconds_max Longest scheduler wait of an LLM call", "# TYPE llm_queue_seconds_max gauge"]
+        lines += [f'llm_queue_seconds_max{{agent="{s["agent"]}",model="{s["model"]}"}} {s["queue_max"]}' for s in snapshot]
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "series": self.snapshot()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+# Process-wide metrics every agent reports into
+metrics = LLMMetrics()
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """LangChain callback that times each LLM run of one agent and records it in ``metrics``."""
+
+    # Cheap enough to run on the event loop instead of an executor in async chains
+    run_inline = True
+
+    def __init__(self, agent, metrics=metrics):
+        self.agent = agent
+        self.metrics = metrics
+        self.runs = {}
+
+    def _start(self, run_id, serialized, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = (params.get("model") or params.get("model_name")
+                 or ((serialized or {}).get("kwargs") or {}).get("model_name") or "unknown")
+        self.runs[run_id] = (time.perf_counter(), model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, model = self.runs.pop(run_id, (None, "unknown"))
+        if start is None:
+            return
+        model = (response.llm_output or {}).get("model_name") or model
+        prompt_tokens, completion_tokens = _token_usage(response)
+        self.metrics.record(self.agent, model, time.perf_counter() - start, prompt_tokens, completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start, model = self.runs.pop(run_id, (None, "unknown"))
+        if start is not None:
+            self.metrics.record(self.agent, model, time.perf_counter() - start, error=True)
+
+
+def callbacks(agent):
+    """Callbacks to pass as ``config={"callbacks": ...}`` on an agent's LLM calls."""
+    return [MetricsCallback(agent)]
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="llm-metrics-http", daemon=True).start()
+    print(f"[LLM METRICS] Serving http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def start_snapshot_writer(path, interval=10.0):
+    """Write metrics.snapshot() to ``path`` as JSON every ``interval`` seconds."""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            metrics.write_json(path)
+        metrics.write_json(path)
+
+    threading.Thread(target=run, name="llm-metrics-json", daemon=True).start()
+    return stop
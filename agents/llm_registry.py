@@ -0,0 +1,199 @@
+import asyncio
+import collections
+import os
+import threading
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from agents.llm_replay import LLMFixture, RecordingChatModel, ReplayChatModel
+
+# One registry per process: agents in the same process share models and HTTP connections
+_lock = threading.Lock()
+_models = {}
+_http_clients = {}
+counters = collections.Counter()
+# Set by use_fixture(): None, "record" or "replay"
+_fixture_mode = None
+_fixture = None
+_replay_latency = None
+# Set by use_model_factory(): builds models instead of ChatOpenAI
+_model_factory = None
+
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120.0)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+def _trace(event_name, info):
+    if event_name == "connection.connect_tcp.complete":
+        counters["connections_opened"] += 1
+    elif event_name == "connection.start_tls.complete":
+        counters["tls_handshakes"] += 1
+
+
+async def _atrace(event_name, info):
+    _trace(event_name, info)
+
+
+def _on_request(request):
+    counters["http_requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+async def _aon_request(request):
+    counters["http_requests"] += 1
+    request.extensions["trace"] = _atrace
+
+
+def http_client():
+    """The process-wide httpx.Client every OpenAI model uses."""
+    with _lock:
+        if "sync" not in _http_clients:
+            counters["http_clients_created"] += 1
+            _http_clients["sync"] = httpx.Client(
+                limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, event_hooks={"request": [_on_request]})
+        return _http_clients["sync"]
+
+
+def http_async_client():
+    with _lock:
+        if "async" not in _http_clients:
+            counters["http_clients_created"] += 1
+            _http_clients["async"] = httpx.AsyncClient(
+                limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, event_hooks={"request": [_aon_request]})
+        return _http_clients["async"]
+
+
+def use_fixture(mode, path, latency=None, strict=False):
+    """
+    Make get_llm() "record" every LLM exchange to ``path`` or "replay" them
+    from it without network access (agents.llm_replay). ``latency`` applies
+    to replay: seconds per call, or "recorded". Call before agents are built.
+    """
+    global _fixture_mode, _fixture, _replay_latency
+    if mode not in ("record", "replay"):
+        raise ValueError(f"Unknown fixture mode: {mode}")
+    with _lock:
+        _models.clear()
+        _fixture_mode = mode
+        _fixture = LLMFixture(path, strict=strict)
+        _replay_latency = latency
+    print(f"[LLM REGISTRY] LLM calls {mode}ed {'to' if mode == 'record' else 'from'} {path}"
+          f"{f' ({len(_fixture)} recorded exchanges)' if mode == 'replay' else ''}")
+    return _fixture
+
+
+def use_model_factory(factory):
+    """
+    Build every model with ``factory(model, **options)`` instead of ChatOpenAI,
+    e.g. scripted models in benchmarks; None restores ChatOpenAI. Call before
+    agents are built.
+    """
+    global _model_factory
+    with _lock:
+        _models.clear()
+        _model_factory = factory
+
+
+def get_llm(model, temperature=None, max_tokens=None, **kwargs):
+    """
+    Long-lived ChatOpenAI for (model, temperature, max_tokens, kwargs).
+
+    The first call builds the model, later calls with the same configuration
+    return the same instance. All models share one sync and one async HTTP
+    connection pool. None leaves a setting at the model default.
+    """
+    key = (model, temperature, max_tokens, tuple(sorted(kwargs.items())))
+    with _lock:
+        llm = _models.get(key)
+        counters["lookups"] += 1
+    if llm is not None:
+        return llm
+
+    options = dict(kwargs)
+    if temperature is not None:
+        options["temperature"] = temperature
+    if max_tokens is not None:
+        options["max_tokens"] = max_tokens
+    if _model_factory is not None:
+        llm = _model_factory(model, **options)
+    elif _fixture_mode == "replay":
+        llm = ReplayChatModel(model_name=model, fixture=_fixture, latency=_replay_latency)
+    else:
+        # stream_usage makes streamed answers report token usage to the metrics callbacks
+        options.setdefault("stream_usage", True)
+        llm = ChatOpenAI(model=model, http_client=http_client(), http_async_client=http_async_client(), **options)
+        if _fixture_mode == "record":
+            llm = RecordingChatModel(model_name=model, inner=llm, fixture=_fixture)
+    with _lock:
+        # Another thread may have built the same model meanwhile; keep the first one
+        if key not in _models:
+            _models[key] = llm
+            counters["models_created"] += 1
+        return _models[key]
+
+
+def _warm_up_request():
+    base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+    headers = {}
+    if os.environ.get("OPENAI_API_KEY"):
+        headers["Authorization"] = f"Bearer {os.environ['OPENAI_API_KEY']}"
+    return f"{base_url}/models", headers
+
+
+def warm_up(connections=2):
+    """
+    Open ``connections`` keep-alive connections (TCP + TLS) to the API so the
+    first agent request does not pay for the handshake. Runs the requests in
+    parallel threads; failures are reported and otherwise ignored.
+    """
+    url, headers = _warm_up_request()
+    client = http_client()
+    warmed = []
+
+    def request():
+        try:
+            client.get(url, headers=headers)
+            warmed.append(url)
+        except httpx.HTTPError as e:
+            print(f"[LLM REGISTRY] Warm-up request failed: {e}")
+
+    threads = [threading.Thread(target=request, daemon=True) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counters["warmed"] += len(warmed)
+    print(f"[LLM REGISTRY] Warmed {len(warmed)} connection(s) to {url}")
+
+
+async def awarm_up(connections=2):
+    """warm_up() for the async connection pool; must run on the loop that will use it."""
+    url, headers = _warm_up_request()
+    client = http_async_client()
+
+    async def request():
+        try:
+            await client.get(url, headers=headers)
+            return True
+        except httpx.HTTPError as e:
+            print(f"[LLM REGISTRY] Warm-up request failed: {e}")
+            return False
+
+    warmed = sum(await asyncio.gather(*(request() for _ in range(connections))))
+    counters["warmed"] += warmed
+    print(f"[LLM REGISTRY] Warmed {warmed} connection(s) to {url}")
+
+
+def stats():
+    with _lock:
+        stats = {"lookups": 0, "models_created": 0, "http_clients_created": 0,
+                 "http_requests": 0, "connections_opened": 0, "tls_handshakes": 0}
+        stats.update(counters)
+        stats["models"] = len(_models)
+        if _fixture is not None:
+            stats["fixture"] = _fixture.stats()
+        stats["reused"] = stats["lookups"] - stats["models_created"]
+        stats["requests_per_connection"] = (
+            stats["http_requests"] / stats["connections_opened"] if stats["connections_opened"] else 0.0)
+        return stats
@@ -0,0 +1,225 @@
+import asyncio
+import collections
+import hashlib
+import json
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, message_chunk_to_message, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+def _tool_names(kwargs):
+    return sorted(tool.get("function", {}).get("name", "") for tool in kwargs.get("tools") or [])
+
+
+def request_key(model, messages, kwargs):
+    """Stable key of an LLM request: model, message types and contents, bound tool names."""
+    payload = {
+        "model": model,
+        "messages": [(message.type, message.content) for message in messages],
+        "tools": _tool_names(kwargs),
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+
+class LLMFixture:
+    """
+    JSON-lines file of recorded LLM exchanges.
+
+    Each line holds the request key, model, request messages, the response
+    message and the original latency. lookup() serves responses for a key in
+    recorded order (repeating the last one). With strict=False a request that
+    was never recorded gets the next unused response of the same model, which
+    tolerates small prompt drift between recording and replay.
+    """
+
+    def __init__(self, path, strict=False):
+        self.path = path
+        self.strict = strict
+        self.lock = threading.Lock()
+        self.by_key = collections.defaultdict(list)
+        self.by_model = collections.defaultdict(list)
+        self.served = collections.Counter()
+        self.used = set()
+        self.counters = collections.Counter()
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+        except FileNotFoundError:
+            lines = []
+        for index, line in enumerate(lines):
+            record = json.loads(line)
+            record["index"] = index
+            self.by_key[record["key"]].append(record)
+            self.by_model[record["model"]].append(record)
+
+    def __len__(self):
+        return sum(len(records) for records in self.by_model.values())
+
+    def record(self, key, model, messages, response, latency):
+        line = json.dumps({
+            "key": key,
+            "model": model,
+            "messages": messages_to_dict(messages),
+            "response": messages_to_dict([response])[0],
+            "latency": latency,
+        }, ensure_ascii=False, default=str)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.counters["recorded"] += 1
+
+    def lookup(self, key, model):
+        """Return (response message, recorded latency)."""
+        with self.lock:
+            records = self.by_key.get(key)
+            if records:
+                record = records[min(self.served[key], len(records) - 1)]
+                self.served[key] += 1
+                self.counters["exact"] += 1
+            elif not self.strict:
+                record = next((r for r in self.by_model.get(model, []) if r["index"] not in self.used), None)
+                if record is None:
+                    raise KeyError(f"No recorded LLM response left for model {model} in {self.path}")
+                self.counters["fallback"] += 1
+            else:
+                raise KeyError(f"LLM request {key} for model {model} was not recorded in {self.path}")
+            self.used.add(record["index"])
+        return messages_from_dict([record["response"]])[0], record.get("latency", 0.0)
+
+    def stats(self):
+        with self.lock:
+            return {"recorded": 0, "exact": 0, "fallback": 0, **self.counters, "size": len(self)}
+
+
+class DelegatingChatModel(BaseChatModel):
+    """Base for chat models that stand in for ChatOpenAI under the same model name."""
+
+    model_name: str = ""
+
+    @property
+    def _llm_type(self):
+        return "delegating"
+
+    @property
+    def _identifying_params(self):
+        return {"model": self.model_name}
+
+    def bind_tools(self, tools, **kwargs):
+        # The OpenAI tool format, so recorded and replayed requests look alike
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+
+class RecordingChatModel(DelegatingChatModel):
+    """Forwards every request to ``inner`` and appends the exchange to ``fixture``."""
+
+    inner: Any = None
+    fixture: Any = None
+
+    def _save(self, messages, kwargs, response, start):
+        key = request_key(self.model_name, messages, kwargs)
+        self.fixture.record(key, self.model_name, messages, response, time.perf_counter() - start)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self._save(messages, kwargs, result.generations[0].message, start)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        self._save(messages, kwargs, result.generations[0].message, start)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        message = None
+        for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+            message = chunk.message if message is None else message + chunk.message
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        if message is not None:
+            self._save(messages, kwargs, message_chunk_to_message(message), start)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        message = None
+        async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+            message = chunk.message if message is None else message + chunk.message
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        if message is not None:
+            self._save(messages, kwargs, message_chunk_to_message(message), start)
+
+
+class ReplayChatModel(DelegatingChatModel):
+    """
+    Serves recorded responses from ``fixture`` without network access.
+
+    ``latency`` is None (answer at once), a number of seconds, or 'recorded'
+    to wait as long as the original call took. Streaming splits the answer
+    into ``chunk_chars`` pieces spread over that latency.
+    """
+
+    fixture: Any = None
+    latency: Any = None
+    chunk_chars: int = 4
+
+    def _lookup(self, messages, kwargs):
+        response, recorded = self.fixture.lookup(request_key(self.model_name, messages, kwargs), self.model_name)
+        if self.latency == "recorded":
+            delay = recorded
+        else:
+            delay = float(self.latency or 0.0)
+        return response, delay
+
+    def _chunks(self, response):
+        if response.tool_calls or not isinstance(response.content, str):
+            tool_call_chunks = [
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(response.tool_calls)
+            ]
+            return [AIMessageChunk(content=response.content, tool_call_chunks=tool_call_chunks,
+                                   usage_metadata=response.usage_metadata)]
+        text = response.content
+        pieces = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        chunks = [AIMessageChunk(content=piece) for piece in pieces]
+        chunks[-1].usage_metadata = response.usage_metadata
+        return chunks
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        response, delay = self._lookup(messages, kwargs)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        response, delay = self._lookup(messages, kwargs)
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        response, delay = self._lookup(messages, kwargs)
+        chunks = self._chunks(response)
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        response, delay = self._lookup(messages, kwargs)
+        chunks = self._chunks(response)
+        for chunk in chunks:
+            await asyncio.sleep(delay / len(chunks))
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
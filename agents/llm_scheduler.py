@@ -0,0 +1,331 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import threading
+import time
+from typing import Any
+
+from agents import llm_metrics
+from agents.llm_replay import DelegatingChatModel
+
+# Lower runs first when calls of several agents wait for the same model, or for the shared pool
+PRIORITIES = {"guardian": 0, "navigator": 1, "vision": 2, "mission_planner": 3, "reflection": 4}
+DEFAULT_PRIORITY = 5
+DEFAULT_CONCURRENCY = 4
+# Back-off applied to a model after a rate-limit error without a retry-after hint
+RATE_LIMIT_PAUSE = 2.0
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Tokens the API counts against the rate limit: prompt (~4 chars per token) plus max_tokens."""
+    chars = 0
+    for message in messages:
+        if isinstance(message.content, str):
+            chars += len(message.content)
+        else:
+            chars += sum(len(part.get("text", "")) for part in message.content if isinstance(part, dict))
+    return chars // 4 + 1 + (max_tokens or 0)
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return RATE_LIMIT_PAUSE
+
+
+class TokenBucket:
+    """``rate`` units per second, bursting up to ``capacity``; take() may run into debt."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until ``amount`` (at most the capacity) is available."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        self.tokens -= amount
+
+
+class _Ticket:
+    __slots__ = ("agent", "model", "tokens", "queued_at", "wake", "admitted", "throttled")
+
+    def __init__(self, agent, model, tokens, wake):
+        self.agent = agent
+        self.model = model
+        self.tokens = tokens
+        self.queued_at = time.monotonic()
+        self.wake = wake
+        self.admitted = False
+        self.throttled = False
+
+
+class LLMScheduler:
+    """
+    Admission control for the LLM calls of every agent in the process.
+
+    Each model has a cap on concurrent calls (``concurrency``, {model: n},
+    ``default_concurrency`` otherwise) and optional rate limits (``rate_limits``,
+    {model: {"rpm": requests, "tpm": tokens}} per minute) enforced with
+    token buckets holding ``burst_seconds`` worth of budget. Calls that cannot
+    start wait in a per-model queue ordered by the calling agent's priority
+    (PRIORITIES), then arrival. Time spent queued is reported to
+    agents.llm_metrics. Threads wait in acquire(), coroutines in aacquire().
+
+    The per-model queues only order calls for the same model; agents on
+    different models (Guardian on gpt-4o-mini, Navigator on gpt-4) do not
+    compete there. ``total_concurrency`` adds a pool shared by all models,
+    e.g. the concurrent requests one API key may have open: when it is full,
+    the next free slot goes to the highest-priority call waiting for any
+    model whose own cap and rate limits allow it.
+    """
+
+    def __init__(self, concurrency=None, rate_limits=None, priorities=None, burst_seconds=10.0,
+                 default_concurrency=DEFAULT_CONCURRENCY, total_concurrency=None):
+        self.lock = threading.Lock()
+        self.concurrency = dict(concurrency or {})
+        self.default_concurrency = default_concurrency
+        self.total_concurrency = total_concurrency
+        self.priorities = dict(PRIORITIES if priorities is None else priorities)
+        self.buckets = {}
+        for model, limits in (rate_limits or {}).items():
+            self.set_rate_limit(model, burst_seconds=burst_seconds, **limits)
+        # model -> heap of (priority, seq, ticket)
+        self.queues = collections.defaultdict(list)
+        self.running = collections.Counter()
+        self.paused_until = {}
+        self.counters = collections.Counter()
+        self._seq = itertools.count()
+        self._timer = None
+        self._timer_due = None
+
+    def set_rate_limit(self, model, rpm=None, tpm=None, burst_seconds=10.0):
+        buckets = {}
+        if rpm:
+            buckets["requests"] = TokenBucket(rpm / 60, max(1.0, rpm / 60 * burst_seconds))
+        if tpm:
+            buckets["tokens"] = TokenBucket(tpm / 60, max(1.0, tpm / 60 * burst_seconds))
+        with self.lock:
+            self.buckets[model] = buckets
+
+    def _cap(self, model):
+        return self.concurrency.get(model, self.default_concurrency)
+
+    def _enqueue(self, agent, model, tokens, wake):
+        # Caller must hold self.lock
+        ticket = _Ticket(agent, model, tokens, wake)
+        priority = self.priorities.get(agent, DEFAULT_PRIORITY)
+        heapq.heappush(self.queues[model], (priority, next(self._seq), ticket))
+        self.counters["queued_max"] = max(self.counters["queued_max"], len(self.queues[model]))
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        # Caller must hold self.lock. Admits queue heads, highest priority
+        # across all models first, while their model and the shared pool have room.
+        now = time.monotonic()
+        blocked = set()
+        while self.total_concurrency is None or sum(self.running.values()) < self.total_concurrency:
+            heads = [(queue[0][0], queue[0][1], model) for model, queue in self.queues.items()
+                     if queue and model not in blocked]
+            if not heads:
+                break
+            model = min(heads)[2]
+            ticket = self.queues[model][0][2]
+            if self.running[model] >= self._cap(model):
+                blocked.add(model)
+                continue
+            wait = self.paused_until.get(model, 0.0) - now
+            for name, bucket in self.buckets.get(model, {}).items():
+                wait = max(wait, bucket.delay(1 if name == "requests" else ticket.tokens, now))
+            if wait > 0:
+                self.counters["rate_limited"] += not ticket.throttled
+                ticket.throttled = True
+                self._dispatch_later(wait)
+                blocked.add(model)
+                continue
+            heapq.heappop(self.queues[model])
+            for name, bucket in self.buckets.get(model, {}).items():
+                bucket.take(1 if name == "requests" else ticket.tokens)
+            self.running[model] += 1
+            self.counters["admitted"] += 1
+            ticket.admitted = True
+            waited = now - ticket.queued_at
+            if waited > 0.001:
+                self.counters["waited"] += 1
+            llm_metrics.metrics.record_queue(ticket.agent, model, waited)
+            ticket.wake()
+
+    def _dispatch_later(self, delay):
+        due = time.monotonic() + delay
+        if self._timer_due is not None and self._timer_due <= due:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_due = due
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self.lock:
+            self._timer = self._timer_due = None
+            self._dispatch()
+
+    def _withdraw(self, ticket):
+        # A waiter gave up (task cancelled); give back the slot if it already got one
+        with self.lock:
+            if ticket.admitted:
+                self.running[ticket.model] -= 1
+            else:
+                queue = self.queues[ticket.model]
+                queue[:] = [entry for entry in queue if entry[2] is not ticket]
+                heapq.heapify(queue)
+            self._dispatch()
+
+    def acquire(self, agent, model, tokens=0):
+        """Block until a call of ``agent`` to ``model`` may start; pair with release()."""
+        admitted = threading.Event()
+        with self.lock:
+            ticket = self._enqueue(agent, model, tokens, admitted.set)
+        try:
+            admitted.wait()
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+
+    async def aacquire(self, agent, model, tokens=0):
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(True))
+
+        with self.lock:
+            ticket = self._enqueue(agent, model, tokens, wake)
+        try:
+            await admitted
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+
+    def release(self, model, rate_limited_for=None):
+        """End a call; ``rate_limited_for`` seconds pauses the model after a rate-limit error."""
+        with self.lock:
+            self.running[model] -= 1
+            if rate_limited_for:
+                self.counters["rate_limit_errors"] += 1
+                self.paused_until[model] = max(self.paused_until.get(model, 0.0),
+                                               time.monotonic() + rate_limited_for)
+            self._dispatch()
+
+    def stats(self):
+        with self.lock:
+            stats = {"admitted": 0, "waited": 0, "queued_max": 0, "rate_limited": 0, "rate_limit_errors": 0}
+            stats.update(self.counters)
+            stats["running"] = {model: n for model, n in self.running.items() if n}
+            stats["queued"] = {model: len(queue) for model, queue in self.queues.items() if queue}
+            return stats
+
+
+# Process-wide scheduler all agents' models go through, see configure()
+scheduler = LLMScheduler()
+
+
+def configure(concurrency=None, rate_limits=None, priorities=None, burst_seconds=10.0,
+              default_concurrency=DEFAULT_CONCURRENCY, total_concurrency=None):
+    """Replace the process-wide scheduler; takes effect for calls started afterwards."""
+    global scheduler
+    scheduler = LLMScheduler(concurrency, rate_limits, priorities, burst_seconds, default_concurrency,
+                             total_concurrency)
+    return scheduler
+
+
+def _rate_limit_pause(error):
+    # openai.RateLimitError; matched by name so other clients' 429 errors count as well
+    if type(error).__name__ == "RateLimitError":
+        return _retry_after(error)
+    return None
+
+
+class ScheduledChatModel(DelegatingChatModel):
+    """Runs every call of ``inner`` on behalf of ``agent`` through the process-wide scheduler."""
+
+    inner: Any = None
+    agent: str = ""
+
+    def _tokens(self, messages):
+        return estimate_tokens(messages, getattr(self.inner, "max_tokens", None))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        active = scheduler
+        active.acquire(self.agent, self.model_name, self._tokens(messages))
+        pause = None
+        try:
+            return self.inner._generate(messages, stop=stop, **kwargs)
+        except Exception as e:
+            pause = _rate_limit_pause(e)
+            raise
+        finally:
+            active.release(self.model_name, pause)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        active = scheduler
+        await active.aacquire(self.agent, self.model_name, self._tokens(messages))
+        pause = None
+        try:
+            return await self.inner._agenerate(messages, stop=stop, **kwargs)
+        except Exception as e:
+            pause = _rate_limit_pause(e)
+            raise
+        finally:
+            active.release(self.model_name, pause)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # The slot is held until the last chunk has arrived
+        active = scheduler
+        active.acquire(self.agent, self.model_name, self._tokens(messages))
+        pause = None
+        try:
+            for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        except Exception as e:
+            pause = _rate_limit_pause(e)
+            raise
+        finally:
+            active.release(self.model_name, pause)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        active = scheduler
+        await active.aacquire(self.agent, self.model_name, self._tokens(messages))
+        pause = None
+        try:
+            async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        except Exception as e:
+            pause = _rate_limit_pause(e)
+            raise
+        finally:
+            active.release(self.model_name, pause)
+
+
+def scheduled(llm, agent):
+    """``llm`` (from agents.llm_registry.get_llm) with its calls scheduled as ``agent``'s."""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", "unknown")
+    return ScheduledChatModel(model_name=model, inner=llm, agent=agent)
@@ -0,0 +1,172 @@
+import collections
+import threading
+import time
+
+from agents.frame_prep import frame_size
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = np = None
+
+COLUMNS = ("po lewej", "na wprost", "po prawej")
+# Frames are analysed at this width at most; edges and contours need no more
+ANALYSIS_WIDTH = 320
+REDUCED_READS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                 (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)) if cv2 is not None else ()
+
+
+def size_label(area):
+    if area >= 0.2:
+        return "duży"
+    if area >= 0.05:
+        return "średni"
+    return "mały"
+
+
+class LocalPerception:
+    """
+    CPU-only analysis of a camera frame, answering the basic navigation
+    questions without the vision LLM.
+
+    analyze() returns a summary dict (JSON-serialisable, so it can travel in
+    pool messages): Canny edge density per sector of a 3x3 grid, the largest
+    contours with their column and share of the frame, a free-space score
+    per column (1.0 = nothing in the way) and a verdict for the way ahead:
+      "blocked"    an object of at least ``large_object`` of the frame ahead,
+                   reaching into the lower two thirds of the frame
+      "clear"      free space ahead of at least ``clear_threshold``, no
+                   object bigger than ``min_object`` in the lower two thirds
+                   ahead, and edge density of at least ``min_texture`` in the
+                   far field (upper two thirds of the middle column): the
+                   camera has to see something in the distance, a blank wall
+                   or a covered lens has no edges either
+      "ambiguous"  anything else: a frame too dark or flat to tell, or
+                   edges spread over more than ``max_object`` of the frame,
+                   which is texture as often as it is an obstacle; these
+                   frames go to the vision LLM
+    stats() reports how many frames were decided locally.
+    """
+
+    def __init__(self, clear_threshold=0.75, large_object=0.2, min_object=0.02, max_object=0.6,
+                 edge_saturation=0.12, min_contrast=12.0, min_texture=0.01):
+        self.clear_threshold = clear_threshold
+        self.large_object = large_object
+        self.min_object = min_object
+        self.max_object = max_object
+        self.edge_saturation = edge_saturation
+        self.min_contrast = min_contrast
+        self.min_texture = min_texture
+        self.lock = threading.Lock()
+        self.verdicts = collections.Counter()
+        self.seconds = 0.0
+
+    def grayscale(self, frame):
+        # Let the JPEG decoder skip detail the analysis would throw away anyway
+        width = (frame_size(frame) or (0, 0))[0]
+        flag = next((flag for factor, flag in REDUCED_READS if width >= factor * ANALYSIS_WIDTH), cv2.IMREAD_GRAYSCALE)
+        image = cv2.imdecode(np.frombuffer(frame, np.uint8), flag)
+        if image is None:
+            return None
+        height, width = image.shape
+        if width > ANALYSIS_WIDTH:
+            size = (ANALYSIS_WIDTH, max(1, height * ANALYSIS_WIDTH // width))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def objects(self, edges):
+        """Bounding boxes of the edge clusters covering at least ``min_object`` of the frame."""
+        height, width = edges.shape
+        closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8), iterations=2)
+        contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            area = w * h / (width * height)
+            if area >= self.min_object:
+                boxes.append((area, x, y, w, h))
+        return sorted(boxes, reverse=True)
+
+    def analyze(self, frame):
+        """Summary dict of a JPEG frame, or None when OpenCV is missing or the frame cannot be decoded."""
+        if cv2 is None:
+            return None
+        start = time.perf_counter()
+        image = self.grayscale(frame)
+        if image is None:
+            return None
+        height, width = image.shape
+        edges = cv2.Canny(cv2.GaussianBlur(image, (5, 5), 0), 50, 150)
+        density = [[float(edges[r * height // 3:(r + 1) * height // 3, c * width // 3:(c + 1) * width // 3].mean()) / 255
+                    for c in range(3)] for r in range(3)]
+
+        boxes = self.objects(edges)
+        covered = np.zeros((height, width), bool)
+        objects = []
+        ahead = []
+        for area, x, y, w, h in boxes:
+            covered[y:y + h, x:x + w] = True
+            column = COLUMNS[min(2, (x + w // 2) * 3 // width)]
+            # Edge clusters ending in the top third are in the distance, not in the way
+            far = y + h <= height // 3
+            objects.append({"direction": column, "area": round(area, 3), "size": size_label(area), "far": far})
+            if column == "na wprost" and not far:
+                ahead.append(area)
+
+        free_space = {}
+        for c, column in enumerate(COLUMNS):
+            # The lower two rows are what the drone would fly into; the top is mostly sky or ceiling
+            clutter = min(1.0, (density[1][c] + density[2][c]) / 2 / self.edge_saturation)
+            coverage = float(covered[height // 3:, c * width // 3:(c + 1) * width // 3].mean())
+            free_space[column] = round(1.0 - max(clutter, coverage), 2)
+
+        contrast = float(image.std())
+        far_texture = (density[0][1] + density[1][1]) / 2
+        if contrast < self.min_contrast or (boxes and boxes[0][0] > self.max_object):
+            verdict = "ambiguous"
+        elif ahead and max(ahead) >= self.large_object:
+            verdict = "blocked"
+        elif free_space["na wprost"] >= self.clear_threshold and not ahead and far_texture >= self.min_texture:
+            verdict = "clear"
+        else:
+            verdict = "ambiguous"
+
+        with self.lock:
+            self.verdicts[verdict] += 1
+            self.seconds += time.perf_counter() - start
+        return {
+            "verdict": verdict,
+            "free_space": free_space,
+            "objects": objects[:3],
+            "edge_density": [[round(value, 3) for value in row] for row in density],
+            "contrast": round(contrast, 1),
+            "far_texture": round(far_texture, 3),
+        }
+
+    def stats(self):
+        with self.lock:
+            frames = sum(self.verdicts.values())
+            local = self.verdicts["clear"] + self.verdicts["blocked"]
+            return {
+                "frames": frames,
+                "clear": self.verdicts["clear"],
+                "blocked": self.verdicts["blocked"],
+                "ambiguous": self.verdicts["ambiguous"],
+                "local_share": local / frames if frames else 0.0,
+                "mean_ms": self.seconds / frames * 1000 if frames else 0.0,
+            }
+
+
+def summary_text(summary):
+    """One-line Polish description of an analyze() summary for the Navigator and Guardian prompts."""
+    verdict = {
+        "clear": "droga na wprost wolna",
+        "blocked": "przeszkoda na wprost",
+        "ambiguous": "sytuacja na wprost niejednoznaczna",
+    }[summary["verdict"]]
+    objects = ", ".join(f"{obj['size']} obiekt {obj['direction']}{' w oddali' if obj['far'] else ''} "
+                        f"(ok. {obj['area']:.0%} kadru)"
+                        for obj in summary["objects"]) or "brak wyraźnych obiektów"
+    free = ", ".join(f"{column} {score:.2f}" for column, score in summary["free_space"].items())
+    return f"Analiza lokalna kamery: {verdict}; {objects}; wolna przestrzeń (0-1): {free}."
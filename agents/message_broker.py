@@ -0,0 +1,140 @@
+import os
+import tempfile
+import time
+from multiprocessing.managers import BaseManager
+
+from agents.message_pool import MessagePool
+from agents.message_journal import MessageJournal
+
+_POOL_METHODS = [
+    "post", "get", "get_all", "get_type", "update", "mark_executed",
+    "snapshot", "wait_for_change", "remove_type", "remove_message", "clear",
+    "compact", "stats", "history", "__len__",
+]
+
+# The one MessagePool living in the broker process
+_pool = None
+
+
+def _init_pool(pool_kwargs, journal_dir, compact_interval):
+    global _pool
+    journal = MessageJournal(journal_dir) if journal_dir else None
+    _pool = MessagePool(journal=journal, **pool_kwargs)
+    if compact_interval:
+        _pool.start_compactor(interval=compact_interval)
+
+
+def _get_pool():
+    return _pool
+
+
+class _BrokerManager(BaseManager):
+    pass
+
+
+_BrokerManager.register("pool", callable=_get_pool, exposed=_POOL_METHODS)
+
+
+def default_address():
+    return os.path.join(tempfile.gettempdir(), f"drone-message-pool-{os.getpid()}.sock")
+
+
+def start_broker(address=None, authkey=None, journal_dir=None, compact_interval=5.0, **pool_kwargs):
+    """
+    Start a broker process that owns the MessagePool and serves it over a Unix
+    socket. Returns the started manager; ``manager.address`` is what agent
+    processes pass to RemoteMessagePool and ``manager.shutdown()`` stops it.
+    """
+    manager = _BrokerManager(address=address or default_address(), authkey=authkey)
+    manager.start(initializer=_init_pool, initargs=(pool_kwargs, journal_dir, compact_interval))
+    return manager
+
+
+class RemoteMessagePool:
+    """
+    MessagePool API backed by a broker process (see start_broker()).
+
+    Messages come back as copies, so state changes must go through update()
+    and friends. Predicates run in the calling process: subscribe() takes a
+    versioned snapshot, filters it locally and blocks in the broker until a
+    message of the watched types changes.
+    """
+
+    def __init__(self, address, authkey=None):
+        self.address = address
+        self.manager = _BrokerManager(address=address, authkey=authkey)
+        self.manager.connect()
+        self.pool = self.manager.pool()
+
+    def build_message(self, msg_type, content):
+        return {"msg_type": msg_type, "content": content}
+
+    def post(self, message):
+        msg_id = self.pool.post(message)
+        message["id"] = msg_id
+        return msg_id
+
+    def get(self, msg_id):
+        return self.pool.get(msg_id)
+
+    def get_all(self):
+        return self.pool.get_all()
+
+    def get_type(self, msg_type):
+        return self.pool.get_type(msg_type)
+
+    def find(self, predicate, msg_types=None):
+        messages = self.pool.get_all() if msg_types is None else self.pool.snapshot(msg_types)[1]
+        return [msg for msg in messages if predicate(msg)]
+
+    def update(self, msg_id, **changes):
+        return self.pool.update(msg_id, **changes)
+
+    def mark_executed(self, msg_id):
+        return self.pool.mark_executed(msg_id)
+
+    def subscribe(self, msg_types, predicate=None, timeout=None):
+        if isinstance(msg_types, str):
+            msg_types = (msg_types,)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            version, messages = self.pool.snapshot(msg_types)
+            matched = [msg for msg in messages if predicate is None or predicate(msg)]
+            if matched:
+                return matched
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            self.pool.wait_for_change(msg_types, version, remaining)
+
+    def remove_type(self, msg_type):
+        return self.pool.remove_type(msg_type)
+
+    def remove_message(self, message):
+        msg_id = message["id"] if isinstance(message, dict) else message
+        return self.pool.remove_message(msg_id)
+
+    def clear(self):
+        return self.pool.clear()
+
+    def compact(self):
+        return self.pool.compact()
+
+    def stats(self):
+        return self.pool.stats()
+
+    def history(self):
+        return self.pool.history()
+
+    def __len__(self):
+        return len(self.pool)
+
+
+def run_agent(agent_class, address, authkey=None, **agent_kwargs):
+    """Process entry point: run one agent's message loop against the broker."""
+    agent = agent_class(RemoteMessagePool(address, authkey), **agent_kwargs)
+    # What start() would run next to the message loop, e.g. VisionAgent's scene prefetcher
+    start_background = getattr(agent, "start_background", None)
+    if start_background is not None:
+        start_background()
+    agent.read_messages()
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+
+
+def _json_default(obj):
+    # chat_history carries LangChain message objects
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+class MessageJournal:
+    """
+    Append-only journal of MessagePool mutations, one compact JSON record per line.
+
+    Records are written (and flushed to the OS) as they happen, so a crashed
+    process loses nothing; fsync is batched and issued after ``fsync_batch``
+    records or every ``fsync_interval`` seconds, whichever comes first.
+    Once a segment grows past ``segment_bytes`` the pool snapshots its live
+    state into a fresh segment and older segments are deleted.
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, fsync_batch=64, fsync_interval=0.05):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.segment_no = max(self._segments(), default=0) or 1
+        self._truncate_torn_tail(self._segment_path(self.segment_no))
+        self.file = open(self._segment_path(self.segment_no), "ab")
+        self.rotate_at = segment_bytes
+        self.stats = {"records": 0, "fsyncs": 0, "rotations": 0}
+
+        self._stop = threading.Event()
+        self._syncer = None
+        if fsync_interval:
+            self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+            self._syncer.start()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:08d}.jsonl")
+
+    def _segments(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name.endswith(".jsonl"):
+                numbers.append(int(name[len("segment-"):-len(".jsonl")]))
+        return sorted(numbers)
+
+    def _truncate_torn_tail(self, path):
+        # A crash mid-write leaves a partial last line; cut it off so new
+        # records do not get glued onto it
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, record):
+        """Write one record. Returns True when the segment is due for rotation."""
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+        with self.lock:
+            self.file.write(line.encode("utf-8") + b"\n")
+            self.file.flush()
+            self.pending += 1
+            self.stats["records"] += 1
+            if self.pending >= self.fsync_batch:
+                self._fsync()
+            return self.file.tell() >= self.rotate_at
+
+    def replay(self):
+        """Yield every intact record, oldest segment first. A torn trailing line is skipped."""
+        with self.lock:
+            self.file.flush()
+            segments = self._segments()
+        for number in segments:
+            with open(self._segment_path(number), "rb") as f:
+                for raw in f:
+                    try:
+                        yield json.loads(raw)
+                    except ValueError:
+                        break
+
+    def rotate(self, snapshot):
+        """Start a new segment holding ``snapshot`` of the pool state and drop the older ones."""
+        with self.lock:
+            self._fsync()
+            self.file.close()
+            old_segments = self._segments()
+            self.segment_no += 1
+            self.file = open(self._segment_path(self.segment_no), "ab")
+            line = json.dumps(dict(snapshot, op="snapshot"), separators=(",", ":"), ensure_ascii=False, default=_json_default)
+            self.file.write(line.encode("utf-8") + b"\n")
+            self.file.flush()
+            self.pending += 1
+            self._fsync()
+            # A snapshot bigger than the segment size must not trigger another rotation right away
+            self.rotate_at = max(self.segment_bytes, 2 * self.file.tell())
+            for number in old_segments:
+                os.remove(self._segment_path(number))
+            self.stats["rotations"] += 1
+
+    def _fsync(self):
+        # Caller must hold self.lock
+        if self.pending:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+            self.stats["fsyncs"] += 1
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self.lock:
+                self._fsync()
+
+    def sync(self):
+        with self.lock:
+            self._fsync()
+
+    def close(self):
+        self._stop.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        with self.lock:
+            self._fsync()
+            self.file.close()
@@ -1,32 +1,321 @@
+import collections
 import threading
+import time
+
+
+def _reclaimable(msg):
+    return msg["content"].get("executed", False) or msg["content"].get("logged", False)
+
 
 class MessagePool:
-    def __init__(self):
-        self.messages = []
+    def __init__(self, max_messages=None, max_age=None, type_caps=None,
+                 archive_size=1000, reclaim_grace=30.0, journal=None):
+        """
+        Retention limits (``None`` disables a limit):
+          • max_messages:  total number of live messages, oldest evicted first
+          • max_age:       seconds a message may stay live, enforced by compact()
+          • type_caps:     {msg_type: max live messages of that type}
+          • reclaim_grace: seconds an executed/logged message stays live after
+                           its last update before compact() archives it, so
+                           slower readers still get to see the final state
+        Evicted and reclaimed messages go to a bounded archive (see history()).
+
+        With a ``journal`` (agents.message_journal.MessageJournal) every mutation
+        is logged and the live state is rebuilt from it on construction.
+        """
+        # id -> message, plus a per msg_type index over the same dicts
+        self.messages = {}
+        self.by_type = {}
         self.lock = threading.Lock()
+        # msg_type -> set of conditions of threads blocked in subscribe()
+        self.subscribers = {}
+        # msg_type -> number of posts/updates, see wait_for_change()
+        self.versions = {}
+        # callables invoked with the msg_type on every post/update, see add_listener()
+        self.listeners = []
+        self._last_id = 0
+
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self.type_caps = dict(type_caps or {})
+        self.reclaim_grace = reclaim_grace
+        self.archive = collections.deque(maxlen=archive_size)
+        self.counters = collections.Counter()
+        self._compactor = None
+        self._compactor_stop = threading.Event()
+
+        # Attach the journal only after replay so rebuilding the state is not re-logged
+        self.journal = None
+        if journal is not None:
+            self._replay(journal)
+        self.journal = journal
+
+    def _replay(self, journal):
+        for record in journal.replay():
+            op = record["op"]
+            if op == "post":
+                message = record["msg"]
+                self._remove(message["id"])
+                self.messages[message["id"]] = message
+                self.by_type.setdefault(message["msg_type"], {})[message["id"]] = message
+                self._last_id = max(self._last_id, message["id"])
+            elif op == "update":
+                message = self.messages.get(record["id"])
+                if message is not None:
+                    message["content"].update(record["changes"])
+                    message["updated_at"] = record["ts"]
+            elif op == "remove":
+                self._remove(record["id"])
+            elif op in ("clear", "snapshot"):
+                self.messages.clear()
+                self.by_type.clear()
+                for message in record.get("messages", []):
+                    self.messages[message["id"]] = message
+                    self.by_type.setdefault(message["msg_type"], {})[message["id"]] = message
+                self._last_id = max(self._last_id, record.get("last_id", 0))
+        self.counters["replayed"] = len(self.messages)
+
+    def _log(self, record):
+        # Caller must hold self.lock
+        if self.journal is not None and self.journal.append(record):
+            self.journal.rotate({"messages": list(self.messages.values()), "last_id": self._last_id})
 
     def build_message(self, msg_type, content):
         return {"msg_type": msg_type, "content": content}
 
     def post(self, message):
+        """Store ``message`` under a fresh id (or replace the one it carries) and return the id."""
         with self.lock:
-            self.messages.append(message)
+            msg_id = message.get("id")
+            if msg_id is None:
+                self._last_id += 1
+                msg_id = self._last_id
+                message["id"] = msg_id
+            else:
+                self._remove(msg_id)
+            message.setdefault("timestamp", time.time())
+            self.messages[msg_id] = message
+            self.by_type.setdefault(message["msg_type"], {})[msg_id] = message
+            self.counters["posted"] += 1
+            self._log({"op": "post", "msg": message})
+            self._enforce_caps(message["msg_type"])
+            self._notify(message["msg_type"])
+            return msg_id
+
+    def get(self, msg_id):
+        with self.lock:
+            return self.messages.get(msg_id)
 
     def get_all(self):
         with self.lock:
-            return list(self.messages)
+            return list(self.messages.values())
+
+    def get_type(self, msg_type):
+        with self.lock:
+            return list(self.by_type.get(msg_type, {}).values())
+
+    def find(self, predicate, msg_types=None):
+        with self.lock:
+            return [msg for msg in self._candidates(msg_types) if predicate(msg)]
+
+    def update(self, msg_id, **changes):
+        """Apply ``changes`` to the content of message ``msg_id``. Returns False if it is gone."""
+        with self.lock:
+            message = self.messages.get(msg_id)
+            if message is None:
+                return False
+            message["content"].update(changes)
+            message["updated_at"] = time.time()
+            self._log({"op": "update", "id": msg_id, "changes": changes, "ts": message["updated_at"]})
+            self._notify(message["msg_type"])
+            return True
+
+    def mark_executed(self, msg_id):
+        return self.update(msg_id, executed=True)
+
+    def subscribe(self, msg_types, predicate=None, timeout=None):
+        """
+        Block until the pool holds at least one message of the given type(s)
+        accepted by ``predicate`` and return all of them (oldest first).
+        Returns an empty list when ``timeout`` seconds pass without a match.
+        """
+        def matches():
+            return [
+                msg for msg in self._candidates(msg_types)
+                if predicate is None or predicate(msg)
+            ]
+        return self._wait(msg_types, matches, timeout) or []
+
+    def snapshot(self, msg_types):
+        """Return ``(version, messages)`` for the given type(s), see wait_for_change()."""
+        with self.lock:
+            return self._version(msg_types), self._candidates(msg_types)
+
+    def wait_for_change(self, msg_types, version, timeout=None):
+        """
+        Block until a message of the given type(s) is posted or updated after
+        ``version`` was taken. Returns the new version, or None on timeout.
+        Lets clients that cannot ship a predicate to the pool (see
+        agents.message_broker) filter locally without polling.
+        """
+        def changed():
+            current = self._version(msg_types)
+            return current if current != version else None
+        return self._wait(msg_types, changed, timeout)
 
-    def find(self, predicate):
+    def add_listener(self, listener):
+        """
+        Call ``listener(msg_type)`` whenever a message is posted or updated.
+        It runs with the pool lock held, so it must not block or touch the pool.
+        """
         with self.lock:
-            return [msg for msg in self.messages if predicate(msg)]
+            self.listeners.append(listener)
+
+    def _wait(self, msg_types, ready, timeout):
+        if isinstance(msg_types, str):
+            msg_types = (msg_types,)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            condition = threading.Condition(self.lock)
+            for msg_type in msg_types:
+                self.subscribers.setdefault(msg_type, set()).add(condition)
+            try:
+                while True:
+                    result = ready()
+                    if result:
+                        return result
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    condition.wait(remaining)
+            finally:
+                for msg_type in msg_types:
+                    self.subscribers[msg_type].discard(condition)
+
+    def _version(self, msg_types):
+        # Caller must hold self.lock
+        if isinstance(msg_types, str):
+            msg_types = (msg_types,)
+        return sum(self.versions.get(msg_type, 0) for msg_type in msg_types)
+
+    def _candidates(self, msg_types):
+        # Caller must hold self.lock
+        if msg_types is None:
+            return list(self.messages.values())
+        if isinstance(msg_types, str):
+            msg_types = (msg_types,)
+        if len(msg_types) == 1:
+            return list(self.by_type.get(msg_types[0], {}).values())
+        merged = []
+        for msg_type in msg_types:
+            merged.extend(self.by_type.get(msg_type, {}).values())
+        merged.sort(key=lambda msg: msg["id"])
+        return merged
+
+    def _notify(self, msg_type):
+        # Caller must hold self.lock
+        self.versions[msg_type] = self.versions.get(msg_type, 0) + 1
+        for listener in self.listeners:
+            listener(msg_type)
+        for condition in self.subscribers.get(msg_type, ()):
+            condition.notify_all()
+
+    def _remove(self, msg_id):
+        # Caller must hold self.lock
+        message = self.messages.pop(msg_id, None)
+        if message is not None:
+            self.by_type[message["msg_type"]].pop(msg_id, None)
+            self._log({"op": "remove", "id": msg_id})
+        return message
+
+    def _archive(self, msg_id, reason):
+        # Caller must hold self.lock
+        message = self._remove(msg_id)
+        if message is not None:
+            self.archive.append(message)
+            self.counters[reason] += 1
+
+    def _enforce_caps(self, msg_type):
+        # Caller must hold self.lock. Dicts keep insertion order, so the first
+        # entry is always the oldest message.
+        cap = self.type_caps.get(msg_type)
+        if cap is not None:
+            of_type = self.by_type[msg_type]
+            while len(of_type) > cap:
+                self._archive(next(iter(of_type)), "evicted_type_cap")
+        if self.max_messages is not None:
+            while len(self.messages) > self.max_messages:
+                self._archive(next(iter(self.messages)), "evicted_max_messages")
+
+    def compact(self):
+        """
+        Move executed/logged messages past the grace period and messages older
+        than max_age to the archive. Returns the number of messages reclaimed.
+        """
+        now = time.time()
+        with self.lock:
+            before = len(self.messages)
+            for msg_id, message in list(self.messages.items()):
+                age = now - message["timestamp"]
+                idle = now - message.get("updated_at", message["timestamp"])
+                if self.max_age is not None and age > self.max_age:
+                    self._archive(msg_id, "evicted_max_age")
+                elif idle >= self.reclaim_grace and _reclaimable(message):
+                    self._archive(msg_id, "reclaimed")
+            for msg_type in list(self.by_type):
+                self._enforce_caps(msg_type)
+            self.counters["compactions"] += 1
+            return before - len(self.messages)
+
+    def start_compactor(self, interval=5.0):
+        if self._compactor is not None:
+            return
+        self._compactor_stop.clear()
+
+        def run():
+            while not self._compactor_stop.wait(interval):
+                self.compact()
+
+        self._compactor = threading.Thread(target=run, daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        if self._compactor is None:
+            return
+        self._compactor_stop.set()
+        self._compactor.join()
+        self._compactor = None
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["size"] = len(self.messages)
+            stats["size_by_type"] = {t: len(msgs) for t, msgs in self.by_type.items() if msgs}
+            stats["archived"] = len(self.archive)
+            return stats
+
+    def history(self):
+        """Archived messages followed by the live ones, oldest first."""
+        with self.lock:
+            return list(self.archive) + list(self.messages.values())
 
     def remove_type(self, msg_type):
         with self.lock:
-            self.messages = [msg for msg in self.messages if msg["msg_type"] != msg_type]
+            for msg_id in list(self.by_type.get(msg_type, {})):
+                self._remove(msg_id)
 
     def remove_message(self, message):
+        """Remove a message given either the message itself or its id."""
+        msg_id = message["id"] if isinstance(message, dict) else message
+        with self.lock:
+            return self._remove(msg_id) is not None
+
+    def clear(self):
         with self.lock:
-            self.messages = [msg for msg in self.messages if msg != message]
+            self.messages.clear()
+            self.by_type.clear()
+            self.archive.clear()
+            self._log({"op": "clear"})
 
     def __len__(self):
         with self.lock:
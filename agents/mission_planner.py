@@ -1,9 +1,9 @@
-from langchain_community.chat_models import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
 from langchain.chains import ConversationChain
 from langchain.memory import ConversationBufferMemory
 from langchain.agents import initialize_agent, Tool
+import asyncio
 import json
 import threading
 import time
@@ -12,12 +12,49 @@ import os
 import sys
 import copy
 
+from agents.json_stream import JSONArrayStream
+from agents import llm_metrics, llm_registry, llm_scheduler
+from agents.llm_registry import get_llm
+from agents.llm_scheduler import scheduled
+from agents.plan_cache import PlanCache
+from agents.planner_memory import BudgetedMemory, PromptMeter
+
+
+PLANNER_INBOX = ("plan_mission", "guardian_validation", "print_user")
+
+
+def _planner_inbox(msg):
+    if msg["msg_type"] == "plan_mission":
+        return not msg["content"].get("executed")
+    if msg["msg_type"] == "guardian_validation":
+        return not msg["content"].get("logged")
+    return True
+
+
 class MissionPlannerAgent:
-    def __init__(self, message_pool, retriever=None):
+    def __init__(self, message_pool, retriever=None, plan_cache=None, streaming=False,
+                 memory_tokens=1500, plan_history_tokens=600):
+        """
+        ``plan_cache`` (agents.plan_cache.PlanCache) serves repeated and
+        reworded commands without asking the LLM; pass False to turn it off.
+        With ``streaming`` each plan step is posted as soon as the LLM has
+        generated it (see stream_mission_plan()). The chat history sent with
+        the conversational agent is limited to ``memory_tokens`` and the one
+        sent with plan_mission to ``plan_history_tokens`` (see
+        agents.planner_memory); memory_tokens=None keeps the full history.
+        """
         self.message_pool = message_pool
         self.retriever = retriever
-        self.llm = ChatOpenAI(model="gpt-4o-mini", max_tokens=500)
-        self.memory = ConversationBufferMemory(return_messages=True, memory_key="chat_history")
+        self.plan_cache = PlanCache() if plan_cache is None else plan_cache
+        self.streaming = streaming
+        self.llm = scheduled(get_llm("gpt-4o-mini", max_tokens=500), "mission_planner")
+        if memory_tokens is None:
+            self.memory = ConversationBufferMemory(return_messages=True, memory_key="chat_history")
+        else:
+            self.memory = BudgetedMemory(return_messages=True, memory_key="chat_history", max_tokens=memory_tokens)
+        self.plan_history_tokens = plan_history_tokens
+        self.prompt_meter = PromptMeter()
+        self.callbacks = llm_metrics.callbacks("mission_planner")
 
         self.tools = [
             Tool(
@@ -54,7 +91,7 @@ class MissionPlannerAgent:
     def vector_search(self, query: str):
         if self.retriever:
             qa_chain = RetrievalQA.from_chain_type(llm=self.llm, retriever=self.retriever)
-            return qa_chain.run(query)
+            return qa_chain.run(query, callbacks=self.callbacks)
         else:
             return "Vector store is inactive"
 
@@ -64,31 +101,35 @@ class MissionPlannerAgent:
 
     def chat(self, user_input: str):
         self.current_input = user_input
-        response = self.agent.invoke({"input": user_input})
+        self.prompt_meter.record("agent_history", self.memory.load_memory_variables({})["chat_history"])
+        response = self.agent.invoke({"input": user_input}, config={"callbacks": self.callbacks})
         return f"🤖 Mission Planner: {response.get('output')}\n"
 
+    def _post(self, msg):
+        self.message_pool.post(msg)
+
     def request_mission(self, arg=None):
         msg = self.message_pool.build_message(
             "plan_mission",
             {
             "user_input": self.current_input,
-            "chat_history": self.memory.load_memory_variables({}).get("chat_history", []),
+            "chat_history": self.planning_history(),
             "executed": False,
             "logged": False
             }
         )
-        self.message_pool.post(msg)
+        self._post(msg)
         return "\n[MISSION PLANNER] Planowanie misji zostało zlecone. Zaraz misja ostanie wykonana. Przebieg misji wyświetli się na ekranie."
 
-    def plan_mission(self, msg):
+    def planning_history(self):
+        if isinstance(self.memory, BudgetedMemory):
+            return self.memory.messages_within(self.plan_history_tokens)
+        return self.memory.load_memory_variables({}).get("chat_history", [])
+
+    def planning_prompt(self, msg):
         operator_command = msg.get("user_input", "")
         chat_history = msg.get("chat_history", [])
-        llm = ChatOpenAI(
-            model="gpt-4",
-            temperature=0.3,
-            max_tokens=500,
-        )
-        prompt_text = f"""
+        prompt = f"""
             Jesteś agentem Mission-Planner dla drona. Twoim zadaniem jest przekształcenie polecenia operatora drona
             w listę jasnych, małych kroków opisujących działania drona. Nie opisuj, jak dron ma to zrobić – tylko co ma wykonać. 
             Jeśli misja wymaga tylko jednego kroku, zwróć listę z jednym krokiem.
@@ -117,68 +158,178 @@ class MissionPlannerAgent:
             ...
             ]
             """
-        message = HumanMessage(content=prompt_text)
-        response = llm.invoke([message])
+        self.prompt_meter.record("plan_mission", prompt)
+        return prompt
+
+    def parse_plan(self, content):
         try:
-            plan = json.loads(response.content)
+            plan = json.loads(content)
         except Exception:
-            plan = response.content
+            plan = content
         return plan
 
+    def plan_mission(self, msg):
+        message = HumanMessage(content=self.planning_prompt(msg))
+        response = self.planning_llm().invoke([message], config={"callbacks": self.callbacks})
+        return self.parse_plan(response.content)
+
+    def planning_llm(self):
+        return scheduled(get_llm("gpt-4", temperature=0.3, max_tokens=500), "mission_planner")
+
+    def stream_mission_plan(self, msg):
+        """
+        Stream the plan and post the mission_steps message with the first
+        complete step, appending later steps to its mission_plan as they
+        arrive; plan_complete is set once the array is closed. Vision and the
+        Navigator start on the first step while the rest is being generated.
+        """
+        state = {"start": time.perf_counter(), "mission_msg": None, "plan": []}
+        parser = JSONArrayStream()
+        message = HumanMessage(content=self.planning_prompt(msg["content"]))
+        for chunk in self.planning_llm().stream([message], config={"callbacks": self.callbacks}):
+            self.stream_steps(msg, state, parser.feed(chunk.content))
+        return self.finish_stream(msg, state, parser)
+
+    def stream_steps(self, msg, state, steps):
+        if not steps:
+            return
+        state["plan"].extend(steps)
+        if state["mission_msg"] is None:
+            state["first_step"] = time.perf_counter() - state["start"]
+            state["mission_msg"] = self.message_pool.build_message(
+                "mission_steps",
+                {"mission_id": msg["id"],
+                "mission_plan": list(state["plan"]),
+                "plan_complete": False,
+                "cache_hit": None,
+                "vision_context": None,
+                "executed": False,
+                "logged": False}
+            )
+            self.message_pool.mark_executed(msg["id"])
+            self._post(state["mission_msg"])
+            print("\n[MISSION PLANNER] Mission plan (streaming):")
+        else:
+            self.message_pool.update(state["mission_msg"]["id"], mission_plan=list(state["plan"]))
+        for step in steps:
+            print(f"{step.get('id')} - {step.get('cel')}")
+
+    def finish_stream(self, msg, state, parser):
+        full_plan = time.perf_counter() - state["start"]
+        if state["mission_msg"] is None:
+            # Not a JSON array of steps, handle it like a non-streamed answer
+            mission_plan = self.parse_plan(parser.getvalue())
+            self.post_mission_plan(msg, mission_plan)
+            return mission_plan
+        self.message_pool.update(
+            state["mission_msg"]["id"],
+            mission_plan=list(state["plan"]),
+            plan_complete=True,
+            time_to_first_step=state["first_step"],
+            time_to_full_plan=full_plan,
+        )
+        print(f"[MISSION PLANNER] First step after {state['first_step']:.2f}s, full plan after {full_plan:.2f}s")
+        return state["plan"]
+
+    def cached_plan(self, msg):
+        """Return (plan, cache_hit) where cache_hit is 'exact', 'semantic' or None."""
+        if not self.plan_cache:
+            return None, None
+        return self.plan_cache.lookup(msg.get("user_input", ""), msg.get("chat_history"))
+
+    def remember_plan(self, msg, mission_plan):
+        # Only well-formed plans are worth serving again
+        if self.plan_cache and isinstance(mission_plan, list) and mission_plan:
+            self.plan_cache.store(msg.get("user_input", ""), msg.get("chat_history"), mission_plan)
+
     def clean_messages(self):
-        messages = self.message_pool.get_all()
-        for msg in messages:
-            if msg["content"].get("executed", False) and msg["content"].get("logged", False):
-                self.message_pool.remove(msg)
+        return self.message_pool.compact()
+
+    def post_mission_plan(self, msg, mission_plan, cache_hit=None):
+        result_msg = self.message_pool.build_message(
+                "mission_steps",
+                {"mission_id": msg["id"],
+                "mission_plan": mission_plan,
+                "plan_complete": True,
+                "cache_hit": cache_hit,
+                "vision_context": None,
+                "executed": False,
+                "logged": False}
+            )
+
+        self.message_pool.mark_executed(msg["id"])
+        self._post(result_msg)
+        print(f"\n[MISSION PLANNER] Mission plan{f' ({cache_hit} cache hit)' if cache_hit else ''}:")
+        for plan in mission_plan:
+            print(f"{plan['id']} - {plan['cel']}")
+
+    def handle_report(self, msg):
+        if msg["msg_type"] == "guardian_validation":
+            # Add guardian validation info to chat history
+            validation_info = msg["content"]
+            step = validation_info.get("step")
+            action = validation_info.get("action")
+            parameters = validation_info.get("parameters")
+            validation = validation_info.get("validation")
+            if validation == "OK":
+                chat_entry = f"EXECUTED MISSION STEP: Step: {step['cel']} | Action: {action} | Parameters: {parameters} | Validation: {validation}"
+                self.validation_ok += 1
+            else:
+                chat_entry = f"REJECTED (failed) MISSION STEP: Step: {step['cel']} | Action: {action} | Parameters: {parameters} | Validation: {validation}"
+                self.validation_fail += 1
+
+            # Add to memory
+            self.memory.save_context({"input": chat_entry}, {"output": ""})
+            # print(chat_entry)
+            self.message_pool.update(msg["id"], logged=True)
+
+        if msg["msg_type"] == "print_user":
+            print(f"Message: {msg['content']}")
+            self.message_pool.remove_message(msg["id"])
 
     def read_messages(self):
         while True:
-            messages = self.message_pool.get_all()
+            messages = self.message_pool.subscribe(PLANNER_INBOX, _planner_inbox)
             # print(f"messages: {messages}")
             for msg in messages:
                 if msg["msg_type"] == "plan_mission" and not msg["content"].get("executed"):
-                    mission_plan = self.plan_mission(msg["content"])
-                    result_msg = self.message_pool.build_message(
-                            "mission_steps",
-                            {"mission_plan": mission_plan,
-                            "vision_context": None,
-                            "executed": False,
-                            "logged": False}
-                        )
-
-                    modified_msg = msg.copy()
-                    modified_msg["content"]["executed"] = True
-
-                    self.message_pool.post(modified_msg)
-                    self.message_pool.post(result_msg)
-                    self.message_pool.remove_message(msg)
-                    print("\n[MISSION PLANNER] Mission plan:")
-                    for plan in mission_plan:
-                        print(f"{plan['id']} - {plan['cel']}")
-                
-                if msg["msg_type"] == "guardian_validation":
-                    # Add guardian validation info to chat history
-                    validation_info = msg["content"]
-                    step = validation_info.get("step")
-                    action = validation_info.get("action")
-                    parameters = validation_info.get("parameters")
-                    validation = validation_info.get("validation")
-                    if validation == "OK":
-                        chat_entry = f"EXECUTED MISSION STEP: Step: {step['cel']} | Action: {action} | Parameters: {parameters} | Validation: {validation}"
-                        self.validation_ok += 1
+                    mission_plan, cache_hit = self.cached_plan(msg["content"])
+                    if mission_plan is not None:
+                        self.post_mission_plan(msg, mission_plan, cache_hit)
+                    elif self.streaming:
+                        self.remember_plan(msg["content"], self.stream_mission_plan(msg))
                     else:
-                        chat_entry = f"REJECTED (failed) MISSION STEP: Step: {step['cel']} | Action: {action} | Parameters: {parameters} | Validation: {validation}"
-                        self.validation_fail += 1
-                    
-                    # Add to memory
-                    self.memory.save_context({"input": chat_entry}, {"output": ""})
-                    # print(chat_entry)
-                    self.message_pool.remove_message(msg)
-
-                if msg["msg_type"] == "print_user":
-                    print(f"Message: {msg['content']}")
-            time.sleep(1)
-        
+                        mission_plan = self.plan_mission(msg["content"])
+                        self.remember_plan(msg["content"], mission_plan)
+                        self.post_mission_plan(msg, mission_plan)
+                self.handle_report(msg)
+
+    def show_screen(self, messages):
+        os.system('clear')
+        print("=== Mission Planner ===")
+        print("\n".join(messages))
+        print("\n[MISSION PLANNER] Enter your command: ", end="", flush=True)
+
+        sys.stdout.flush() 
+
+    def print_summary(self):
+        print("Exiting mission planner.")
+        if hasattr(self, '_timer'):
+            self._timer.cancel()
+        print("TOTALGUARDIAN VALIDATIONS:", self.validation_ok + self.validation_fail)
+        print("VALIDATIONS OK:", self.validation_ok)
+        print("VALIDATIONS FAILED:", self.validation_fail)
+        print("MESSAGE POOL:", self.message_pool.stats())
+        if self.plan_cache:
+            print("PLAN CACHE:", self.plan_cache.stats())
+        print("LLM CLIENTS:", llm_registry.stats())
+        print("LLM SCHEDULER:", llm_scheduler.scheduler.stats())
+        print("PROMPT TOKENS:", self.prompt_meter.stats())
+        for series in llm_metrics.metrics.snapshot():
+            print(f"LLM {series['agent']}/{series['model']}: {series['calls']} calls, {series['errors']} errors, "
+                  f"mean {series['mean_latency']:.2f}s (queued {series['mean_queue']:.2f}s), {series['prompt_tokens']}+{series['completion_tokens']} tokens, "
+                  f"~${series['cost']:.4f}")
+
     def run(self):
         poller = threading.Thread(target=self.read_messages, daemon=True)
         poller.start()
@@ -186,22 +337,12 @@ class MissionPlannerAgent:
         messages = []
 
         while True:
-            os.system('clear')
-            print("=== Mission Planner ===")
-            print("\n".join(messages))
-            print("\n[MISSION PLANNER] Enter your command: ", end="", flush=True)
-
-            sys.stdout.flush() 
+            self.show_screen(messages)
 
             user_input = input()
 
             if user_input.lower() == "exit":
-                print("Exiting mission planner.")
-                if hasattr(self, '_timer'):
-                    self._timer.cancel()
-                print("TOTALGUARDIAN VALIDATIONS:", self.validation_ok + self.validation_fail)
-                print("VALIDATIONS OK:", self.validation_ok)
-                print("VALIDATIONS FAILED:", self.validation_fail)
+                self.print_summary()
                 break
 
             response = self.chat(user_input)
@@ -209,3 +350,68 @@ class MissionPlannerAgent:
 
             if len(messages) > 20:
                 messages.pop(0)
+
+
+class AsyncMissionPlannerAgent(MissionPlannerAgent):
+    """MissionPlannerAgent for the asyncio runtime (agents.async_runtime)."""
+
+    def _post(self, msg):
+        # request_mission runs as a plain tool function, possibly off the event loop
+        self.message_pool.post_nowait(msg)
+
+    async def chat(self, user_input: str):
+        self.current_input = user_input
+        self.prompt_meter.record("agent_history", self.memory.load_memory_variables({})["chat_history"])
+        response = await self.agent.ainvoke({"input": user_input}, config={"callbacks": self.callbacks})
+        return f"🤖 Mission Planner: {response.get('output')}\n"
+
+    async def plan_mission(self, msg):
+        message = HumanMessage(content=self.planning_prompt(msg))
+        response = await self.planning_llm().ainvoke([message], config={"callbacks": self.callbacks})
+        return self.parse_plan(response.content)
+
+    async def stream_mission_plan(self, msg):
+        state = {"start": time.perf_counter(), "mission_msg": None, "plan": []}
+        parser = JSONArrayStream()
+        message = HumanMessage(content=self.planning_prompt(msg["content"]))
+        async for chunk in self.planning_llm().astream([message], config={"callbacks": self.callbacks}):
+            self.stream_steps(msg, state, parser.feed(chunk.content))
+        return self.finish_stream(msg, state, parser)
+
+    async def read_messages(self):
+        while True:
+            messages = await self.message_pool.subscribe(PLANNER_INBOX, _planner_inbox)
+            for msg in messages:
+                if msg["msg_type"] == "plan_mission" and not msg["content"].get("executed"):
+                    mission_plan, cache_hit = self.cached_plan(msg["content"])
+                    if mission_plan is not None:
+                        self.post_mission_plan(msg, mission_plan, cache_hit)
+                    elif self.streaming:
+                        self.remember_plan(msg["content"], await self.stream_mission_plan(msg))
+                    else:
+                        mission_plan = await self.plan_mission(msg["content"])
+                        self.remember_plan(msg["content"], mission_plan)
+                        self.post_mission_plan(msg, mission_plan)
+                self.handle_report(msg)
+
+    async def run(self):
+        poller = asyncio.get_running_loop().create_task(self.read_messages())
+
+        messages = []
+
+        while True:
+            self.show_screen(messages)
+
+            # input() blocks, keep it off the event loop
+            user_input = await asyncio.to_thread(input)
+
+            if user_input.lower() == "exit":
+                self.print_summary()
+                poller.cancel()
+                break
+
+            response = await self.chat(user_input)
+            messages.append(response)
+
+            if len(messages) > 20:
+                messages.pop(0)
@@ -1,16 +1,102 @@
 from langchain.agents import initialize_agent, Tool
-from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 from langchain.schema import HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
+from agents import llm_metrics
+from agents.llm_registry import get_llm
+from agents.llm_scheduler import scheduled
+from agents.step_grammar import parse_step
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import collections
+import contextvars
 import threading
 import time
 import json
 from textwrap import indent, wrap
 import copy
 
+# Step being translated when several steps are translated concurrently
+# (pipelined mode). LangChain copies the context into the threads it runs
+# tools in, so the tools see the step of the translation that called them.
+_translation = contextvars.ContextVar("navigator_translation", default=None)
+# Seconds to wait for Guardian's verdicts on a step before moving on (validated mode)
+VERDICT_TIMEOUT = 120.0
+
+
+class TranslationCancelled(Exception):
+    """Raised inside a speculative translation run_validated() no longer needs."""
+
+
+class _CancelCheck(BaseCallbackHandler):
+    """Stops a translation before its next LLM or tool call once ``cancelled`` is set."""
+
+    # LangChain logs and swallows handler exceptions unless the handler asks otherwise
+    raise_error = True
+
+    def __init__(self, cancelled):
+        self.cancelled = cancelled
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise TranslationCancelled()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.check()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.check()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.check()
+
+
+def _overlap(start, end, wait_start, wait_end):
+    return max(0.0, min(end, wait_end) - max(start, wait_start))
+
+
+def _validation_of(action_ids):
+    def matches(msg):
+        return msg["content"].get("action_id") in action_ids
+    return matches
+
+
+def _ready_mission(msg):
+    content = msg["content"]
+    if content.get("executed") or content.get("vision_context") is None:
+        return False
+    # A plan still being streamed by the planner is ready only when it has new steps
+    if not content.get("plan_complete", True):
+        return len(content.get("completed_steps", [])) < len(content["mission_plan"])
+    return True
+
+
 class NavigatorAgent:
-    def __init__(self, message_pool=None):
+    def __init__(self, message_pool=None, pipelined=False, max_workers=4, fast_path=True,
+                 validated=False, speculative=False, max_retries=1):
+        """
+        With ``pipelined`` all steps of a mission are translated concurrently
+        on up to ``max_workers`` workers and the resulting actions are posted
+        in step order, each step as soon as it and every step before it are
+        translated. With ``fast_path`` simple steps ("Leć 10m na zachód") are
+        translated by agents.step_grammar and only the rest go to the LLM.
+
+        With ``validated`` the Navigator waits for Guardian's verdicts on a
+        step's actions before the next step and translates a rejected step
+        again with the rejection reason, up to ``max_retries`` times.
+        ``speculative`` (implies validated) translates the next step while
+        Guardian validates and executes the current one; see run_validated().
+        """
+        if pipelined and (validated or speculative):
+            raise ValueError("pipelined and validated/speculative modes are exclusive")
         self.message_pool = message_pool
+        self.pipelined = pipelined
+        self.validated = validated or speculative
+        self.speculative = speculative
+        self.max_retries = max_retries
+        self.max_workers = max_workers
+        self.fast_path = fast_path
+        self.step_stats = collections.Counter()
         self.tools = [
             Tool(
                 name="Takeoff",
@@ -42,29 +128,52 @@ class NavigatorAgent:
         ]
 
         self.navigator = create_react_agent(
-            ChatOpenAI(model="gpt-4"),
+            scheduled(get_llm("gpt-4"), "navigator"),
             self.tools,
         )
         self.current_step = None
         self.current_vision = None
+        self.current_mission = None
+        self.callbacks = llm_metrics.callbacks("navigator")
 
 
+    def _action_context(self):
+        context = _translation.get()
+        if context is None:
+            return {"mission_id": self.current_mission, "step": self.current_step, "vision_context": self.current_vision}
+        return context
+
+    def _post(self, msg):
+        context = _translation.get()
+        if context is not None:
+            context["actions"].append(msg)
+        else:
+            self._publish(msg)
+
+    def _publish(self, msg):
+        self.message_pool.post(msg)
+
     def takeoff(self, altitude=2.0):
-        if not str(altitude).isnumeric() or float(altitude) <= 0:
+        # The LLM passes the altitude as text, the step grammar as a float
+        try:
+            altitude = float(altitude)
+        except (TypeError, ValueError):
+            return "Invalid altitude. Must be a positive number."
+        if altitude <= 0:
             return "Invalid altitude. Must be a positive number."
 
-        altitude = float(altitude)
-
+        context = self._action_context()
         msg = self.message_pool.build_message(
             "drone_action",
-            {"step": self.current_step,
-            "vision_context": self.current_vision,
+            {"mission_id": context["mission_id"],
+            "step": context["step"],
+            "vision_context": context["vision_context"],
             "action": "takeoff",
             "parameters": altitude,
             "executed": False,
             "logged": False}
         )
-        self.message_pool.post(msg)
+        self._post(msg)
         # print(f"[NAVIGATOR] Posting takeoff message: {msg}")
         return f"Drone taking off to {altitude} meters."
 
@@ -85,54 +194,226 @@ class NavigatorAgent:
         else:
             return "Invalid parameters. Expected a string, list, tuple, or dict with three values."
 
+        context = self._action_context()
         msg = self.message_pool.build_message(
             "drone_action",
-            {"step": self.current_step,
-            "vision_context": self.current_vision,
+            {"mission_id": context["mission_id"],
+            "step": context["step"],
+            "vision_context": context["vision_context"],
             "action": "fly_to",
             "parameters": [float(north), float(east), float(down)],
             "executed": False,
             "logged": False}
         )
         # print(f"[NAVIGATOR] Posting fly_to message: {msg}")
-        self.message_pool.post(msg)
+        self._post(msg)
         return f"Drone flying to (N:{north}, E:{east}, D:{down})."
 
     def land(self, arg=None):
+        context = self._action_context()
         msg = self.message_pool.build_message(
             "drone_action",
-            {"step": self.current_step,
-             "vision_context": self.current_vision,
+            {"mission_id": context["mission_id"],
+             "step": context["step"],
+             "vision_context": context["vision_context"],
             "action": "land",
             "executed": False,
             "logged": False}
         )
-        self.message_pool.post(msg)
+        self._post(msg)
         # print(f"[NAVIGATOR] Posting land message: {msg}")
         return "Drone landing."
 
+    def step_prompt(self, step, vision_context, rejection=None):
+        prompt = f"Krok misji: {step} \nKontekst wizji: {vision_context}"
+        if rejection is not None:
+            prompt += (f"\nGuardian odrzucił poprzednią akcję dla tego kroku: {rejection}"
+                       f"\nZaproponuj inną, bezpieczną akcję.")
+        return prompt
+
+    def translate_locally(self, step):
+        """Post the actions of a step the grammar understands; False sends it to the LLM."""
+        actions = parse_step(step) if self.fast_path else None
+        if actions is None:
+            self.step_stats["llm"] += 1
+            return False
+        self.step_stats["local"] += 1
+        for action, parameters in actions:
+            print(f"[NAVIGATOR] Parsed locally: {action} {parameters if parameters is not None else ''}")
+            getattr(self, action)(parameters)
+        return True
+
+    def run_step(self, step, vision_context, rejection=None):
+        # A rejected step goes to the LLM with the reason; the grammar would answer the same again
+        if rejection is not None or not self.translate_locally(step):
+            content = self.step_prompt(step, vision_context, rejection)
+            callbacks = self.callbacks
+            cancelled = (_translation.get() or {}).get("cancelled")
+            if cancelled is not None:
+                callbacks = callbacks + [_CancelCheck(cancelled)]
+            self.navigator.invoke({"messages": [HumanMessage(content=content)]},
+                                  {"recursion_limit": 25, "callbacks": callbacks})
+
+    def translate_step(self, step, vision_context, mission_id, rejection=None, cancelled=None):
+        """
+        Translate one step and return its drone_action messages unposted.
+        Setting the ``cancelled`` event stops the translation before its next
+        LLM or tool call with TranslationCancelled.
+        """
+        if cancelled is not None and cancelled.is_set():
+            raise TranslationCancelled()
+        context = {"mission_id": mission_id, "step": step, "vision_context": vision_context, "actions": [],
+                   "cancelled": cancelled}
+        token = _translation.set(context)
+        try:
+            print(f"[NAVIGATOR] Translating step: {step['cel']}")
+            self.run_step(step, vision_context, rejection)
+        finally:
+            _translation.reset(token)
+        return context["actions"]
+
+    def try_translate(self, step, vision_context, mission_id, rejection=None, cancelled=None):
+        """translate_step() returning (actions, started, finished); a failed translation has no actions."""
+        started = time.perf_counter()
+        try:
+            actions = self.translate_step(step, vision_context, mission_id, rejection, cancelled)
+        except TranslationCancelled:
+            print(f"[NAVIGATOR] Speculative translation of step '{step['cel']}' cancelled")
+            actions = []
+        except Exception as e:
+            print(f"[NAVIGATOR] Translation of step '{step['cel']}' failed: {e}")
+            actions = []
+        return actions, started, time.perf_counter()
+
+    def await_verdicts(self, actions):
+        """Block until Guardian has validated every posted action; returns the first rejection or None."""
+        pending = {action["id"] for action in actions}
+        rejection = None
+        while pending:
+            validations = self.message_pool.subscribe("guardian_validation", _validation_of(pending),
+                                                      timeout=VERDICT_TIMEOUT)
+            if not validations:
+                print(f"[NAVIGATOR] No Guardian verdict for {len(pending)} action(s) in {VERDICT_TIMEOUT:.0f}s, moving on")
+                break
+            for validation in validations:
+                pending.discard(validation["content"]["action_id"])
+                if rejection is None and validation["content"].get("validation") != "OK":
+                    rejection = validation["content"]["validation"]
+        return rejection
+
+    def report_speculation(self, msg, saved, discarded):
+        self.step_stats["speculation_saved"] += saved
+        self.step_stats["speculation_discarded"] += discarded
+        self.message_pool.update(msg["id"], speculation_saved=saved, speculation_discarded=discarded)
+        print(f"[NAVIGATOR] Speculation saved {saved:.2f}s on this mission ({discarded} discarded)")
+
+    def run_validated(self, msg, steps, completed_steps):
+        """
+        Post one step at a time and wait for Guardian's verdicts on it. With
+        ``speculative`` the next step is translated meanwhile, unposted; its
+        actions are posted once the current step is approved. If Guardian
+        rejects the current step the speculative translation is cancelled
+        and the step is translated again with the rejection reason; once the
+        retries are used up the next step is translated afresh.
+        """
+        vision_context = msg["content"]["vision_context"]
+        mission_id = msg["content"].get("mission_id", msg["id"])
+        saved, discarded = 0.0, 0
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="navigator-speculative") as executor:
+            actions = self.try_translate(steps[0], vision_context, mission_id)[0] if steps else []
+            index = retries = 0
+            while index < len(steps):
+                step = steps[index]
+                print(f"[NAVIGATOR] Executing step: {step['cel']}")
+                for action in actions:
+                    self._publish(action)
+                ahead = None
+                if self.speculative and index + 1 < len(steps):
+                    cancel_ahead = threading.Event()
+                    ahead = executor.submit(self.try_translate, steps[index + 1], vision_context, mission_id,
+                                            None, cancel_ahead)
+                wait_start = time.perf_counter()
+                rejection = self.await_verdicts(actions)
+                wait_end = time.perf_counter()
+                if rejection is not None and ahead is not None:
+                    # The next step was translated for an approved step; nothing of it was posted yet.
+                    # A queued translation never starts, a running one stops before its next LLM or tool call
+                    ahead.cancel()
+                    cancel_ahead.set()
+                    ahead = None
+                    discarded += 1
+                if rejection is not None and retries < self.max_retries:
+                    retries += 1
+                    print(f"[NAVIGATOR] Step '{step['cel']}' rejected, translating it again: {rejection}")
+                    actions = self.try_translate(step, vision_context, mission_id, rejection)[0]
+                    continue
+                self.complete_step(msg, step, [], completed_steps)
+                index, retries = index + 1, 0
+                if ahead is not None:
+                    actions, started, finished = ahead.result()
+                    saved += _overlap(started, finished, wait_start, wait_end)
+                elif index < len(steps):
+                    actions = self.try_translate(steps[index], vision_context, mission_id)[0]
+        if self.speculative:
+            self.report_speculation(msg, saved, discarded)
+
+    def complete_step(self, msg, step, actions, completed_steps):
+        for action in actions:
+            self._publish(action)
+        completed_steps.append(step["id"])
+        self.message_pool.update(msg["id"], completed_steps=list(completed_steps))
+
+    def finish_mission(self, msg):
+        # A streamed plan may still grow; the mission is done once the planner closed it
+        current = self.message_pool.get(msg["id"])
+        if current is None:
+            # Cleared by ReflectionAgent or dropped by pool retention meanwhile
+            return
+        content = current["content"]
+        completed_steps = content.get("completed_steps", [])
+        pending = [step for step in content["mission_plan"] if step["id"] not in completed_steps]
+        if content.get("plan_complete", True) and not pending:
+            self.message_pool.mark_executed(msg["id"])
+
+    def run_pipelined(self, msg, steps, completed_steps):
+        vision_context = msg["content"]["vision_context"]
+        mission_id = msg["content"].get("mission_id", msg["id"])
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="navigator") as executor:
+            futures = [executor.submit(self.translate_step, step, vision_context, mission_id) for step in steps]
+            for step, future in zip(steps, futures):
+                try:
+                    actions = future.result()
+                except Exception as e:
+                    print(f"[NAVIGATOR] Translation of step '{step['cel']}' failed: {e}")
+                    actions = []
+                else:
+                    print(f"[NAVIGATOR] Executing step: {step['cel']}")
+                self.complete_step(msg, step, actions, completed_steps)
+        print(f"[NAVIGATOR] Translated {len(steps)} steps in {time.perf_counter() - start:.2f}s (pipelined)")
+
     def read_messages(self):
         while True:
-            messages = self.message_pool.get_all()
+            messages = self.message_pool.subscribe("mission_steps", _ready_mission)
             for msg in messages:
-                if msg["msg_type"] == "mission_steps" and not msg["content"].get("executed"):
-                    if msg["content"].get("vision_context") is not None:
-                        vision_context = msg["content"]["vision_context"]
-                        self.current_vision = vision_context
-                        for step in msg["content"]["mission_plan"]:
+                if _ready_mission(msg):
+                    vision_context = msg["content"]["vision_context"]
+                    self.current_vision = vision_context
+                    self.current_mission = msg["content"].get("mission_id", msg["id"])
+                    # Steps already translated before a restart are skipped when replayed from the journal
+                    completed_steps = list(msg["content"].get("completed_steps", []))
+                    steps = [step for step in msg["content"]["mission_plan"] if step["id"] not in completed_steps]
+                    if self.pipelined:
+                        self.run_pipelined(msg, steps, completed_steps)
+                    elif self.validated:
+                        self.run_validated(msg, steps, completed_steps)
+                    else:
+                        for step in steps:
                             self.current_step = step
                             print(f"[NAVIGATOR] Executing step: {step['cel']}")
-                            content = f"Krok misji: {step} \nKontekst wizji: {vision_context}"
-                            result = self.navigator.invoke({"messages": [HumanMessage(content=content)]}, 
-                                                           {"recursion_limit": 25}
-                                                           )
-                            # print(f"Result: {self.summarize_chat(result)}")
-                        modified_msg = msg.copy()
-                        modified_msg["content"]["executed"] = True
-
-                        self.message_pool.post(modified_msg)
-                        self.message_pool.remove_message(msg)
-            time.sleep(1)
+                            self.run_step(step, vision_context)
+                            self.complete_step(msg, step, [], completed_steps)
+                    self.finish_mission(msg)
 
     def run_task(self, task):
         if isinstance(task, dict):
@@ -141,7 +422,7 @@ class NavigatorAgent:
             content = f"Krok misji: {step}\nKontekst wizji: {vision}"
         else:
             content = str(task)
-        return self.navigator.invoke({"messages": [HumanMessage(content=content)]})
+        return self.navigator.invoke({"messages": [HumanMessage(content=content)]}, {"callbacks": self.callbacks})
 
     def start(self):
         navigator_thread = threading.Thread(target=self.read_messages, daemon=True)
@@ -202,3 +483,138 @@ class NavigatorAgent:
                 lines.append(f"{tool_name} ⇠  {_wrap(msg.get('content', ''))}")
 
         return "\n".join(lines)
+
+
+class AsyncNavigatorAgent(NavigatorAgent):
+    """NavigatorAgent for the asyncio runtime (agents.async_runtime)."""
+
+    def _publish(self, msg):
+        # Tools are plain functions that LangGraph may run in a worker thread
+        self.message_pool.post_nowait(msg)
+
+    async def run_step(self, step, vision_context, rejection=None):
+        if rejection is not None or not self.translate_locally(step):
+            content = self.step_prompt(step, vision_context, rejection)
+            await self.navigator.ainvoke({"messages": [HumanMessage(content=content)]},
+                                         {"recursion_limit": 25, "callbacks": self.callbacks})
+
+    async def translate_step(self, step, vision_context, mission_id, rejection=None):
+        context = {"mission_id": mission_id, "step": step, "vision_context": vision_context, "actions": []}
+        token = _translation.set(context)
+        try:
+            print(f"[NAVIGATOR] Translating step: {step['cel']}")
+            await self.run_step(step, vision_context, rejection)
+        finally:
+            _translation.reset(token)
+        return context["actions"]
+
+    async def try_translate(self, step, vision_context, mission_id, rejection=None):
+        started = time.perf_counter()
+        try:
+            actions = await self.translate_step(step, vision_context, mission_id, rejection)
+        except Exception as e:
+            print(f"[NAVIGATOR] Translation of step '{step['cel']}' failed: {e}")
+            actions = []
+        return actions, started, time.perf_counter()
+
+    async def await_verdicts(self, actions):
+        pending = {action["id"] for action in actions}
+        rejection = None
+        while pending:
+            validations = await self.message_pool.subscribe("guardian_validation", _validation_of(pending),
+                                                            timeout=VERDICT_TIMEOUT)
+            if not validations:
+                print(f"[NAVIGATOR] No Guardian verdict for {len(pending)} action(s) in {VERDICT_TIMEOUT:.0f}s, moving on")
+                break
+            for validation in validations:
+                pending.discard(validation["content"]["action_id"])
+                if rejection is None and validation["content"].get("validation") != "OK":
+                    rejection = validation["content"]["validation"]
+        return rejection
+
+    async def run_validated(self, msg, steps, completed_steps):
+        vision_context = msg["content"]["vision_context"]
+        mission_id = msg["content"].get("mission_id", msg["id"])
+        saved, discarded = 0.0, 0
+        actions = (await self.try_translate(steps[0], vision_context, mission_id))[0] if steps else []
+        index = retries = 0
+        while index < len(steps):
+            step = steps[index]
+            print(f"[NAVIGATOR] Executing step: {step['cel']}")
+            for action in actions:
+                self._publish(action)
+            ahead = None
+            if self.speculative and index + 1 < len(steps):
+                ahead = asyncio.create_task(self.try_translate(steps[index + 1], vision_context, mission_id))
+            wait_start = time.perf_counter()
+            rejection = await self.await_verdicts(actions)
+            wait_end = time.perf_counter()
+            if rejection is not None and ahead is not None:
+                # The next step was translated for an approved step; nothing of it was posted yet
+                ahead.cancel()
+                ahead = None
+                discarded += 1
+            if rejection is not None and retries < self.max_retries:
+                retries += 1
+                print(f"[NAVIGATOR] Step '{step['cel']}' rejected, translating it again: {rejection}")
+                actions = (await self.try_translate(step, vision_context, mission_id, rejection))[0]
+                continue
+            self.complete_step(msg, step, [], completed_steps)
+            index, retries = index + 1, 0
+            if ahead is not None:
+                actions, started, finished = await ahead
+                saved += _overlap(started, finished, wait_start, wait_end)
+            elif index < len(steps):
+                actions = (await self.try_translate(steps[index], vision_context, mission_id))[0]
+        if self.speculative:
+            self.report_speculation(msg, saved, discarded)
+
+    async def run_pipelined(self, msg, steps, completed_steps):
+        vision_context = msg["content"]["vision_context"]
+        mission_id = msg["content"].get("mission_id", msg["id"])
+        limit = asyncio.Semaphore(self.max_workers)
+
+        async def bounded(step):
+            async with limit:
+                return await self.translate_step(step, vision_context, mission_id)
+
+        start = time.perf_counter()
+        # Each task runs in a copy of the current context, so _translation stays per step
+        tasks = [asyncio.create_task(bounded(step)) for step in steps]
+        for step, task in zip(steps, tasks):
+            try:
+                actions = await task
+            except Exception as e:
+                print(f"[NAVIGATOR] Translation of step '{step['cel']}' failed: {e}")
+                actions = []
+            else:
+                print(f"[NAVIGATOR] Executing step: {step['cel']}")
+            self.complete_step(msg, step, actions, completed_steps)
+        print(f"[NAVIGATOR] Translated {len(steps)} steps in {time.perf_counter() - start:.2f}s (pipelined)")
+
+    async def read_messages(self):
+        while True:
+            messages = await self.message_pool.subscribe("mission_steps", _ready_mission)
+            for msg in messages:
+                if _ready_mission(msg):
+                    vision_context = msg["content"]["vision_context"]
+                    self.current_vision = vision_context
+                    self.current_mission = msg["content"].get("mission_id", msg["id"])
+                    completed_steps = list(msg["content"].get("completed_steps", []))
+                    steps = [step for step in msg["content"]["mission_plan"] if step["id"] not in completed_steps]
+                    if self.pipelined:
+                        await self.run_pipelined(msg, steps, completed_steps)
+                    elif self.validated:
+                        await self.run_validated(msg, steps, completed_steps)
+                    else:
+                        for step in steps:
+                            self.current_step = step
+                            print(f"[NAVIGATOR] Executing step: {step['cel']}")
+                            await self.run_step(step, vision_context)
+                            self.complete_step(msg, step, [], completed_steps)
+                    self.finish_mission(msg)
+
+    def start(self):
+        task = asyncio.get_running_loop().create_task(self.read_messages())
+        print("[NAVIGATOR] Navigator agent started and listening for tasks...")
+        return task
@@ -0,0 +1,261 @@
+import collections
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+
+from agents.step_grammar import DIRECTIONS, UNITS, VERTICAL, fold
+from agents.ttl_cache import TTLCache
+
+# Words that do not change what the operator asks for
+STOP_WORDS = {
+    "teraz", "prosze", "natychmiast", "juz", "dron", "drona", "drone",
+    "zaraz", "mozesz", "czy", "please", "now",
+}
+# Commands with these words refer to earlier turns, so the history is part of the key
+CONTEXT_WORDS = {
+    "to", "tam", "tego", "tak", "samo", "jeszcze", "ponownie", "znowu", "powtorz",
+    "wroc", "poprzedni", "poprzednio", "ostatni", "ostatnio", "again", "same",
+}
+# Heading-relative directions, compared like compass directions
+RELATIVE_DIRECTIONS = {"przodu", "przod", "tylu", "tyl", "lewo", "prawo"}
+# Connectives and prepositions left out of the signature; the words around them carry the meaning
+LINK_WORDS = {
+    "a", "i", "oraz", "potem", "nastepnie", "pozniej", "na", "w", "we", "o", "z", "ze", "sie",
+    "kierunku", "strone",
+}
+# Inflectional endings (folded) dropped by _stem(), longest first
+ENDINGS = (
+    "owie", "ami", "ach", "ego", "emu", "iej", "ich", "ych", "imi", "ymi", "owi",
+    "ow", "om", "em", "ie", "ia", "iu", "ej", "ym", "im",
+    "a", "e", "i", "o", "u", "y",
+)
+# Guardian reports the planner keeps in its memory; they do not change plans
+REPORT_PREFIXES = ("EXECUTED MISSION STEP", "REJECTED")
+
+_WORD = re.compile(r"\d+(?:[.,]\d+)?|[a-z]+")
+
+
+def _words(command):
+    return [word for word in _WORD.findall(fold(command or "")) if word not in STOP_WORDS]
+
+
+def normalize_command(command):
+    return " ".join(_words(command))
+
+
+def _stem(word):
+    """``word`` without its inflectional ending, so "drzewie" and "drzewa" compare equal."""
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def _direction_word(word):
+    if word in VERTICAL or word in RELATIVE_DIRECTIONS:
+        return word
+    return next((stem for stem, _ in DIRECTIONS if word.startswith(stem)), None)
+
+
+def _content_words(words):
+    """``words`` without connectives and prepositions, each number joined with its unit as metres ("10m")."""
+    content = []
+    for i, word in enumerate(words):
+        if word[0].isdigit():
+            unit = words[i + 1] if i + 1 < len(words) else None
+            content.append(f"{float(word.replace(',', '.')) * UNITS.get(unit, 1.0):g}m")
+        elif not (word in UNITS and i > 0 and words[i - 1][0].isdigit()) and word not in LINK_WORDS:
+            content.append(word)
+    return content
+
+
+def _signature(words):
+    """
+    The meaning of a command in command order: numbers, directions,
+    negations, verbs and every other content word, the latter stemmed. A
+    semantic hit must have the same signature, so only inflection, units,
+    stop words and connectives may differ; "wyląduj przy domu" does not match
+    "wyląduj przy drzewie" and a command with an extra step does not match
+    the shorter one. Each number is paired with the direction that follows
+    it, so "5 m na północ, 3 m na wschód" and "3 m na północ, 5 m na wschód"
+    get different signatures.
+    """
+    signature = []
+    pending = None
+    for word in _content_words(words):
+        if word[0].isdigit():
+            pending = [word]
+            signature.append(pending)
+        elif word == "nie":
+            signature.append([word])
+        elif _direction_word(word) is None:
+            signature.append([_stem(word)])
+        elif pending is not None:
+            pending.append(_direction_word(word))
+            pending = None
+        else:
+            signature.append([_direction_word(word)])
+    return [" ".join(entry) for entry in signature]
+
+
+def hashed_embedding(text, dimensions=256):
+    """
+    Local bag-of-features embedding: content words plus character trigrams,
+    hashed into a fixed number of dimensions and L2-normalized. Trigrams make
+    inflected forms ("wyląduj" / "ląduj") land close to each other.
+    """
+    vector = [0.0] * dimensions
+    for word in _words(text):
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode()) % dimensions] += 0.3
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _message_fields(message):
+    if isinstance(message, dict):
+        return message.get("type"), message.get("content", "")
+    return getattr(message, "type", None), getattr(message, "content", str(message))
+
+
+def history_digest(command, chat_history, turns=2):
+    """
+    Digest of the part of the chat history a plan can depend on: the last
+    ``turns`` operator messages, and only when the command refers back to them.
+    """
+    if not CONTEXT_WORDS.intersection(_words(command)):
+        return ""
+    operator_turns = []
+    for message in chat_history or []:
+        kind, content = _message_fields(message)
+        if kind in (None, "human") and not str(content).startswith(REPORT_PREFIXES):
+            operator_turns.append(normalize_command(content))
+    recent = operator_turns[-turns:] if turns else []
+    return hashlib.sha1("\n".join(recent).encode()).hexdigest()
+
+
+class PlanCache:
+    """
+    Mission plans keyed by operator command, in two tiers.
+
+    lookup() first tries an exact match on the normalized command plus the
+    relevant history digest, then the most similar cached command with the
+    same digest and the same signature (see _signature(): the same words up
+    to inflection, in the same order), if its cosine similarity is at least
+    ``threshold`` (None turns the semantic tier off). ``embed`` maps text to
+    a vector; the default is the dependency-free hashed_embedding().
+    Entries are LRU/TTL evicted and, with ``path``, persisted as JSON.
+    """
+
+    def __init__(self, path=None, maxsize=256, ttl=24 * 3600.0, threshold=0.9, embed=None, history_turns=2):
+        self.path = path
+        self.ttl = ttl
+        self.threshold = threshold
+        self.embed = embed or hashed_embedding
+        self.history_turns = history_turns
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.counters = collections.Counter()
+        self.save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def key(self, command, chat_history=None):
+        digest = history_digest(command, chat_history, self.history_turns)
+        return f"{normalize_command(command)}|{digest}"
+
+    def lookup(self, command, chat_history=None):
+        """Return (plan, 'exact' | 'semantic') or (None, None)."""
+        key = self.key(command, chat_history)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.counters["exact_hits"] += 1
+            return entry["plan"], "exact"
+
+        if self.threshold is not None:
+            digest = key.rsplit("|", 1)[1]
+            words = _words(command)
+            signature = _signature(words)
+            vector = self.embed(" ".join(_content_words(words)))
+            best, best_score = None, self.threshold
+            for candidate_key, candidate in self.entries.items():
+                if candidate["digest"] != digest or candidate["signature"] != signature:
+                    continue
+                score = _cosine(vector, candidate["vector"])
+                if score >= best_score:
+                    best, best_score = candidate_key, score
+            if best is not None:
+                entry = self.entries.get(best)
+                if entry is not None:
+                    self.counters["semantic_hits"] += 1
+                    print(f"[PLAN CACHE] '{command}' matched '{entry['command']}' (similarity {best_score:.2f})")
+                    return entry["plan"], "semantic"
+
+        self.counters["misses"] += 1
+        return None, None
+
+    def store(self, command, chat_history, plan):
+        key = self.key(command, chat_history)
+        words = _words(command)
+        self.entries.put(key, {
+            "command": command,
+            "digest": key.rsplit("|", 1)[1],
+            "signature": _signature(words),
+            "vector": self.embed(" ".join(_content_words(words))),
+            "plan": plan,
+            "stored_at": time.time(),
+        })
+        self.counters["stored"] += 1
+        if self.path:
+            self.save()
+
+    def save(self):
+        with self.save_lock:
+            records = [{"key": key, **entry} for key, entry in self.entries.items()]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[PLAN CACHE] Ignoring unreadable cache file {self.path}: {e}")
+            return
+        now = time.time()
+        for record in records:
+            key = record.pop("key")
+            # Files written before signatures kept the command order hold sorted ones
+            record["signature"] = _signature(_words(record["command"]))
+            ttl = None if self.ttl is None else self.ttl - (now - record["stored_at"])
+            if ttl is None or ttl > 0:
+                self.entries.put(key, record, ttl=ttl)
+        print(f"[PLAN CACHE] Loaded {len(self.entries)} plans from {self.path}")
+
+    def clear(self):
+        self.entries.clear()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def stats(self):
+        stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        stats.update(self.counters)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        stats["size"] = len(self.entries)
+        stats["evictions"] = self.entries.counters["evictions"]
+        return stats
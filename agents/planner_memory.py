@@ -0,0 +1,159 @@
+import collections
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import SystemMessage, get_buffer_string
+
+from agents.plan_cache import REPORT_PREFIXES
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+
+
+def _tokenizer():
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # The encoding is downloaded on first use, which fails offline
+                print(f"[PLANNER MEMORY] tiktoken unavailable ({e.__class__.__name__}), estimating tokens")
+    return _encoding
+
+
+def count_tokens(content):
+    """Tokens of a string or a list of messages; ~4 characters per token without tiktoken."""
+    if not isinstance(content, str):
+        content = get_buffer_string(content) if content else ""
+    encoding = _tokenizer()
+    if not encoding:
+        return len(content) // 4 + 1
+    return len(encoding.encode(content, disallowed_special=()))
+
+
+class BudgetedMemory(ConversationBufferMemory):
+    """
+    ConversationBufferMemory whose prompt footprint stays bounded.
+
+    Guardian reports ("EXECUTED MISSION STEP ...", "REJECTED ...") are not kept
+    as turns but folded into a digest of counts and the last few steps.
+    Operator turns stay verbatim until they exceed ``max_tokens``; older ones
+    are shortened into a running summary of at most ``summary_tokens``.
+    load_memory_variables() returns the digest and summary as one system
+    message followed by the most recent turns; messages_within() does the same
+    for a smaller, per-prompt budget.
+    """
+
+    max_tokens: int = 1500
+    summary_tokens: int = 300
+    summary_line_chars: int = 120
+    recent_reports: int = 5
+    executed: int = 0
+    rejected: int = 0
+    last_executed: list = []
+    last_rejected: list = []
+    summary: list = []
+    summarized_turns: int = 0
+
+    def save_context(self, inputs, outputs):
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        if input_str.startswith(REPORT_PREFIXES):
+            self.record_report(input_str)
+            return
+        super().save_context(inputs, outputs)
+        self.fold_old_turns()
+
+    def record_report(self, report):
+        entry = report.split("Step:", 1)[-1].strip()
+        if report.startswith("REJECTED"):
+            self.rejected += 1
+            self.last_rejected = (self.last_rejected + [entry])[-self.recent_reports:]
+        else:
+            self.executed += 1
+            self.last_executed = (self.last_executed + [entry])[-self.recent_reports:]
+
+    def fold_old_turns(self):
+        messages = self.chat_memory.messages
+        while len(messages) > 2 and count_tokens(messages) > self.max_tokens - self.summary_tokens:
+            human, ai = messages[0], messages[1]
+            line = f"Operator: {human.content} | Planner: {ai.content}".replace("\n", " ")
+            if len(line) > self.summary_line_chars:
+                line = line[:self.summary_line_chars - 3] + "..."
+            self.summary = self.summary + [line]
+            self.summarized_turns += 1
+            del messages[:2]
+        while len(self.summary) > 1 and count_tokens("\n".join(self.summary)) > self.summary_tokens:
+            self.summary = self.summary[1:]
+
+    def _digest_text(self, summary, executed, rejected):
+        lines = []
+        if self.executed or self.rejected:
+            lines.append(f"Mission log: {self.executed} steps executed, {self.rejected} rejected.")
+            lines.extend(f"Executed: {entry}" for entry in executed)
+            lines.extend(f"Rejected: {entry}" for entry in rejected)
+        if self.summarized_turns:
+            lines.append("Earlier conversation (summarized):")
+            omitted = self.summarized_turns - len(summary)
+            if omitted:
+                lines.append(f"({omitted} older turns omitted)")
+            lines.extend(summary)
+        return "\n".join(lines)
+
+    def digest(self, max_tokens=None):
+        """Mission log and conversation summary, dropping the oldest lines to fit ``max_tokens``."""
+        summary, executed, rejected = list(self.summary), list(self.last_executed), list(self.last_rejected)
+        while True:
+            text = self._digest_text(summary, executed, rejected)
+            if max_tokens is None or count_tokens(text) <= max_tokens or not (summary or executed or rejected):
+                return text
+            (summary or executed or rejected).pop(0)
+
+    def messages_within(self, budget):
+        """Digest plus as many of the most recent turns as fit into ``budget`` tokens."""
+        # The digest gets at most half of the budget, recent turns the rest
+        digest = self.digest(budget // 2)
+        head = [SystemMessage(content=digest)] if digest else []
+        remaining = budget - count_tokens(head)
+        recent = []
+        for message in reversed(self.chat_memory.messages):
+            cost = count_tokens([message])
+            if cost > remaining:
+                break
+            recent.insert(0, message)
+            remaining -= cost
+        return head + recent
+
+    def load_memory_variables(self, inputs):
+        messages = self.messages_within(self.max_tokens)
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def clear(self):
+        super().clear()
+        self.executed = self.rejected = self.summarized_turns = 0
+        self.last_executed, self.last_rejected, self.summary = [], [], []
+
+
+class PromptMeter:
+    """Running token counts of the prompts an agent sends, per prompt name."""
+
+    def __init__(self):
+        self.prompts = collections.defaultdict(collections.Counter)
+
+    def record(self, name, content):
+        tokens = count_tokens(content)
+        counts = self.prompts[name]
+        counts["calls"] += 1
+        counts["total"] += tokens
+        counts["last"] = tokens
+        counts["max"] = max(counts["max"], tokens)
+        return tokens
+
+    def stats(self):
+        return {name: dict(counts, mean=counts["total"] / counts["calls"]) for name, counts in self.prompts.items()}
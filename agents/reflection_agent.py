@@ -1,20 +1,23 @@
-from langchain_community.chat_models import ChatOpenAI
 from langchain_core.messages import HumanMessage
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import OpenAIEmbeddings
 import threading
-import time
 import os
 from tools import drone_tools
+from agents import llm_metrics
+from agents.llm_registry import get_llm
+from agents.llm_scheduler import scheduled
+
+
+def _executed_action(msg):
+    return msg["content"].get("executed", False)
+
 
 class ReflectionAgent:
     def __init__(self, message_pool=None, vector_store_path="reflection_store"):
         self.message_pool = message_pool
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.2,
-            max_tokens=300,
-        )
+        self.llm = scheduled(get_llm("gpt-4o-mini", temperature=0.2, max_tokens=300), "reflection")
+        self.callbacks = llm_metrics.callbacks("reflection")
         self.vector_store_path = vector_store_path
 
         if not os.path.exists(vector_store_path) or not os.path.exists(f"{vector_store_path}/index.faiss"):
@@ -49,7 +52,7 @@ class ReflectionAgent:
             Odpowiedz tylko 'OK' jeśli akcja jest logiczna i poprawna w danym kontekście wizyjnym. Jeśli nie, napisz krótko dlaczego odrzucasz akcję.
             """
         message = HumanMessage(content=prompt)
-        response = self.llm.invoke([message])
+        response = self.llm.invoke([message], config={"callbacks": self.callbacks})
         return response.content.strip()
 
     def save_to_vector_store(self, mission_success, message_pool_data):
@@ -74,25 +77,18 @@ class ReflectionAgent:
 
     def read_messages(self):
         while True:
-            messages = self.message_pool.get_all()
-            mission_completed = any(
-                msg["msg_type"] == "drone_action" and msg["content"].get("executed", False)
-                for msg in messages
-            )
-            
-            if mission_completed:
-                print("Mission completed. Asking user for mission success...")
-                mission_success = self.ask_user_for_mission_success()
+            # Blocks until an executed drone_action marks the mission as completed
+            self.message_pool.subscribe("drone_action", _executed_action)
+            messages = self.message_pool.history()
 
-                self.save_to_vector_store(mission_success, messages)
+            print("Mission completed. Asking user for mission success...")
+            mission_success = self.ask_user_for_mission_success()
 
-                with self.message_pool.lock:
-                    self.message_pool.messages.clear()
+            self.save_to_vector_store(mission_success, messages)
 
-                print("System reset. Ready for a new mission.")
-                continue
+            self.message_pool.clear()
 
-            time.sleep(2)
+            print("System reset. Ready for a new mission.")
 
     def start(self):
         reflection_thread = threading.Thread(target=self.read_messages, daemon=True)
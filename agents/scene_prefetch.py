@@ -0,0 +1,109 @@
+import collections
+import math
+import threading
+import time
+
+SCENE_TYPE = "scene_description"
+# Default max_staleness: the refresh interval plus a slow vision LLM call, so
+# a scene is still fresh when its description is published, with some slack
+MAX_STALENESS = 8.0
+
+
+def latest_scene(message_pool, max_staleness, not_before=None):
+    """
+    Content of the freshest scene_description whose frame was captured at
+    most ``max_staleness`` seconds ago, and not before ``not_before`` (a
+    time.time() value, e.g. when the drone was last seen moving), or None.
+    """
+    scenes = [msg["content"] for msg in message_pool.get_type(SCENE_TYPE)]
+    if not scenes:
+        return None
+    scene = max(scenes, key=lambda content: content["captured_at"])
+    if not_before is not None and scene["captured_at"] < not_before:
+        return None
+    return scene if time.time() - scene["captured_at"] <= max_staleness else None
+
+
+def pose_of(telemetry):
+    """(north, east, down, yaw) from a /telemetry answer, or None."""
+    try:
+        return tuple(float(telemetry[key]) for key in ("north", "east", "down", "yaw"))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def pose_change(before, after):
+    """(distance in m, yaw change in degrees) between two poses; yaw is in radians."""
+    distance = math.dist(before[:3], after[:3])
+    yaw = abs(math.degrees(after[3] - before[3])) % 360
+    return distance, min(yaw, 360 - yaw)
+
+
+class ScenePrefetch:
+    """
+    When VisionAgent refreshes the scene description in the background.
+
+    A refresh is due ``interval`` seconds after the last one (None: only on
+    motion), or as soon as telemetry shows the drone moved ``motion_threshold``
+    metres or turned ``yaw_threshold`` degrees since the frame of the last
+    description. Telemetry is polled every ``poll_interval`` seconds. Missions
+    get the latest description attached if its frame was captured at most
+    ``max_staleness`` seconds ago and after the last motion trigger,
+    otherwise they wait for a new one. The age includes the LLM call that
+    described the frame, hence the default well above ``interval``.
+    """
+
+    def __init__(self, interval=2.0, motion_threshold=0.5, yaw_threshold=10.0, poll_interval=0.25,
+                 max_staleness=MAX_STALENESS):
+        self.interval = interval
+        self.motion_threshold = motion_threshold
+        self.yaw_threshold = yaw_threshold
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.last_refresh = None
+        self.last_pose = None
+        # time.time() of the last motion trigger; scenes captured before it show the old view
+        self.moved_at = None
+        self.counters = collections.Counter()
+
+    def watches_motion(self):
+        return self.motion_threshold is not None or self.yaw_threshold is not None
+
+    def trigger(self, pose, now):
+        """Why a refresh is due now ('start', 'interval' or 'motion'), or None."""
+        with self.lock:
+            if self.last_refresh is None:
+                return "start"
+            if pose is not None and self.last_pose is not None:
+                distance, yaw = pose_change(self.last_pose, pose)
+                if (self.motion_threshold is not None and distance >= self.motion_threshold) or \
+                        (self.yaw_threshold is not None and yaw >= self.yaw_threshold):
+                    return "motion"
+            if self.interval is not None and now - self.last_refresh >= self.interval:
+                return "interval"
+            return None
+
+    def next_frame(self, pose, trigger):
+        """Count a refresh about to fetch a frame; returns its sequence number."""
+        with self.lock:
+            self.sequence += 1
+            self.last_refresh = time.monotonic()
+            self.last_pose = pose
+            if trigger == "motion":
+                self.moved_at = time.time()
+            self.counters[f"refresh_{trigger}"] += 1
+            return self.sequence
+
+    def served(self, fresh):
+        with self.lock:
+            self.counters["served_fresh" if fresh else "served_stale"] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = {"frames": self.sequence, "served_fresh": 0, "served_stale": 0}
+            stats.update(self.counters)
+            served = stats["served_fresh"] + stats["served_stale"]
+            stats["fresh_rate"] = stats["served_fresh"] / served if served else 0.0
+            return stats
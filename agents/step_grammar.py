@@ -0,0 +1,140 @@
+import math
+import re
+import unicodedata
+
+from agents.guardian_rules import CONDITION_WORDS
+
+# Vocabulary is matched after folding: lower case, no Polish diacritics
+TAKEOFF_VERBS = ("wystartuj", "startuj", "start", "wzlec")
+LAND_VERBS = ("wyladuj", "laduj", "ladowanie", "wyladowanie")
+MOVE_VERBS = ("lec", "polec", "przelec", "przesun", "przemiesc")
+CLIMB_VERBS = ("wznies", "podnies", "zwieksz")
+DESCEND_VERBS = ("obniz", "zniz", "opadnij", "zmniejsz")
+
+# Word stem -> unit vector (north, east, down)
+DIRECTIONS = (
+    ("polnoc", (1.0, 0.0, 0.0)),
+    ("poludni", (-1.0, 0.0, 0.0)),
+    ("wschod", (0.0, 1.0, 0.0)),
+    ("zachod", (0.0, -1.0, 0.0)),
+)
+VERTICAL = {
+    "gore": (0.0, 0.0, -1.0), "gory": (0.0, 0.0, -1.0),
+    "dol": (0.0, 0.0, 1.0), "dolu": (0.0, 0.0, 1.0),
+}
+
+# In a climb or descend step these make the distance an absolute altitude, not a change
+ALTITUDE_WORDS = ("na", "do", "wysokosc", "wysokosci")
+
+# Multiplier to meters; a bare number is taken as meters
+UNITS = {
+    "m": 1.0, "metr": 1.0, "metry": 1.0, "metrow": 1.0, "metra": 1.0,
+    "cm": 0.01, "centymetr": 0.01, "centymetry": 0.01, "centymetrow": 0.01,
+    "km": 1000.0, "kilometr": 1000.0, "kilometry": 1000.0, "kilometrow": 1000.0,
+}
+
+# Words that carry no meaning of their own in a movement step
+FILLERS = {
+    "na", "o", "w", "do", "sie", "kierunku", "strone", "lot", "wysokosc",
+    "wysokosci", "pulap", "pulapu", "dron", "drona", "dystans", "odleglosc",
+}
+
+# A comma between digits is a decimal separator ("2,5 m"), not a clause break
+# "a potem" / "a nastepnie" are one separator, not a stray "a" before another one
+_CLAUSE_SPLIT = re.compile(r";|,(?!\d)|\b(?:a\s+nastepnie|a\s+potem|nastepnie|potem|oraz|i|a)\b")
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)?|[a-z]+")
+_DEFAULT_ALTITUDE = 2.0
+
+
+def fold(text):
+    text = str(text).lower().replace("ł", "l")
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+_CONDITIONS = tuple(fold(word) for word in CONDITION_WORDS)
+
+
+def _direction(word):
+    if word in VERTICAL:
+        return VERTICAL[word]
+    for stem, vector in DIRECTIONS:
+        if word.startswith(stem):
+            return vector
+    return None
+
+
+def _parse_clause(tokens):
+    verb, rest = tokens[0], tokens[1:]
+    distance = None
+    directions = []
+    i = 0
+    while i < len(rest):
+        token = rest[i]
+        if token[0].isdigit():
+            if distance is not None:
+                return None
+            distance = float(token.replace(",", "."))
+            if i + 1 < len(rest) and rest[i + 1] in UNITS:
+                distance *= UNITS[rest[i + 1]]
+                i += 1
+        elif _direction(token) is not None:
+            directions.append(_direction(token))
+        elif token not in FILLERS:
+            # Anything we do not understand sends the step to the LLM
+            return None
+        i += 1
+
+    if verb in TAKEOFF_VERBS:
+        if directions:
+            return None
+        return "takeoff", distance if distance is not None else _DEFAULT_ALTITUDE
+
+    if verb in LAND_VERBS:
+        if directions or distance is not None:
+            return None
+        return "land", None
+
+    if verb in CLIMB_VERBS or verb in DESCEND_VERBS:
+        # "na wysokość 10m" and "do 2 m" are absolute altitudes, which need the drone's state
+        if directions or distance is None or any(word in rest for word in ALTITUDE_WORDS):
+            return None
+        down = -distance if verb in CLIMB_VERBS else distance
+        return "fly_to", [0.0, 0.0, down]
+
+    if verb in MOVE_VERBS:
+        if not directions or distance is None:
+            return None
+        north, east, down = (sum(axis) for axis in zip(*directions))
+        length = math.sqrt(north ** 2 + east ** 2 + down ** 2)
+        if length == 0:
+            return None
+        scale = distance / length
+        return "fly_to", [round(north * scale, 3), round(east * scale, 3), round(down * scale, 3)]
+
+    return None
+
+
+def parse_step(mission_step):
+    """
+    Translate a simple Polish mission step into drone actions without the LLM.
+
+    Returns a list of (action, parameters) tuples for takeoff/fly_to/land, or
+    None when the step is conditional or uses words outside the grammar.
+    "Leć 10m na zachód" -> [("fly_to", [0.0, -10.0, 0.0])].
+    """
+    text = mission_step.get("cel") if isinstance(mission_step, dict) else mission_step
+    text = fold(text or "").strip().rstrip(".!")
+    if not text or any(word in text for word in _CONDITIONS):
+        return None
+
+    actions = []
+    for clause in _CLAUSE_SPLIT.split(text):
+        tokens = _TOKEN.findall(clause)
+        if not tokens:
+            continue
+        action = _parse_clause(tokens)
+        if action is None:
+            return None
+        actions.append(action)
+    return actions or None
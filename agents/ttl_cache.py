@@ -0,0 +1,70 @@
+import collections
+import threading
+import time
+
+
+class TTLCache:
+    """LRU cache whose entries also expire ``ttl`` seconds after being stored."""
+
+    def __init__(self, maxsize=256, ttl=600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return value
+                del self.entries[key]
+                self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return default
+
+    def put(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def __contains__(self, key):
+        # Membership test only, does not count as a hit or miss
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+
+    def items(self):
+        """Live (key, value) pairs from least to most recently used, without touching the LRU order."""
+        now = time.monotonic()
+        with self.lock:
+            return [(key, value) for key, (expires_at, value) in self.entries.items()
+                    if expires_at is None or expires_at > now]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = {"hits": 0, "misses": 0}
+            stats.update(self.counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["size"] = len(self.entries)
+            return stats
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -1,17 +1,82 @@
-from langchain_community.chat_models import ChatOpenAI
 from langchain_core.messages import HumanMessage
+import asyncio
 import base64
+import collections
+import httpx
 import requests
 import time
 import threading
 
+from agents import llm_metrics
+from agents.frame_cache import FrameCache, opencv_available
+from agents.frame_prep import FrameSettings, prepare_frame
+from agents.guardian_rules import CONDITION_WORDS
+from agents.llm_registry import get_llm
+from agents.local_perception import LocalPerception, summary_text
+from agents.json_stream import entry_number, json_from_llm
+from agents.llm_scheduler import scheduled
+from agents.scene_prefetch import SCENE_TYPE, latest_scene, pose_of
+from tools import drone_tools
+
+# Camera frames kept for describe_recent_frames()
+RECENT_FRAMES = 8
+
+
+def _missing_vision(msg):
+    return msg["content"].get("vision_context") is None
+
+
+def _conditional(msg):
+    """True when a mission step depends on what the camera sees ("jeśli widzisz ...")."""
+    return any(word in str(step.get("cel", "")).lower()
+               for step in msg["content"].get("mission_plan", []) for word in CONDITION_WORDS)
+
+
+def _described_by_llm(scene):
+    perception = scene["perception"]
+    return perception is None or perception["verdict"] == "ambiguous"
+
+
 class VisionAgent:
-    def __init__(self, message_pool=None):
+    def __init__(self, message_pool=None, frame_cache=None, frame_settings=None, local_perception=None,
+                 prefetch=None):
+        """
+        ``frame_cache`` (agents.frame_cache.FrameCache) reuses the description
+        of a recent frame when the new one looks the same; pass False to turn
+        it off. It needs OpenCV and stays off without it.
+        ``frame_settings`` (agents.frame_prep.FrameSettings) scale, crop and
+        re-encode camera frames before they are sent to the LLM.
+        ``local_perception`` (agents.local_perception.LocalPerception) answers
+        with an OpenCV summary of the frame when it can tell whether the way
+        ahead is clear or blocked, and only asks the LLM otherwise; pass False
+        to always ask the LLM. Missions with conditional steps always get
+        the LLM description, the local summary cannot answer their
+        conditions. It needs OpenCV and stays off without it.
+        With ``prefetch`` (agents.scene_prefetch.ScenePrefetch) the scene is
+        described in the background and published as a scene_description
+        message; missions get the latest one attached at once while it is
+        fresh enough.
+        """
         self.message_pool = message_pool
-        self.llm = ChatOpenAI(
-            model="gpt-4-turbo",
-            max_tokens=500,
-        )
+        self.frame_settings = frame_settings or FrameSettings()
+        if self.frame_settings.changes_frame() and self.frame_settings.prepare_on == "agent" \
+                and not opencv_available():
+            print("[VISION] OpenCV is not installed, camera frames are sent unprepared")
+        self.frame_cache = FrameCache() if frame_cache is None else frame_cache
+        if self.frame_cache and not opencv_available():
+            print("[VISION] OpenCV is not installed, frame cache disabled")
+            self.frame_cache = False
+        self.local_perception = LocalPerception() if local_perception is None else local_perception
+        if self.local_perception and not opencv_available():
+            print("[VISION] OpenCV is not installed, local perception disabled")
+            self.local_perception = False
+        self.llm = scheduled(get_llm("gpt-4-turbo", max_tokens=500), "vision")
+        self.callbacks = llm_metrics.callbacks("vision")
+
+        self.prefetch = prefetch
+        self.scene_msg_id = None
+        # (fetched at, JPEG) of the latest camera frames, for describe_recent_frames()
+        self.recent_frames = collections.deque(maxlen=RECENT_FRAMES)
 
         self.api_url = "http://localhost:5002/camera_image"
 
@@ -19,10 +84,6 @@ class VisionAgent:
         with open(image_path, "rb") as f:
             image_base64 = base64.b64encode(f.read()).decode("utf-8")
         image_data_url = f"data:image/jpeg;base64,{image_base64}"
-        llm = ChatOpenAI(
-            model="gpt-4-turbo",
-            max_tokens=500,
-        )
         message = HumanMessage(
             content=[
                 {"type": "text", "text": """
@@ -38,64 +99,366 @@ class VisionAgent:
                 {"type": "image_url", "image_url": {"url": image_data_url}},
             ]
         )
-        response = llm.invoke([message])
+        response = self.llm.invoke([message], config={"callbacks": self.callbacks})
         return response.content
 
-    def describe_image_from_api(self):
+    def image_part(self, image_bytes):
+        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+        image_data_url = f"data:image/jpeg;base64,{image_base64}"
+        return {"type": "image_url", "image_url": {"url": image_data_url, "detail": self.frame_settings.detail}}
+
+    def vision_message(self, image_bytes):
+        prompt = (
+            "Jesteś agentem wizji komputerowej, którego zadaniem jest pomoc agentowi nawigacyjnemu drona. "
+            "Otrzymujesz obraz z kamery zamontowanej na dronie.\n"
+            "Twoim zadaniem jest wygenerować bardzo zwięzły opis przestrzenny tego, co znajduje się na obrazie — tylko informacje kluczowe dla nawigacji drona.\n"
+            "Nie opisuj rodzaju ani koloru obiektów. Skup się tylko na ich:\n"
+            "- Położeniu względem kamery (np. 'na wprost', 'po lewej', 'w prawym dolnym rogu'),\n"
+            "- Szacunkowej odległości od kamery (np. 'blisko', 'daleko', 'średni dystans'),\n"
+            "- Rozmiarze w kadrze (np. 'duży', 'mały', 'zajmuje większość kadru').\n"
+            "Odpowiedź powinna mieć maksymalnie 3 zdania i może opcjonalnie przyjąć format listy.\n"
+            "Analizuj obraz:"
+        )
+        return HumanMessage(content=[{"type": "text", "text": prompt}, self.image_part(image_bytes)])
+
+    def batch_vision_message(self, frames, labels):
+        prompt = (
+            "Jesteś agentem wizji komputerowej, którego zadaniem jest pomoc agentowi nawigacyjnemu drona. "
+            f"Otrzymujesz {len(frames)} obrazów z kamery zamontowanej na dronie, każdy poprzedzony numerem i opisem "
+            "(np. kierunek kamery albo moment wykonania zdjęcia).\n"
+            "Dla każdego obrazu wygeneruj bardzo zwięzły opis przestrzenny — tylko informacje kluczowe dla nawigacji drona.\n"
+            "Nie opisuj rodzaju ani koloru obiektów. Skup się tylko na ich:\n"
+            "- Położeniu względem kamery (np. 'na wprost', 'po lewej', 'w prawym dolnym rogu'),\n"
+            "- Szacunkowej odległości od kamery (np. 'blisko', 'daleko', 'średni dystans'),\n"
+            "- Rozmiarze w kadrze (np. 'duży', 'mały', 'zajmuje większość kadru').\n"
+            "Opis każdego obrazu powinien mieć maksymalnie 3 zdania. Na koniec podsumuj wszystkie obrazy razem "
+            "(maksymalnie 3 zdania): co się zmieniło między nimi i gdzie jest wolna przestrzeń.\n"
+            "Zwróć wynik w postaci obiektu JSON, np.:\n"
+            '{"klatki": [{"nr": 1, "opis": "..."}, {"nr": 2, "opis": "..."}], "podsumowanie": "..."}\n'
+            "Obrazy:"
+        )
+        content = [{"type": "text", "text": prompt}]
+        for nr, (frame, label) in enumerate(zip(frames, labels), start=1):
+            content.append({"type": "text", "text": f"Obraz {nr}: {label}"})
+            content.append(self.image_part(frame))
+        return HumanMessage(content=content)
+
+    def parse_batch_description(self, content, labels):
+        descriptions = [None] * len(labels)
         try:
-            resp = requests.get(self.api_url)
+            answer = json_from_llm(content)
+            for entry in answer["klatki"]:
+                nr = entry_number(entry, len(labels))
+                # nr=0 or -1 would index from the end and describe the wrong frame
+                if nr is not None:
+                    descriptions[nr - 1] = str(entry["opis"]).strip()
+            aggregate = str(answer["podsumowanie"]).strip()
+        except Exception as e:
+            print(f"[VISION] Could not parse batch description ({e}), keeping the answer as the summary")
+            aggregate = content
+        return {
+            "frames": [{"label": label, "description": description}
+                       for label, description in zip(labels, descriptions)],
+            "aggregate": aggregate,
+        }
+
+    def describe_frames(self, frames, labels=None):
+        """
+        Describe several camera frames (e.g. at several yaws, or before and
+        after a move) in one LLM request. ``labels`` tell the model what each
+        frame is. Returns {"frames": [{"label", "description"}], "aggregate"};
+        a description is None when the answer could not be split per frame.
+        No frames give no request; one frame goes through describe_frame().
+        """
+        labels = list(labels) if labels is not None else [f"klatka {nr}" for nr in range(1, len(frames) + 1)]
+        if not frames:
+            return {"frames": [], "aggregate": ""}
+        if len(frames) == 1:
+            description = self.describe_frame(frames[0])[0]
+            return {"frames": [{"label": labels[0], "description": description}], "aggregate": description}
+        prepared = [self.prepared_frame(frame) for frame in frames]
+        response = self.llm.invoke([self.batch_vision_message(prepared, labels)], config={"callbacks": self.callbacks})
+        return self.parse_batch_description(response.content, labels)
+
+    def recent_frame_labels(self, frames):
+        now = time.time()
+        return [f"zdjęcie sprzed {now - captured_at:.1f}s" for captured_at, _ in frames]
+
+    def describe_recent_frames(self, count=4):
+        """describe_frames() of the last ``count`` camera frames the agent fetched, oldest first."""
+        frames = list(self.recent_frames)[-count:]
+        return self.describe_frames([frame for _, frame in frames], self.recent_frame_labels(frames))
+
+    def camera_params(self):
+        """Query parameters of the /camera_image request."""
+        return self.frame_settings.query() if self.frame_settings.prepare_on == "backend" else None
+
+    def prepared_frame(self, frame):
+        if self.frame_settings.prepare_on == "agent":
+            return prepare_frame(frame, self.frame_settings)
+        return frame
+
+    def cached_description(self, frame):
+        """Return (description of a similar recent frame or None, hash of ``frame``)."""
+        if not self.frame_cache:
+            return None, None
+        frame_hash = self.frame_cache.hash(frame)
+        description, distance = self.frame_cache.lookup(frame_hash)
+        if description is not None:
+            stats = self.frame_cache.stats()
+            print(f"[VISION] Scene unchanged (hash distance {distance}), reusing description "
+                  f"({stats['hit_rate']:.0%} hit rate, ~{stats['latency_saved']:.1f}s of LLM time saved)")
+        return description, frame_hash
+
+    def remember_description(self, frame_hash, description, start):
+        if self.frame_cache:
+            self.frame_cache.store(frame_hash, description, time.perf_counter() - start)
+
+    def perceive(self, frame):
+        """Local perception summary of the frame as the camera sent it, or None."""
+        if not self.local_perception:
+            return None
+        return self.local_perception.analyze(frame)
+
+    def answered_locally(self, perception, use_llm):
+        """True when the local summary stands in for the LLM description."""
+        if perception is None or perception["verdict"] == "ambiguous":
+            return False
+        if use_llm:
+            print(f"[VISION] Way ahead {perception['verdict']} by local analysis, "
+                  f"asking the LLM anyway for the conditional steps")
+            return False
+        stats = self.local_perception.stats()
+        print(f"[VISION] Way ahead {perception['verdict']} by local analysis, skipping the LLM "
+              f"({stats['local_share']:.0%} of frames decided locally)")
+        return True
+
+    def scene_description(self, description, perception):
+        if perception is None:
+            return description
+        return f"{description}\n{summary_text(perception)}"
+
+    def received_frame(self, camera_frame):
+        """Keep a frame fetched from /camera_image for describe_recent_frames()."""
+        self.recent_frames.append((time.time(), camera_frame))
+        return camera_frame
+
+    def describe_frame(self, camera_frame, use_llm=False):
+        """
+        (vision context, local perception summary or None) of a camera frame.
+        The vision context is the LLM description, or only the local summary
+        when that was unambiguous and ``use_llm`` is not set.
+        """
+        perception = self.perceive(camera_frame)
+        if self.answered_locally(perception, use_llm):
+            return summary_text(perception), perception
+        frame = self.prepared_frame(camera_frame)
+        description, frame_hash = self.cached_description(frame)
+        if description is not None:
+            return self.scene_description(description, perception), perception
+        start = time.perf_counter()
+        response = self.llm.invoke([self.vision_message(frame)], config={"callbacks": self.callbacks})
+        self.remember_description(frame_hash, response.content, start)
+        return self.scene_description(response.content, perception), perception
+
+    def describe_scene(self, use_llm=False):
+        """describe_frame() of the current camera frame."""
+        try:
+            resp = requests.get(self.api_url, params=self.camera_params())
             if resp.status_code != 200:
-                return f"API error: {resp.text}"
-            image_bytes = resp.content
-            image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-            image_data_url = f"data:image/jpeg;base64,{image_base64}"
-            prompt = (
-                "Jesteś agentem wizji komputerowej, którego zadaniem jest pomoc agentowi nawigacyjnemu drona. "
-                "Otrzymujesz obraz z kamery zamontowanej na dronie.\n"
-                "Twoim zadaniem jest wygenerować bardzo zwięzły opis przestrzenny tego, co znajduje się na obrazie — tylko informacje kluczowe dla nawigacji drona.\n"
-                "Nie opisuj rodzaju ani koloru obiektów. Skup się tylko na ich:\n"
-                "- Położeniu względem kamery (np. 'na wprost', 'po lewej', 'w prawym dolnym rogu'),\n"
-                "- Szacunkowej odległości od kamery (np. 'blisko', 'daleko', 'średni dystans'),\n"
-                "- Rozmiarze w kadrze (np. 'duży', 'mały', 'zajmuje większość kadru').\n"
-                "Odpowiedź powinna mieć maksymalnie 3 zdania i może opcjonalnie przyjąć format listy.\n"
-                "Analizuj obraz:"
-            )
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": image_data_url}},
-                ]
-            )
-            response = self.llm.invoke([message])
-            return response.content
+                return f"API error: {resp.text}", None
+            return self.describe_frame(self.received_frame(resp.content), use_llm)
         except Exception as e:
             print(f"Error while fetching image from API: {str(e)}")
-            return ""
+            return "", None
+
+    def describe_image_from_api(self):
+        return self.describe_scene()[0]
+
+    def scene_message(self, sequence, captured_at, trigger, pose, description, perception):
+        msg = self.message_pool.build_message(SCENE_TYPE, {
+            "description": description,
+            "perception": perception,
+            "frame_seq": sequence,
+            "captured_at": captured_at,
+            "trigger": trigger,
+            "pose": pose,
+        })
+        # Replace the previous scene rather than piling them up in the pool
+        if self.scene_msg_id is not None:
+            msg["id"] = self.scene_msg_id
+        return msg
+
+    def refresh_scene(self, trigger, pose):
+        sequence = self.prefetch.next_frame(pose, trigger)
+        captured_at = time.time()
+        try:
+            resp = requests.get(self.api_url, params=self.camera_params())
+            if resp.status_code != 200:
+                print(f"[VISION] Scene refresh failed: {resp.text}")
+                return
+            description, perception = self.describe_frame(self.received_frame(resp.content))
+        except Exception as e:
+            print(f"[VISION] Scene refresh failed: {str(e)}")
+            return
+        self.scene_msg_id = self.message_pool.post(
+            self.scene_message(sequence, captured_at, trigger, pose, description, perception))
+
+    def prefetch_scenes(self):
+        while True:
+            pose = pose_of(drone_tools.telemetry()) if self.prefetch.watches_motion() else None
+            trigger = self.prefetch.trigger(pose, time.monotonic())
+            if trigger is not None:
+                self.refresh_scene(trigger, pose)
+            time.sleep(self.prefetch.poll_interval)
+
+    def fresh_scene(self, use_llm=False):
+        """
+        The latest prefetched scene if it is fresh enough, else None. With
+        ``use_llm`` a scene answered by local perception alone does not count.
+        """
+        if not self.prefetch:
+            return None
+        scene = latest_scene(self.message_pool, self.prefetch.max_staleness, self.prefetch.moved_at)
+        if scene is not None and use_llm and not _described_by_llm(scene):
+            scene = None
+        self.prefetch.served(scene is not None)
+        if scene is not None:
+            print(f"[VISION] Attaching prefetched scene (frame {scene['frame_seq']}, "
+                  f"{time.time() - scene['captured_at']:.1f}s old)")
+        return scene
+
+    def attach_scene(self, msg, scene):
+        self.message_pool.update(msg["id"], vision_context=scene["description"], perception=scene["perception"],
+                                 vision_frame=scene["frame_seq"], vision_captured_at=scene["captured_at"])
 
     def read_messages(self):
         while True:
-            messages = self.message_pool.get_all()
+            messages = self.message_pool.subscribe("mission_steps", _missing_vision)
             for msg in messages:
                 if msg["msg_type"] == "mission_steps":
                     if msg["content"].get("vision_context") is None:
-                        vision_context = self.describe_image_from_api()
+                        use_llm = _conditional(msg)
+                        scene = self.fresh_scene(use_llm)
+                        if scene is not None:
+                            self.attach_scene(msg, scene)
+                            continue
+                        vision_context, perception = self.describe_scene(use_llm)
                         # print("Processing plan_mission message without vision context...")
                         # vision_context = self.describe_image("person_img.jpeg")
                         print(f"\n[VISION] Vision context generated:\n {vision_context}")
 
-                        new_content = msg["content"]
-
-                        self.message_pool.remove_message(msg)
+                        self.message_pool.update(msg["id"], vision_context=vision_context, perception=perception)
 
-                        new_content["vision_context"] = vision_context
-                        result_msg = self.message_pool.build_message(
-                            msg["msg_type"],
-                            new_content
-                        )
-                        self.message_pool.post(result_msg)
-            time.sleep(1)
+    def start_background(self):
+        """Start the scene prefetcher, if any; run_agent() calls this in agent processes."""
+        if self.prefetch:
+            threading.Thread(target=self.prefetch_scenes, daemon=True).start()
+            print("[VISION] Refreshing the scene description in the background")
 
     def start(self):
         vision_thread = threading.Thread(target=self.read_messages, daemon=True)
         vision_thread.start()
-        print("[VISION] Vision agent started and listening for plan_mission messages...")
\ No newline at end of file
+        self.start_background()
+        print("[VISION] Vision agent started and listening for plan_mission messages...")
+
+
+class AsyncVisionAgent(VisionAgent):
+    """VisionAgent for the asyncio runtime (agents.async_runtime)."""
+
+    def __init__(self, message_pool=None, frame_cache=None, frame_settings=None, local_perception=None,
+                 prefetch=None):
+        super().__init__(message_pool, frame_cache, frame_settings, local_perception, prefetch)
+        self.http = httpx.AsyncClient(timeout=10)
+
+    async def describe_frame(self, camera_frame, use_llm=False):
+        perception = await asyncio.to_thread(self.perceive, camera_frame)
+        if self.answered_locally(perception, use_llm):
+            return summary_text(perception), perception
+        # Decoding and re-encoding a full-resolution frame takes milliseconds; keep it off the loop
+        frame = await asyncio.to_thread(self.prepared_frame, camera_frame)
+        description, frame_hash = self.cached_description(frame)
+        if description is not None:
+            return self.scene_description(description, perception), perception
+        start = time.perf_counter()
+        response = await self.llm.ainvoke([self.vision_message(frame)],
+                                          config={"callbacks": self.callbacks})
+        self.remember_description(frame_hash, response.content, start)
+        return self.scene_description(response.content, perception), perception
+
+    async def describe_frames(self, frames, labels=None):
+        labels = list(labels) if labels is not None else [f"klatka {nr}" for nr in range(1, len(frames) + 1)]
+        if not frames:
+            return {"frames": [], "aggregate": ""}
+        if len(frames) == 1:
+            description = (await self.describe_frame(frames[0]))[0]
+            return {"frames": [{"label": labels[0], "description": description}], "aggregate": description}
+        prepared = await asyncio.to_thread(lambda: [self.prepared_frame(frame) for frame in frames])
+        response = await self.llm.ainvoke([self.batch_vision_message(prepared, labels)],
+                                          config={"callbacks": self.callbacks})
+        return self.parse_batch_description(response.content, labels)
+
+    async def describe_recent_frames(self, count=4):
+        frames = list(self.recent_frames)[-count:]
+        return await self.describe_frames([frame for _, frame in frames], self.recent_frame_labels(frames))
+
+    async def describe_scene(self, use_llm=False):
+        try:
+            resp = await self.http.get(self.api_url, params=self.camera_params())
+            if resp.status_code != 200:
+                return f"API error: {resp.text}", None
+            return await self.describe_frame(self.received_frame(resp.content), use_llm)
+        except Exception as e:
+            print(f"Error while fetching image from API: {str(e)}")
+            return "", None
+
+    async def refresh_scene(self, trigger, pose):
+        sequence = self.prefetch.next_frame(pose, trigger)
+        captured_at = time.time()
+        try:
+            resp = await self.http.get(self.api_url, params=self.camera_params())
+            if resp.status_code != 200:
+                print(f"[VISION] Scene refresh failed: {resp.text}")
+                return
+            description, perception = await self.describe_frame(self.received_frame(resp.content))
+        except Exception as e:
+            print(f"[VISION] Scene refresh failed: {str(e)}")
+            return
+        self.scene_msg_id = await self.message_pool.post(
+            self.scene_message(sequence, captured_at, trigger, pose, description, perception))
+
+    async def prefetch_scenes(self):
+        while True:
+            pose = pose_of(await drone_tools.atelemetry()) if self.prefetch.watches_motion() else None
+            trigger = self.prefetch.trigger(pose, time.monotonic())
+            if trigger is not None:
+                await self.refresh_scene(trigger, pose)
+            await asyncio.sleep(self.prefetch.poll_interval)
+
+    async def describe_image_from_api(self):
+        return (await self.describe_scene())[0]
+
+    async def read_messages(self):
+        while True:
+            messages = await self.message_pool.subscribe("mission_steps", _missing_vision)
+            for msg in messages:
+                if msg["content"].get("vision_context") is None:
+                    use_llm = _conditional(msg)
+                    scene = self.fresh_scene(use_llm)
+                    if scene is not None:
+                        self.attach_scene(msg, scene)
+                        continue
+                    vision_context, perception = await self.describe_scene(use_llm)
+                    print(f"\n[VISION] Vision context generated:\n {vision_context}")
+
+                    self.message_pool.update(msg["id"], vision_context=vision_context, perception=perception)
+
+    def start(self):
+        task = asyncio.get_running_loop().create_task(self.read_messages())
+        if self.prefetch:
+            prefetch = asyncio.get_running_loop().create_task(self.prefetch_scenes())
+            # Cancelling the agent's task stops the prefetcher with it
+            task.add_done_callback(lambda _: prefetch.cancel())
+            print("[VISION] Refreshing the scene description in the background")
+        print("[VISION] Vision agent started and listening for plan_mission messages...")
+        return task
@@ -0,0 +1,299 @@
+"""
+End-to-end mission latency: operator command to the last drone_tools call.
+
+Drives complete missions through the real MissionPlanner, Vision, Navigator
+and Guardian agents on one MessagePool. Every LLM is a ScriptedChatModel
+(benchmarks/e2e/stub_llm.py) answering after a fixed latency and
+controll_backend is replaced by StubBackend (benchmarks/e2e/stub_backend.py).
+For each (mission length, concurrent missions) cell the operator commands are
+posted at once and the agents' stage methods are timed:
+
+  plan        MissionPlannerAgent.plan_mission / stream_mission_plan
+  vision      VisionAgent.describe_scene (camera frame + LLM)
+  navigator   NavigatorAgent.run_step, per mission step
+  guardian    GuardianAgent.validate, per drone action
+  backend     GuardianAgent.execute_action, per executed action
+
+End-to-end latency runs from posting plan_mission to the guardian_validation
+of the mission's last action. --navigator picks the Navigator mode; in
+speculative mode the wall-clock time its speculation saved per mission is
+reported too. With --prefetch-vision the Vision agent describes the scene
+in the background and missions get the latest description attached.
+Results are printed as a table and, with
+--output, written as JSON for comparing runs of different versions.
+
+Run from the repository root:
+    python -m benchmarks.e2e --output e2e.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import threading
+import time
+
+from agents import llm_metrics, llm_registry, llm_scheduler
+from agents.guardian import GuardianAgent
+from agents.guardian_rules import GuardianRules
+from agents.message_pool import MessagePool
+from agents.mission_planner import MissionPlannerAgent
+from agents.navigator import NavigatorAgent
+from agents.scene_prefetch import MAX_STALENESS, ScenePrefetch
+from agents.vision_agent import VisionAgent
+from benchmarks.e2e.stub_backend import StubBackend
+from benchmarks.e2e.stub_llm import STEP_SEPARATOR, model_factory
+from tools import drone_tools
+
+STAGES = ("plan", "vision", "navigator", "guardian", "backend")
+MISSION_TYPES = ("mission_steps", "drone_action", "guardian_validation")
+# --navigator choices -> NavigatorAgent options
+NAVIGATOR_MODES = {
+    "default": {},
+    "pipelined": {"pipelined": True},
+    "validated": {"validated": True},
+    "speculative": {"speculative": True},
+}
+# Middle steps of a mission, cycled; the conditional one always goes to the Navigator LLM
+STEP_CYCLE = ["Leć 10m na północ", "Jeśli widzisz przeszkodę to obniż lot o 1m", "Leć 5m na wschód",
+              "Leć 10m na południe", "Leć 5m na zachód"]
+
+
+def mission_command(steps):
+    """Operator command whose plan has ``steps`` steps: takeoff, flights, landing."""
+    if steps == 1:
+        return "Wystartuj na 5m"
+    middle = [STEP_CYCLE[i % len(STEP_CYCLE)] for i in range(steps - 2)]
+    return STEP_SEPARATOR.join(["Wystartuj na 5m", *middle, "Wyląduj"])
+
+
+def summarize(values):
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean": statistics.fmean(values),
+        "p50": statistics.median(values),
+        "p95": statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0],
+        "max": max(values),
+    }
+
+
+class StageTimer:
+    """Durations of the wrapped agent methods, per stage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {stage: [] for stage in STAGES}
+
+    def wrap(self, stage, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def clear(self):
+        with self.lock:
+            for samples in self.samples.values():
+                samples.clear()
+
+
+def start_agents(pool, timer, backend, args):
+    guardian = GuardianAgent(pool, rules=GuardianRules(require_takeoff=False), settle_time=args.settle)
+    guardian.validate = timer.wrap("guardian", guardian.validate)
+    guardian.execute_action = timer.wrap("backend", guardian.execute_action)
+    navigator = NavigatorAgent(pool, **NAVIGATOR_MODES[args.navigator])
+    navigator.run_step = timer.wrap("navigator", navigator.run_step)
+    prefetch = None
+    if args.prefetch_vision is not None:
+        prefetch = ScenePrefetch(interval=args.prefetch_vision or None, max_staleness=args.vision_max_age)
+    vision = VisionAgent(pool, prefetch=prefetch)
+    vision.api_url = f"{backend.url}/camera_image"
+    vision.describe_scene = timer.wrap("vision", vision.describe_scene)
+    planner = MissionPlannerAgent(pool, plan_cache=False, streaming=args.stream_plan)
+    planner.plan_mission = timer.wrap("plan", planner.plan_mission)
+    planner.stream_mission_plan = timer.wrap("plan", planner.stream_mission_plan)
+    for agent in (guardian, navigator, vision):
+        agent.start()
+    threading.Thread(target=planner.read_messages, daemon=True).start()
+    return planner, prefetch
+
+
+def post_missions(pool, planner, command, count):
+    """Post ``count`` plan_mission messages the way request_mission() does; returns {id: posted at}."""
+    missions = {}
+    for _ in range(count):
+        msg = pool.build_message("plan_mission", {"user_input": command, "chat_history": planner.planning_history(),
+                                                  "executed": False, "logged": False})
+        pool.post(msg)
+        missions[msg["id"]] = msg["timestamp"]
+    return missions
+
+
+def mission_end(pool, mission_id):
+    """When the mission's last action was validated and executed, or None while it is running."""
+    def of_mission(msg):
+        return msg["content"].get("mission_id") == mission_id
+
+    plans = pool.find(of_mission, ("mission_steps",))
+    if not plans or not plans[0]["content"].get("executed"):
+        return None
+    actions = pool.find(of_mission, ("drone_action",))
+    validations = pool.find(of_mission, ("guardian_validation",))
+    if len(validations) < len(actions):
+        return None
+    return max((msg["timestamp"] for msg in validations), default=plans[0].get("updated_at"))
+
+
+def wait_for_missions(pool, missions, timeout):
+    """{mission id: end time} of the missions finished within ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    ends = {}
+    while True:
+        version, _ = pool.snapshot(MISSION_TYPES)
+        for mission_id in missions:
+            if mission_id not in ends:
+                end = mission_end(pool, mission_id)
+                if end is not None:
+                    ends[mission_id] = end
+        remaining = deadline - time.monotonic()
+        if len(ends) == len(missions) or remaining <= 0:
+            return ends
+        pool.wait_for_change(MISSION_TYPES, version, timeout=remaining)
+
+
+def speculation_savings(pool, missions):
+    return [msg["content"]["speculation_saved"] for msg in pool.get_type("mission_steps")
+            if msg["content"].get("mission_id") in missions and "speculation_saved" in msg["content"]]
+
+
+def action_counts(pool, missions):
+    validations = [msg for msg in pool.get_type("guardian_validation") if msg["content"].get("mission_id") in missions]
+    rejected = sum(msg["content"].get("validation") != "OK" for msg in validations)
+    return len(validations), rejected
+
+
+def run_cell(steps, concurrency, backend, args):
+    pool = MessagePool()
+    timer = StageTimer()
+    planner, prefetch = start_agents(pool, timer, backend, args)
+    command = mission_command(steps)
+    # One mission first so imports, connections and agent set-up are not measured
+    wait_for_missions(pool, post_missions(pool, planner, command, 1), args.timeout)
+    timer.clear()
+    llm_metrics.metrics.clear()
+
+    latencies, walls, saved, completed, actions, rejected, total = [], [], [], 0, 0, 0, 0
+    for _ in range(args.rounds):
+        missions = post_missions(pool, planner, command, concurrency)
+        ends = wait_for_missions(pool, missions, args.timeout)
+        total += len(missions)
+        completed += len(ends)
+        latencies += [end - missions[mission_id] for mission_id, end in ends.items()]
+        if ends:
+            walls.append(max(ends.values()) - min(missions.values()))
+        saved += speculation_savings(pool, missions)
+        executed, failed = action_counts(pool, missions)
+        actions += executed
+        rejected += failed
+
+    wall = sum(walls)
+    return {
+        "steps": steps,
+        "concurrency": concurrency,
+        "missions": total,
+        "completed": completed,
+        "actions": actions,
+        "rejected": rejected,
+        "wall_seconds": wall,
+        "missions_per_second": completed / wall if wall else 0.0,
+        "actions_per_second": actions / wall if wall else 0.0,
+        "e2e": summarize(latencies),
+        "speculation_saved": summarize(saved),
+        "prefetch": prefetch.stats() if prefetch else None,
+        "stages": {stage: summarize(samples) for stage, samples in timer.samples.items()},
+        "llm_calls": {series["agent"]: series["calls"] for series in llm_metrics.metrics.snapshot()},
+        "llm_queue_seconds": {series["agent"]: series["queue_sum"] for series in llm_metrics.metrics.snapshot()},
+    }
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_cell(cell):
+    stages = " ".join(f"{cell['stages'][stage].get('p50', 0.0) * 1000:>9.1f}" for stage in STAGES)
+    e2e = cell["e2e"]
+    print(f"{cell['steps']:>5} {cell['concurrency']:>4} {cell['completed']:>3}/{cell['missions']:<3} "
+          f"{e2e.get('p50', 0.0):>8.2f}s {e2e.get('p95', 0.0):>8.2f}s {cell['missions_per_second']:>8.2f} {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 3, 5, 8], help="mission lengths in steps")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4],
+                        help="missions posted at once")
+    parser.add_argument("--rounds", type=int, default=3, help="measured rounds per cell")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per scripted LLM call")
+    parser.add_argument("--llm-concurrency", type=int, default=llm_scheduler.DEFAULT_CONCURRENCY,
+                        help="concurrent calls per model allowed by the LLM scheduler")
+    parser.add_argument("--backend-latency", type=float, default=0.01, help="seconds per stub backend request")
+    parser.add_argument("--settle", type=float, default=0.0, help="Guardian settle time after each action")
+    parser.add_argument("--navigator", choices=NAVIGATOR_MODES, default="default", help="Navigator mode")
+    parser.add_argument("--reject-every", type=int, default=0, metavar="N",
+                        help="have the scripted Guardian LLM reject every N-th verdict")
+    parser.add_argument("--stream-plan", action="store_true", help="stream mission plans")
+    parser.add_argument("--prefetch-vision", type=float, metavar="SECONDS",
+                        help="refresh the scene description in the background every SECONDS (0: on motion only)")
+    parser.add_argument("--vision-max-age", type=float, default=MAX_STALENESS, metavar="SECONDS",
+                        help="oldest prefetched scene attached to a mission")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for the missions of a round")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE")
+    parser.add_argument("--verbose", action="store_true", help="show the agents' output")
+    args = parser.parse_args()
+
+    llm_registry.use_model_factory(model_factory(args.llm_latency, args.reject_every))
+    llm_scheduler.configure(default_concurrency=args.llm_concurrency)
+    backend = StubBackend(latency=args.backend_latency).start()
+    drone_tools.API_URL = backend.url
+
+    print(f"{'steps':>5} {'conc':>4} {'done':>7} {'e2e p50':>9} {'e2e p95':>9} {'miss/s':>8} "
+          + " ".join(f"{stage + ' ms':>9}" for stage in STAGES))
+    cells = []
+    for steps in args.steps:
+        for concurrency in args.concurrency:
+            with open(os.devnull, "w") as devnull, contextlib.ExitStack() as stack:
+                if not args.verbose:
+                    stack.enter_context(contextlib.redirect_stdout(devnull))
+                cell = run_cell(steps, concurrency, backend, args)
+            cells.append(cell)
+            print_cell(cell)
+    backend.stop()
+
+    if args.output:
+        result = {
+            "benchmark": "mission_e2e",
+            "time": time.time(),
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "config": vars(args),
+            "backend_requests": dict(backend.requests),
+            "cells": cells,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+In-process stand-in for controll_backend: the action endpoints used by
+tools.drone_tools and the camera_image endpoint read by the vision agent.
+"""
+import collections
+import http.server
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+from agents.frame_prep import FrameSettings, prepare_frame, parse_roi
+
+# A real camera frame (311x162 JPEG from the repository root), so frame preparation,
+# the frame cache and local perception decode it like they would a drone frame
+with open(os.path.join(os.path.dirname(__file__), "..", "..", "person_img.jpeg"), "rb") as _image:
+    FRAME = _image.read()
+
+ACTION_PATHS = ("/takeoff", "/goto_relative", "/land")
+
+
+def camera_settings(query):
+    """FrameSettings from /camera_image query parameters, as controll_backend reads them."""
+    params = {key: values[-1] for key, values in urllib.parse.parse_qs(query).items()}
+    return FrameSettings(max_width=int(params["width"]) if "width" in params else None,
+                         max_height=int(params["height"]) if "height" in params else None,
+                         quality=int(params["quality"]) if "quality" in params else None,
+                         roi=parse_roi(params["roi"]) if "roi" in params else None,
+                         grayscale=params.get("gray") in ("1", "true"))
+
+
+class StubBackend:
+    """
+    Serves the backend API on 127.0.0.1, answering each request after
+    ``latency`` seconds. /camera_image serves ``frame`` (JPEG bytes), prepared
+    according to its query parameters like controll_backend does, and
+    /telemetry the position the executed actions moved the drone to.
+    """
+
+    def __init__(self, latency=0.0, port=0, frame=FRAME):
+        self.latency = latency
+        self.frame = frame
+        self.pose = {"north": 0.0, "east": 0.0, "down": 0.0, "yaw": 0.0}
+        self.requests = collections.Counter()
+        self.lock = threading.Lock()
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def _handler(self):
+        backend = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                backend.record(path)
+                if path == "/telemetry":
+                    with backend.lock:
+                        pose = dict(backend.pose)
+                    self._reply(200, json.dumps(pose).encode(), "application/json")
+                elif path == "/camera_image":
+                    self._reply(200, prepare_frame(backend.frame, camera_settings(query)), "image/jpeg")
+                else:
+                    self._reply(404, b"Not found", "text/plain")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                backend.record(self.path)
+                if self.path not in ACTION_PATHS:
+                    self._reply(404, b"Not found", "text/plain")
+                    return
+                backend.move(self.path, json.loads(body) if body else {})
+                self._reply(200, b'{"status": "ok"}', "application/json")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def record(self, path):
+        with self.lock:
+            self.requests[path] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def move(self, path, data):
+        with self.lock:
+            if path == "/takeoff":
+                self.pose["down"] = -float(data.get("altitude", 2.0))
+            elif path == "/goto_relative":
+                for axis in ("north", "east", "down"):
+                    self.pose[axis] += float(data.get(axis, 0.0))
+            elif path == "/land":
+                self.pose["down"] = 0.0
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stub-backend", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
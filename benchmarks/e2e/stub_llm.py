@@ -0,0 +1,149 @@
+"""
+Scripted chat model standing in for every agent's LLM.
+
+Answers are chosen from the request itself, so one model serves the planner,
+vision, Navigator and Guardian prompts; each call takes ``latency`` seconds.
+"""
+import base64
+import itertools
+import json
+import re
+import threading
+import uuid
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agents.frame_prep import frame_size, image_tokens
+from agents.llm_replay import ReplayChatModel
+
+_OPERATOR_COMMAND = re.compile(r'Polecenie operatora:\s*"(.*?)"', re.S)
+_BATCH_ITEM = re.compile(r"^\s*(\d+)\. Krok misji:", re.M)
+_frames = itertools.count(1)
+_verdicts = itertools.count(1)
+_counters_lock = threading.Lock()
+REJECTION = "Przeszkoda na trasie, akcja odrzucona."
+
+# Separates the steps of a benchmark command, see plan_answer()
+STEP_SEPARATOR = "; "
+
+
+def _text(message):
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+def _images(message):
+    if isinstance(message.content, str):
+        return []
+    return [part["image_url"] for part in message.content if isinstance(part, dict) and part.get("type") == "image_url"]
+
+
+def plan_answer(prompt):
+    """JSON plan with one step per STEP_SEPARATOR-separated part of the operator command."""
+    match = _OPERATOR_COMMAND.search(prompt)
+    command = match.group(1) if match else "Wyląduj"
+    steps = [{"id": i, "cel": cel} for i, cel in enumerate(command.split(STEP_SEPARATOR), start=1)]
+    return json.dumps(steps, ensure_ascii=False, indent=1)
+
+
+def vision_answer():
+    # A new description per frame, like a moving camera, so Guardian verdicts are not served from its cache
+    with _counters_lock:
+        frame = next(_frames)
+    return f"Duży obiekt na wprost, średni dystans (klatka {frame}). Po lewej wolna przestrzeń."
+
+
+def batch_vision_answer(count):
+    frames = [{"nr": nr, "opis": vision_answer()} for nr in range(1, count + 1)]
+    return json.dumps({"klatki": frames, "podsumowanie": f"Na wszystkich {count} obrazach duży obiekt na wprost, "
+                                                         "po lewej wolna przestrzeń."}, ensure_ascii=False)
+
+
+def navigator_answer(messages):
+    if isinstance(messages[-1], ToolMessage):
+        return AIMessage(content="Krok wykonany.")
+    call = {"name": "FlyTo", "args": {"__arg1": "0 0 1"}, "id": f"call_{uuid.uuid4().hex[:12]}"}
+    return AIMessage(content="", tool_calls=[call])
+
+
+def guardian_verdict(reject_every):
+    """'OK', or a rejection for every ``reject_every``-th verdict (0 never rejects)."""
+    with _counters_lock:
+        n = next(_verdicts)
+    return REJECTION if reject_every and n % reject_every == 0 else "OK"
+
+
+def guardian_batch_answer(prompt, reject_every):
+    return json.dumps([{"nr": int(nr), "werdykt": guardian_verdict(reject_every)}
+                       for nr in _BATCH_ITEM.findall(prompt)], ensure_ascii=False)
+
+
+class ScriptedChatModel(ReplayChatModel):
+    """
+    ReplayChatModel whose answers are scripted instead of recorded:
+      • plan_mission prompts get a plan built from the operator command
+      • image messages get a short scene description, or a JSON object
+        with one per image for batched vision prompts
+      • requests with bound tools (the Navigator) get one FlyTo call,
+        then a final answer once the tool result is in
+      • Guardian batch prompts get a verdict per action, anything else one
+        verdict; every ``reject_every``-th verdict is a rejection
+    """
+
+    reject_every: int = 0
+
+    def _answer(self, messages, kwargs):
+        last = messages[-1]
+        prompt = _text(last)
+        if kwargs.get("tools"):
+            return navigator_answer(messages)
+        images = _images(last)
+        if images and '"klatki"' in prompt:
+            return AIMessage(content=batch_vision_answer(len(images)))
+        if images:
+            return AIMessage(content=vision_answer())
+        if "Polecenie operatora:" in prompt:
+            return AIMessage(content=plan_answer(prompt))
+        if "Planowane akcje:" in prompt:
+            return AIMessage(content=guardian_batch_answer(prompt, self.reject_every))
+        if "Planowana akcja:" in prompt:
+            return AIMessage(content=guardian_verdict(self.reject_every))
+        return AIMessage(content="OK")
+
+    def _lookup(self, messages, kwargs):
+        response = self._answer(messages, kwargs)
+        prompt_tokens = sum(len(_text(message)) for message in messages) // 4 + 1
+        completion_tokens = len(str(response.content)) // 4 + 1
+        response.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                                   "total_tokens": prompt_tokens + completion_tokens}
+        return response, float(self.latency or 0.0)
+
+
+class ModelledVisionModel(ScriptedChatModel):
+    """
+    ScriptedChatModel whose latency is modelled from the request: ``latency``
+    plus uploading the images at ``uplink_mbps``, ``ms_per_token`` per image
+    token and ``ms_per_output_token`` per generated token.
+    """
+
+    uplink_mbps: float = 20.0
+    ms_per_token: float = 0.0
+    ms_per_output_token: float = 0.0
+
+    def _lookup(self, messages, kwargs):
+        response, latency = super()._lookup(messages, kwargs)
+        upload = tokens = 0
+        for image in _images(messages[-1]):
+            frame = base64.b64decode(image["url"].partition(",")[2])
+            tokens += image_tokens(*(frame_size(frame) or (0, 0)), image.get("detail", "auto"))
+            upload += len(image["url"]) * 8 / (self.uplink_mbps * 1e6)
+        generation = response.usage_metadata["output_tokens"] * self.ms_per_output_token / 1000
+        return response, latency + upload + tokens * self.ms_per_token / 1000 + generation
+
+
+def model_factory(latency, reject_every=0):
+    """llm_registry.use_model_factory() factory building ScriptedChatModels."""
+    def build(model, **options):
+        return ScriptedChatModel(model_name=model, latency=latency, reject_every=reject_every)
+    return build
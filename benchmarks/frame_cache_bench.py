@@ -0,0 +1,92 @@
+"""
+Vision frame cache: difference-hash distances of perturbed camera frames.
+
+A frame is perturbed the way consecutive frames of a hovering drone differ
+(re-encoding, sensor noise, exposure, small shifts) and the way a changed
+scene differs (large shifts, mirrored or unrelated content). The table shows
+the hash distance of each to the original, then for each max_distance which
+share of "same scene" frames would be cache hits and which share of
+"changed" frames would wrongly be served a cached description. Needs OpenCV.
+
+Run from the repository root:
+    python -m benchmarks.frame_cache_bench
+"""
+import argparse
+import sys
+import time
+
+from agents.frame_cache import difference_hash, hamming, opencv_available
+
+if opencv_available():
+    import cv2
+    import numpy as np
+
+
+def encode(image, quality=90):
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def noisy(image, sigma, rng):
+    return np.clip(image + rng.normal(0, sigma, image.shape), 0, 255).astype(np.uint8)
+
+
+def shifted(image, pixels):
+    return np.roll(image, pixels, axis=1)
+
+
+def perturbations(image, rng):
+    """(name, same scene?, frame) triples."""
+    return [
+        ("re-encoded q=60", True, encode(image, 60)),
+        ("noise sigma=3", True, encode(noisy(image, 3, rng))),
+        ("noise sigma=8", True, encode(noisy(image, 8, rng))),
+        ("brightness +15", True, encode(cv2.convertScaleAbs(image, alpha=1.0, beta=15))),
+        ("contrast x1.2", True, encode(cv2.convertScaleAbs(image, alpha=1.2, beta=0))),
+        ("shift 1%", True, encode(shifted(image, max(1, image.shape[1] // 100)))),
+        ("shift 3%", True, encode(shifted(image, max(1, image.shape[1] * 3 // 100)))),
+        ("shift 15%", False, encode(shifted(image, image.shape[1] * 15 // 100))),
+        ("mirrored", False, encode(cv2.flip(image, 1))),
+        ("upside down", False, encode(cv2.flip(image, 0))),
+        ("other scene", False, encode(rng.integers(0, 255, image.shape, dtype=np.uint8))),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default="person_img.jpeg", help="camera frame to perturb")
+    parser.add_argument("--hash-size", type=int, default=8, help="hash rows; the hash has hash_size² bits")
+    parser.add_argument("--repeat", type=int, default=200, help="hashes timed per frame")
+    args = parser.parse_args()
+    if not opencv_available():
+        sys.exit("OpenCV (cv2) is not installed")
+
+    image = cv2.imread(args.image)
+    if image is None:
+        sys.exit(f"Cannot read {args.image}")
+    frame = encode(image)
+    base = difference_hash(frame, args.hash_size)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        difference_hash(frame, args.hash_size)
+    hash_ms = (time.perf_counter() - start) / args.repeat * 1000
+    print(f"{args.image}: {image.shape[1]}x{image.shape[0]}, {len(frame)} bytes, "
+          f"{hash_ms:.3f} ms per hash ({args.hash_size ** 2} bits)\n")
+
+    results = []
+    print(f"{'frame':<18} {'scene':<8} {'distance':>8}")
+    for name, same, perturbed in perturbations(image, np.random.default_rng(0)):
+        distance = hamming(base, difference_hash(perturbed, args.hash_size))
+        results.append((same, distance))
+        print(f"{name:<18} {'same' if same else 'changed':<8} {distance:>8}")
+
+    same = [distance for is_same, distance in results if is_same]
+    changed = [distance for is_same, distance in results if not is_same]
+    print(f"\n{'max_distance':>12} {'hits (same)':>12} {'false hits':>11}")
+    for threshold in range(0, args.hash_size ** 2 // 4 + 1, 2):
+        hits = sum(d <= threshold for d in same) / len(same)
+        false_hits = sum(d <= threshold for d in changed) / len(changed)
+        print(f"{threshold:>12} {hits:>12.0%} {false_hits:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Vision frame preparation: payload bytes and describe latency per setting.
+
+A camera frame scaled up to the sensor resolution is served by StubBackend
+(benchmarks/e2e/stub_backend.py) and described through the real
+VisionAgent.describe_image_from_api for each FrameSettings preset. The table
+shows the frame size and the image tokens OpenAI bills for it, the base64
+payload sent to the LLM, the time spent preparing the frame in the agent,
+and the describe latency from the /camera_image request to the answer.
+
+Without --live the vision LLM is a ModelledVisionModel whose latency is
+modelled from the request: --llm-latency plus the payload upload at
+--uplink-mbps plus --ms-per-token for each image token. With --live the
+real vision model is called (needs OPENAI_API_KEY). The stub backend
+decodes the frame before preparing it, which the real backend, holding the
+raw image, does not. Needs OpenCV.
+
+Run from the repository root:
+    python -m benchmarks.frame_prep_bench
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+from agents import llm_registry
+from agents.frame_cache import opencv_available
+from agents.frame_prep import FrameSettings, frame_size, image_tokens
+from agents.vision_agent import VisionAgent
+from benchmarks.e2e.stub_backend import StubBackend
+from benchmarks.e2e.stub_llm import ModelledVisionModel
+
+if opencv_available():
+    import cv2
+
+PRESETS = {
+    "camera": FrameSettings(),
+    "q70": FrameSettings(quality=70),
+    "1280 q80": FrameSettings(max_width=1280, max_height=1280, quality=80),
+    "768 q70": FrameSettings(max_width=768, max_height=768, quality=70),
+    "512 q70": FrameSettings(max_width=512, max_height=512, quality=70),
+    "512 q70 low": FrameSettings(max_width=512, max_height=512, quality=70, detail="low"),
+    "512 q70 gray": FrameSettings(max_width=512, max_height=512, quality=70, grayscale=True),
+    "lower half 512": FrameSettings(max_width=512, max_height=512, quality=70, roi=(0, 0.5, 1, 1)),
+    "512 q70 backend": FrameSettings(max_width=512, max_height=512, quality=70, prepare_on="backend"),
+}
+
+
+def image_part(message):
+    return next(part["image_url"] for part in message.content if part.get("type") == "image_url")
+
+
+class Probe:
+    """What the agent sent to the LLM for the last frame, and how long preparing it took."""
+
+    def __init__(self, agent):
+        self.payload = self.width = self.height = 0
+        self.prep_seconds = []
+        vision_message, prepared_frame = agent.vision_message, agent.prepared_frame
+
+        def probed_prepare(frame):
+            start = time.perf_counter()
+            prepared = prepared_frame(frame)
+            self.prep_seconds.append(time.perf_counter() - start)
+            return prepared
+
+        def probed_message(frame):
+            self.width, self.height = frame_size(frame) or (0, 0)
+            message = vision_message(frame)
+            self.payload = len(image_part(message)["url"])
+            return message
+
+        agent.prepared_frame = probed_prepare
+        agent.vision_message = probed_message
+
+
+def run_preset(name, settings, backend, args):
+    agent = VisionAgent(frame_cache=False, frame_settings=settings, local_perception=False)
+    agent.api_url = f"{backend.url}/camera_image"
+    probe = Probe(agent)
+    agent.describe_image_from_api()  # connection set-up
+    latencies = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        agent.describe_image_from_api()
+        latencies.append(time.perf_counter() - start)
+    return {
+        "preset": name,
+        "size": f"{probe.width}x{probe.height}",
+        "tokens": image_tokens(probe.width, probe.height, settings.detail),
+        "payload_kb": probe.payload / 1024,
+        "prep_ms": statistics.median(probe.prep_seconds) * 1000,
+        "describe_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default="person_img.jpeg", help="camera frame")
+    parser.add_argument("--resolution", default="1920x1080", help="sensor resolution the frame is scaled to")
+    parser.add_argument("--camera-quality", type=int, default=95, help="JPEG quality /camera_image encodes at")
+    parser.add_argument("--repeat", type=int, default=5, help="describes per preset")
+    parser.add_argument("--presets", nargs="+", choices=PRESETS, default=list(PRESETS), help="settings to compare")
+    parser.add_argument("--live", action="store_true", help="call the real vision model instead of the modelled one")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="modelled seconds per call without the image")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="modelled upload bandwidth")
+    parser.add_argument("--ms-per-token", type=float, default=0.5, help="modelled prefill time per image token")
+    parser.add_argument("--verbose", action="store_true", help="show the agent's output")
+    args = parser.parse_args()
+    if not opencv_available():
+        sys.exit("OpenCV (cv2) is not installed")
+
+    image = cv2.imread(args.image)
+    if image is None:
+        sys.exit(f"Cannot read {args.image}")
+    width, height = (int(value) for value in args.resolution.split("x"))
+    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_CUBIC)
+    frame = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, args.camera_quality])[1].tobytes()
+    if not args.live:
+        llm_registry.use_model_factory(lambda model, **options: ModelledVisionModel(
+            model_name=model, latency=args.llm_latency, uplink_mbps=args.uplink_mbps,
+            ms_per_token=args.ms_per_token))
+    backend = StubBackend(frame=frame).start()
+
+    print(f"{args.image} at {width}x{height}, camera JPEG {len(frame) / 1024:.0f} KB"
+          f"{'' if args.live else ', modelled LLM'}\n")
+    print(f"{'preset':<16} {'sent':>10} {'tokens':>7} {'payload':>10} {'prep ms':>8} {'describe ms':>12}")
+    for name in args.presets:
+        with open(os.devnull, "w") as devnull, contextlib.ExitStack() as stack:
+            if not args.verbose:
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            row = run_preset(name, PRESETS[name], backend, args)
+        print(f"{row['preset']:<16} {row['size']:>10} {row['tokens']:>7} {row['payload_kb']:>8.1f}KB "
+              f"{row['prep_ms']:>8.2f} {row['describe_ms']:>12.1f}")
+    backend.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+MessagePool.post throughput with and without the write-ahead journal.
+
+Run from the repository root:
+    python -m benchmarks.journal_bench
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from agents.message_journal import MessageJournal
+from agents.message_pool import MessagePool
+
+
+def sample_content(i):
+    return {
+        "step": {"id": i % 5 + 1, "cel": "Leć 10m na zachód"},
+        "vision_context": "Duży obiekt na wprost, średni dystans.",
+        "action": "fly_to",
+        "parameters": [0.0, -10.0, 0.0],
+        "executed": False,
+        "logged": False,
+    }
+
+
+def posts_per_second(pool, count):
+    start = time.perf_counter()
+    for i in range(count):
+        msg_id = pool.post(pool.build_message("drone_action", sample_content(i)))
+        pool.mark_executed(msg_id)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20_000)
+    args = parser.parse_args()
+
+    configs = [
+        ("no journal", None),
+        ("journal, fsync every 64 records", {"fsync_batch": 64}),
+        ("journal, fsync every 1024 records", {"fsync_batch": 1024}),
+        ("journal, fsync every record", {"fsync_batch": 1, "fsync_interval": 0}),
+    ]
+    print(f"{'configuration':<36} {'post+update/s':>14}")
+    for name, options in configs:
+        directory = tempfile.mkdtemp(prefix="pool-journal-")
+        journal = MessageJournal(directory, **options) if options is not None else None
+        try:
+            rate = posts_per_second(MessagePool(journal=journal), args.count)
+        finally:
+            if journal is not None:
+                journal.close()
+            shutil.rmtree(directory)
+        print(f"{name:<36} {rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+MessagePool operation cost as the pool grows.
+
+Run from the repository root:
+    python -m benchmarks.message_pool_bench
+"""
+import argparse
+import time
+
+from agents.message_pool import MessagePool
+
+MSG_TYPES = ("plan_mission", "mission_steps", "drone_action", "guardian_validation")
+
+
+def fill(pool, size):
+    ids = []
+    for i in range(size):
+        msg_type = MSG_TYPES[i % len(MSG_TYPES)]
+        ids.append(pool.post(pool.build_message(msg_type, {"n": i, "executed": True, "logged": True})))
+    return ids
+
+
+def per_op_us(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench(size, repeat):
+    pool = MessagePool()
+    ids = fill(pool, size)
+    step = max(1, size // repeat)
+    pending = []
+
+    def post(i):
+        pending.append(pool.post(pool.build_message("drone_action", {"n": i, "executed": False})))
+
+    def update(i):
+        pool.mark_executed(pending[i])
+
+    def get(i):
+        pool.get(ids[(i * step) % size])
+
+    def subscribe(i):
+        pool.subscribe("print_user", timeout=0)
+
+    def remove(i):
+        pool.remove_message(ids[(i * step) % size])
+
+    return {
+        "post": per_op_us(post, repeat),
+        "update": per_op_us(update, repeat),
+        "get": per_op_us(get, repeat),
+        "subscribe": per_op_us(subscribe, repeat),
+        "remove_message": per_op_us(remove, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=1_000)
+    args = parser.parse_args()
+
+    results = {size: bench(size, args.repeat) for size in args.sizes}
+    ops = list(next(iter(results.values())))
+    print(f"{'pool size':>10} " + " ".join(f"{op:>15}" for op in ops) + "   (µs/op)")
+    for size, row in results.items():
+        print(f"{size:>10} " + " ".join(f"{row[op]:>15.2f}" for op in ops))
+
+
+if __name__ == "__main__":
+    main()
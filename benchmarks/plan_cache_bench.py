@@ -0,0 +1,68 @@
+"""
+Plan cache: which commands are served a cached plan, and how fast.
+
+Each case stores a plan for the first command and looks up the second one in
+a fresh PlanCache. The expected tier ('exact', 'semantic' or None for a miss)
+is part of the case, so a signature or embedding change that serves a plan
+for a different mission shows up as a mismatch. The misses are regression
+cases: reusing those plans would drop or change a step.
+
+Run from the repository root:
+    python -m benchmarks.plan_cache_bench
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import time
+
+from agents.plan_cache import PlanCache
+
+CASES = [
+    ("Leć 10 m na północ", "leć 10 m na północ", "exact"),
+    ("Wystartuj", "Wystartuj teraz", "exact"),
+    ("leć 10 m na północ", "proszę leć 10 metrów na północ", "semantic"),
+    ("Leć 10 m na północ i wyląduj", "Leć teraz 10 m na północ, a potem wyląduj", "semantic"),
+    ("wystartuj i leć 5 m na wschód", "wystartuj oraz leć 5 m na wschód", "semantic"),
+    # A different mission must never get the cached plan
+    ("Leć 10 m na północ, a potem 5 m na wschód", "Leć 10 m na północ, a potem 5 m na wschód i wyląduj", None),
+    ("wyląduj przy drzewie", "wyląduj przy domu", None),
+    ("leć wolno", "leć szybko", None),
+    ("leć 5 m na północ, potem 3 m na wschód", "leć 3 m na północ, potem 5 m na wschód", None),
+    ("leć 5 m na północ", "leć 5 m na południe", None),
+    ("leć 5 m na północ", "nie leć 5 m na północ", None),
+    ("wznieś się o 2 m", "obniż się o 2 m", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=0.9, help="PlanCache semantic threshold")
+    parser.add_argument("--repeat", type=int, default=500, help="lookups per case")
+    parser.add_argument("--verbose", action="store_true", help="print the result of every case")
+    args = parser.parse_args()
+
+    mismatches = 0
+    timings = []
+    for stored, command, expected in CASES:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            cache = PlanCache(threshold=args.threshold)
+            cache.store(stored, None, [{"id": 1, "cel": stored}])
+            _, hit = cache.lookup(command)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                cache.lookup(command)
+            timings.append((time.perf_counter() - start) / args.repeat * 1e6)
+        if hit != expected:
+            mismatches += 1
+            print(f"MISMATCH {command!r} after {stored!r}: got {hit}, expected {expected}")
+        elif args.verbose:
+            print(f"{command!r:60} -> {hit}")
+
+    print(f"cases        {len(CASES)}")
+    print(f"mismatches   {mismatches}")
+    print(f"lookup time  mean {statistics.mean(timings):.1f}us  max {max(timings):.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+MissionPlanner memory: chat-history tokens per prompt over a long session.
+
+Each simulated mission is one operator turn with the planner's reply and one
+Guardian report per step, saved the way MissionPlannerAgent saves them. The
+history the conversational agent and plan_mission would receive is measured
+with the unbounded ConversationBufferMemory and with BudgetedMemory.
+
+Run from the repository root:
+    python -m benchmarks.planner_memory_bench
+"""
+import argparse
+
+from langchain.memory import ConversationBufferMemory
+
+from agents.planner_memory import BudgetedMemory, count_tokens
+
+COMMANDS = [
+    "Wystartuj i leć 10m na zachód, potem wyląduj.",
+    "Sprawdź, czy przy domu stoi osoba, a jeśli tak to obniż lot o 1m.",
+    "Leć 20 metrów na północ i wróć.",
+    "Wyląduj.",
+]
+STEPS = ["Wystartuj", "Leć 10m na zachód", "Jeśli widzisz dom to obniż lot o 1m", "Wyląduj"]
+
+
+def simulate_mission(memory, n, steps_per_mission):
+    command = COMMANDS[n % len(COMMANDS)]
+    memory.save_context({"input": command}, {"output": "Planowanie misji zostało zlecone. Misja zostanie wykonana."})
+    for i in range(steps_per_mission):
+        step = STEPS[i % len(STEPS)]
+        if (n + i) % 7 == 0:
+            entry = (f"REJECTED (failed) MISSION STEP: Step: {step} | Action: fly_to | "
+                     f"Parameters: [0.0, -10.0, 0.0] | Validation: Przeszkoda na trasie.")
+        else:
+            entry = (f"EXECUTED MISSION STEP: Step: {step} | Action: fly_to | "
+                     f"Parameters: [0.0, -10.0, 0.0] | Validation: OK")
+        memory.save_context({"input": entry}, {"output": ""})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--missions", type=int, default=200, help="missions in the simulated session")
+    parser.add_argument("--steps", type=int, default=5, help="Guardian reports per mission")
+    parser.add_argument("--memory-tokens", type=int, default=1500, help="BudgetedMemory budget for the agent prompt")
+    parser.add_argument("--plan-tokens", type=int, default=600, help="history budget for the plan_mission prompt")
+    args = parser.parse_args()
+
+    buffer = ConversationBufferMemory(return_messages=True, memory_key="chat_history")
+    budgeted = BudgetedMemory(return_messages=True, memory_key="chat_history", max_tokens=args.memory_tokens)
+
+    checkpoints = sorted({1, 10, 50, args.missions} | set(range(100, args.missions, 100)))
+    print(f"{'missions':>8} {'buffer':>9} {'budgeted agent':>15} {'budgeted plan':>14}")
+    for n in range(1, args.missions + 1):
+        simulate_mission(buffer, n, args.steps)
+        simulate_mission(budgeted, n, args.steps)
+        if n in checkpoints:
+            full = count_tokens(buffer.load_memory_variables({})["chat_history"])
+            agent = count_tokens(budgeted.load_memory_variables({})["chat_history"])
+            plan = count_tokens(budgeted.messages_within(args.plan_tokens))
+            print(f"{n:>8} {full:>9} {agent:>15} {plan:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Threaded MessagePool vs. multi-process broker: mission latency and CPU use.
+
+The LLM and drone calls are replaced by CPU-bound stand-ins (JSON round-trips
+and base64 encoding of a camera-sized payload), which is the part of each
+agent that contends for the GIL.
+
+Run from the repository root:
+    python -m benchmarks.pool_backend_bench
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import resource
+import statistics
+import threading
+import time
+
+from agents.message_broker import RemoteMessagePool, start_broker
+from agents.message_pool import MessagePool
+
+FRAME = bytes(range(256)) * 2048  # ~512 kB, roughly one camera JPEG
+DOCUMENT = {"messages": [{"role": "assistant", "content": "Leć 10m na zachód " * 20}] * 20}
+
+
+def cpu_work(units):
+    for _ in range(units):
+        base64.b64encode(FRAME)
+        json.loads(json.dumps(DOCUMENT))
+
+
+def _pending(msg):
+    return not msg["content"].get("executed")
+
+
+def _missing_vision(msg):
+    return msg["content"].get("vision_context") is None
+
+
+def _ready_mission(msg):
+    return not msg["content"].get("executed") and msg["content"].get("vision_context") is not None
+
+
+def planner_stage(pool, units):
+    while True:
+        for msg in pool.subscribe("plan_mission", _pending):
+            cpu_work(units)
+            steps = [{"id": i + 1, "cel": "Leć 10m na zachód"} for i in range(msg["content"]["steps"])]
+            pool.mark_executed(msg["id"])
+            pool.post(pool.build_message("mission_steps", {
+                "mission": msg["content"]["mission"], "mission_plan": steps,
+                "vision_context": None, "executed": False,
+            }))
+
+
+def vision_stage(pool, units):
+    while True:
+        for msg in pool.subscribe("mission_steps", _missing_vision):
+            cpu_work(units)
+            pool.update(msg["id"], vision_context="Duży obiekt na wprost.")
+
+
+def navigator_stage(pool, units):
+    while True:
+        for msg in pool.subscribe("mission_steps", _ready_mission):
+            for step in msg["content"]["mission_plan"]:
+                cpu_work(units)
+                pool.post(pool.build_message("drone_action", {
+                    "mission": msg["content"]["mission"], "step": step,
+                    "action": "fly_to", "parameters": [0.0, -10.0, 0.0], "executed": False,
+                }))
+            pool.mark_executed(msg["id"])
+
+
+def guardian_stage(pool, units):
+    while True:
+        for msg in pool.subscribe("drone_action", _pending):
+            cpu_work(units)
+            pool.mark_executed(msg["id"])
+            pool.post(pool.build_message("guardian_validation", {
+                "mission": msg["content"]["mission"], "validation": "OK", "logged": False,
+            }))
+
+
+STAGES = {
+    "planner": planner_stage,
+    "vision": vision_stage,
+    "navigator": navigator_stage,
+    "guardian": guardian_stage,
+}
+
+
+def run_stage_process(name, address, units):
+    STAGES[name](RemoteMessagePool(address), units)
+
+
+def drive(pool, missions, steps):
+    """Post all missions and return per-mission latency in seconds."""
+    started = {}
+    remaining = {}
+    latencies = []
+    for mission in range(missions):
+        started[mission] = time.perf_counter()
+        remaining[mission] = steps
+        pool.post(pool.build_message("plan_mission", {"mission": mission, "steps": steps, "executed": False}))
+    while remaining:
+        for msg in pool.subscribe("guardian_validation", lambda m: not m["content"].get("logged")):
+            pool.update(msg["id"], logged=True)
+            mission = msg["content"]["mission"]
+            remaining[mission] -= 1
+            if remaining[mission] == 0:
+                latencies.append(time.perf_counter() - started[mission])
+                del remaining[mission]
+    return latencies
+
+
+def cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_threads(args):
+    pool = MessagePool()
+    for name, stage in STAGES.items():
+        threading.Thread(target=stage, args=(pool, args.units), name=name, daemon=True).start()
+    cpu_before = cpu_seconds(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    latencies = drive(pool, args.missions, args.steps)
+    wall = time.perf_counter() - start
+    return latencies, wall, cpu_seconds(resource.RUSAGE_SELF) - cpu_before
+
+
+def run_processes(args):
+    cpu_before = cpu_seconds(resource.RUSAGE_SELF) + cpu_seconds(resource.RUSAGE_CHILDREN)
+    broker = start_broker(compact_interval=0)
+    workers = [
+        multiprocessing.Process(target=run_stage_process, args=(name, broker.address, args.units), daemon=True)
+        for name in STAGES
+    ]
+    for worker in workers:
+        worker.start()
+    pool = RemoteMessagePool(broker.address)
+    start = time.perf_counter()
+    latencies = drive(pool, args.missions, args.steps)
+    wall = time.perf_counter() - start
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    broker.shutdown()
+    cpu_after = cpu_seconds(resource.RUSAGE_SELF) + cpu_seconds(resource.RUSAGE_CHILDREN)
+    return latencies, wall, cpu_after - cpu_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--missions", type=int, default=8, help="missions posted at once")
+    parser.add_argument("--steps", type=int, default=5, help="steps per mission")
+    parser.add_argument("--units", type=int, default=4, help="CPU work units per agent hand-off")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'mean latency':>13} {'p95 latency':>12} {'wall':>8} {'cpu':>8}")
+    for mode, runner in (("threads", run_threads), ("processes", run_processes)):
+        latencies, wall, cpu = runner(args)
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"{mode:<10} {statistics.mean(latencies) * 1000:>11.1f}ms {p95 * 1000:>10.1f}ms "
+              f"{wall:>7.2f}s {cpu:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Navigator fast path: how many planner steps the local grammar translates, and how fast.
+
+The corpus mirrors what MissionPlannerAgent produces. Each entry carries the
+expected actions (None when the step has to go to the LLM), so a grammar
+change that parses a step differently shows up as a mismatch.
+
+Run from the repository root:
+    python -m benchmarks.step_grammar_bench
+"""
+import argparse
+import statistics
+import time
+
+from agents.step_grammar import parse_step
+
+CORPUS = [
+    ("Wystartuj", [("takeoff", 2.0)]),
+    ("Wystartuj.", [("takeoff", 2.0)]),
+    ("Wystartuj na wysokość 5m", [("takeoff", 5.0)]),
+    ("Start na 10 metrów", [("takeoff", 10.0)]),
+    ("Leć 10m na zachód", [("fly_to", [0.0, -10.0, 0.0])]),
+    ("Leć 10 m na wschód", [("fly_to", [0.0, 10.0, 0.0])]),
+    ("Leć na północ 20 metrów", [("fly_to", [20.0, 0.0, 0.0])]),
+    ("Przeleć 15 metrów na południe", [("fly_to", [-15.0, 0.0, 0.0])]),
+    ("Leć 2,5 m w kierunku zachodnim", [("fly_to", [0.0, -2.5, 0.0])]),
+    ("Poleć 5 metrów na północny wschód", [("fly_to", [3.536, 3.536, 0.0])]),
+    ("Przesuń się 50 cm na południe", [("fly_to", [-0.5, 0.0, 0.0])]),
+    ("Leć w górę 3m", [("fly_to", [0.0, 0.0, -3.0])]),
+    ("Leć 2 metry w dół", [("fly_to", [0.0, 0.0, 2.0])]),
+    ("Obniż lot o 1m", [("fly_to", [0.0, 0.0, 1.0])]),
+    ("Wznieś się o 4 metry", [("fly_to", [0.0, 0.0, -4.0])]),
+    ("Wyląduj", [("land", None)]),
+    ("Wyląduj.", [("land", None)]),
+    ("Lądowanie", [("land", None)]),
+    ("Wystartuj i leć 10m na północ", [("takeoff", 2.0), ("fly_to", [10.0, 0.0, 0.0])]),
+    ("Leć 5m na wschód, a następnie wyląduj", [("fly_to", [0.0, 5.0, 0.0]), ("land", None)]),
+    ("Leć 5m na wschód a potem wyląduj", [("fly_to", [0.0, 5.0, 0.0]), ("land", None)]),
+    ("Wystartuj, potem leć 3 m na południe", [("takeoff", 2.0), ("fly_to", [-3.0, 0.0, 0.0])]),
+    # Conditional or underspecified steps stay with the LLM
+    ("Jeśli widzisz dom to obniż lot o 1m", None),
+    ("Gdy zobaczysz osobę, wyląduj", None),
+    ("Leć do przodu", None),
+    ("Leć na zachód", None),
+    # Absolute altitudes depend on where the drone is
+    ("Wznieś się na wysokość 10m", None),
+    ("Obniż lot do 2 m", None),
+    ("Wznieś się do wysokości 20 m", None),
+    ("Zniż się do 1,5 metra", None),
+    ("Zwiększ wysokość o 2 m", None),
+    ("Obniż wysokość lotu o 1 m", None),
+    ("Okrąż budynek", None),
+    ("Leć 10m w stronę drzewa", None),
+    ("Zrób zdjęcie", None),
+    ("Wróć do punktu startu", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="parses per corpus entry")
+    parser.add_argument("--verbose", action="store_true", help="print the parse of every step")
+    args = parser.parse_args()
+
+    parsed = mismatches = 0
+    timings = []
+    for step, expected in CORPUS:
+        result = parse_step(step)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            parse_step(step)
+        timings.append((time.perf_counter() - start) / args.repeat * 1e6)
+        parsed += result is not None
+        if result != expected:
+            mismatches += 1
+            print(f"MISMATCH {step!r}: got {result}, expected {expected}")
+        elif args.verbose:
+            print(f"{step!r:45} -> {result}")
+
+    coverage = parsed / len(CORPUS)
+    print(f"steps        {len(CORPUS)}")
+    print(f"parsed       {parsed} ({coverage:.0%}), {len(CORPUS) - parsed} left to the LLM")
+    print(f"mismatches   {mismatches}")
+    print(f"parse time   mean {statistics.mean(timings):.1f}us  max {max(timings):.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Streaming mission planning: time-to-first-step vs. time-to-full-plan.
+
+A planner answer is replayed as a token stream at a fixed rate. In blocking
+mode the plan is parsed when the last token arrives; in streaming mode
+JSONArrayStream posts each step to the MessagePool as soon as it closes. A
+consumer subscribed to mission_steps records when it first sees a step.
+
+Run from the repository root:
+    python -m benchmarks.streaming_plan_bench
+"""
+import argparse
+import json
+import threading
+import time
+
+from agents.json_stream import JSONArrayStream
+from agents.message_pool import MessagePool
+
+STEPS = ["Wystartuj", "Leć 10m na zachód", "Jeśli widzisz dom to obniż lot o 1m",
+         "Leć 5m na północ", "Wyląduj"]
+
+
+def plan_answer(steps):
+    items = ",\n".join(json.dumps({"id": i + 1, "cel": cel}, ensure_ascii=False) for i, cel in enumerate(steps))
+    return f"[\n{items}\n]"
+
+
+def token_stream(text, chars_per_token, token_seconds):
+    for i in range(0, len(text), chars_per_token):
+        time.sleep(token_seconds)
+        yield text[i:i + chars_per_token]
+
+
+def plan_blocking(pool, tokens):
+    plan = json.loads("".join(tokens))
+    pool.post(pool.build_message("mission_steps", {"mission_plan": plan, "plan_complete": True}))
+
+
+def plan_streaming(pool, tokens):
+    parser = JSONArrayStream()
+    mission_msg = None
+    plan = []
+    for chunk in tokens:
+        steps = parser.feed(chunk)
+        if not steps:
+            continue
+        plan.extend(steps)
+        if mission_msg is None:
+            mission_msg = pool.build_message("mission_steps", {"mission_plan": list(plan), "plan_complete": False})
+            pool.post(mission_msg)
+        else:
+            pool.update(mission_msg["id"], mission_plan=list(plan))
+    pool.update(mission_msg["id"], plan_complete=True)
+
+
+def run(planner, args):
+    pool = MessagePool()
+    seen = {}
+    start = time.perf_counter()
+
+    def consumer():
+        pool.subscribe("mission_steps")
+        seen["first_step"] = time.perf_counter() - start
+        pool.subscribe("mission_steps", lambda msg: msg["content"]["plan_complete"])
+        seen["full_plan"] = time.perf_counter() - start
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    tokens = token_stream(plan_answer(STEPS * args.repeat), args.chars_per_token, args.token_ms / 1000)
+    planner(pool, tokens)
+    thread.join()
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--token-ms", type=float, default=20.0, help="delay between streamed tokens")
+    parser.add_argument("--chars-per-token", type=int, default=4, help="characters per streamed token")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat the 5-step sample plan")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'first step':>11} {'full plan':>10}")
+    for mode, planner in (("blocking", plan_blocking), ("streaming", plan_streaming)):
+        seen = run(planner, args)
+        print(f"{mode:<10} {seen['first_step']:>10.2f}s {seen['full_plan']:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
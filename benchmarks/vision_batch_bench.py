@@ -0,0 +1,118 @@
+"""
+Batched vision: N camera frames in one request against N single-frame calls.
+
+The frames are views of one scene (the camera frame shifted and mirrored,
+like after yaw changes), prepared with the FrameSettings given on the command
+line. For each N the same frames are described three ways through a real
+VisionAgent:
+
+  sequential  N describe_frame() calls one after another
+  parallel    N describe_frame() calls at once (the LLM scheduler still caps
+              concurrent calls per model, see --llm-concurrency)
+  batched     one describe_frames() request with per-frame labels
+
+and the wall time and time per frame of each is reported. Without --live
+the vision LLM is a ModelledVisionModel (benchmarks/e2e/stub_llm.py) whose
+latency is a fixed --llm-latency plus image upload, image tokens and
+generated tokens; with --live the real vision model is called (needs
+OPENAI_API_KEY). Needs OpenCV.
+
+Run from the repository root:
+    python -m benchmarks.vision_batch_bench
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents import llm_registry, llm_scheduler
+from agents.frame_cache import opencv_available
+from agents.frame_prep import FrameSettings
+from agents.vision_agent import VisionAgent
+from benchmarks.e2e.stub_llm import ModelledVisionModel
+
+if opencv_available():
+    import cv2
+    import numpy as np
+
+
+def views(image, count):
+    """``count`` JPEG views of the scene: the frame shifted by a step per view, every other one mirrored."""
+    frames = []
+    for i in range(count):
+        view = np.roll(image, i * image.shape[1] // 8, axis=1)
+        if i % 2:
+            view = cv2.flip(view, 1)
+        frames.append(cv2.imencode(".jpg", view, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return frames
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run_count(agent, frames):
+    labels = [f"yaw {i * 45}°" for i in range(len(frames))]
+    sequential, _ = timed(lambda: [agent.describe_frame(frame) for frame in frames])
+    with ThreadPoolExecutor(max_workers=len(frames)) as executor:
+        parallel, _ = timed(lambda: list(executor.map(agent.describe_frame, frames)))
+    batched, result = timed(agent.describe_frames, frames, labels)
+    described = sum(entry["description"] is not None for entry in result["frames"])
+    return {"frames": len(frames), "sequential": sequential, "parallel": parallel, "batched": batched,
+            "described": described}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default="person_img.jpeg", help="camera frame")
+    parser.add_argument("--resolution", default="1280x720", help="camera resolution the frame is scaled to")
+    parser.add_argument("--frames", type=int, nargs="+", default=[1, 2, 4, 8], help="frames per request")
+    parser.add_argument("--max-side", type=int, default=512, help="FrameSettings max width and height")
+    parser.add_argument("--quality", type=int, default=70, help="FrameSettings JPEG quality")
+    parser.add_argument("--detail", choices=("auto", "low", "high"), default="low", help="OpenAI image detail")
+    parser.add_argument("--live", action="store_true", help="call the real vision model instead of the modelled one")
+    parser.add_argument("--llm-concurrency", type=int, default=llm_scheduler.DEFAULT_CONCURRENCY,
+                        help="concurrent calls per model allowed by the LLM scheduler")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="modelled seconds per call")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="modelled upload bandwidth")
+    parser.add_argument("--ms-per-token", type=float, default=0.5, help="modelled prefill time per image token")
+    parser.add_argument("--ms-per-output-token", type=float, default=15.0,
+                        help="modelled generation time per output token")
+    parser.add_argument("--verbose", action="store_true", help="show the agent's output")
+    args = parser.parse_args()
+    if not opencv_available():
+        sys.exit("OpenCV (cv2) is not installed")
+
+    image = cv2.imread(args.image)
+    if image is None:
+        sys.exit(f"Cannot read {args.image}")
+    width, height = (int(value) for value in args.resolution.split("x"))
+    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_CUBIC)
+    if not args.live:
+        llm_registry.use_model_factory(lambda model, **options: ModelledVisionModel(
+            model_name=model, latency=args.llm_latency, uplink_mbps=args.uplink_mbps,
+            ms_per_token=args.ms_per_token, ms_per_output_token=args.ms_per_output_token))
+    llm_scheduler.configure(default_concurrency=args.llm_concurrency)
+    settings = FrameSettings(max_width=args.max_side, max_height=args.max_side, quality=args.quality,
+                             detail=args.detail)
+    agent = VisionAgent(frame_cache=False, frame_settings=settings, local_perception=False)
+
+    print(f"{args.image} at {width}x{height}, sent as {settings}{'' if args.live else ', modelled LLM'}\n")
+    print(f"{'N':>3} {'sequential':>11} {'parallel':>9} {'batched':>9} {'per frame: single':>18} "
+          f"{'batched':>8} {'speedup':>8} {'split':>6}")
+    for count in args.frames:
+        with open(os.devnull, "w") as devnull, contextlib.ExitStack() as stack:
+            if not args.verbose:
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            row = run_count(agent, views(image, count))
+        print(f"{count:>3} {row['sequential']:>10.2f}s {row['parallel']:>8.2f}s {row['batched']:>8.2f}s "
+              f"{row['sequential'] / count:>17.2f}s {row['batched'] / count:>7.2f}s "
+              f"{row['sequential'] / row['batched']:>7.1f}x {row['described']:>3}/{count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -290,13 +290,36 @@ def telemetry():
         'flight_mode': flight_mode
     })
 
+def prepare_image(image, args):
+    """Crop (roi=x0,y0,x1,y1 fractions), grayscale (gray=1) and downscale (width, height) the image."""
+    roi = args.get('roi')
+    if roi:
+        x0, y0, x1, y1 = (float(v) for v in roi.split(','))
+        h, w = image.shape[:2]
+        image = image[int(y0 * h):max(int(y1 * h), int(y0 * h) + 1), int(x0 * w):max(int(x1 * w), int(x0 * w) + 1)]
+    if args.get('gray') in ('1', 'true') and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = image.shape[:2]
+    max_width = args.get('width', type=int)
+    max_height = args.get('height', type=int)
+    scale = min(max_width / w if max_width else 1.0, max_height / h if max_height else 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return image
+
 @app.route('/camera_image', methods=['GET'])
 def camera_image():
     global camera_node
     if camera_node is None or camera_node.current_image is None:
         return jsonify({'error': 'No image available'}), 404
+    try:
+        image = prepare_image(camera_node.current_image, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    quality = request.args.get('quality', type=int)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality else []
     # Encode the current image as JPEG
-    ret, jpeg = cv2.imencode('.jpg', camera_node.current_image)
+    ret, jpeg = cv2.imencode('.jpg', image, params)
     if not ret:
         return jsonify({'error': 'Failed to encode image'}), 500
     return Response(jpeg.tobytes(), mimetype='image/jpeg')
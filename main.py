@@ -1,5 +1,15 @@
+import argparse
+import asyncio
+import multiprocessing
 import threading
 from agents.message_pool import MessagePool
+from agents.message_journal import MessageJournal
+from agents.plan_cache import PlanCache
+from agents.frame_prep import DETAIL_LEVELS, PREPARE_ON, FrameSettings, parse_roi
+from agents.scene_prefetch import MAX_STALENESS, ScenePrefetch
+from agents import llm_metrics, llm_registry, llm_scheduler
+from agents.message_broker import start_broker, run_agent, RemoteMessagePool
+from agents.async_runtime import run_agents
 from agents.mission_planner import MissionPlannerAgent
 from agents.vision_agent import VisionAgent
 from agents.navigator import NavigatorAgent
@@ -20,18 +30,188 @@ logging.getLogger("langchain").setLevel(logging.ERROR)
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-if __name__ == "__main__":
-    # run_mission("Leć do przodu i wyląduj.", image_path="person_img.jpeg")
-    message_pool = MessagePool()
-    
+POOL_RETENTION = {"type_caps": {"guardian_validation": 500}}
+
+
+def create_pool(args):
+    journal = MessageJournal(args.journal) if args.journal else None
+    message_pool = MessagePool(journal=journal, **POOL_RETENTION)
+    message_pool.start_compactor(interval=5.0)
+    if args.journal:
+        print(f"[MESSAGE POOL] Restored {len(message_pool)} messages from {args.journal}")
+    return message_pool
+
+
+def create_plan_cache(args):
+    if args.no_plan_cache:
+        return False
+    return PlanCache(path=args.plan_cache)
+
+
+def create_frame_cache(args):
+    # None lets VisionAgent build its default FrameCache
+    return False if args.no_frame_cache else None
+
+
+def create_local_perception(args):
+    # None lets VisionAgent build its default LocalPerception
+    return False if args.no_local_perception else None
+
+
+def create_frame_settings(args):
+    return FrameSettings(max_width=args.frame_width, max_height=args.frame_height, quality=args.frame_quality,
+                         roi=args.frame_roi, grayscale=args.frame_gray, detail=args.image_detail,
+                         prepare_on=args.prepare_frames_on)
+
+
+def create_prefetch(args):
+    if args.prefetch_vision is None:
+        return None
+    return ScenePrefetch(interval=args.prefetch_vision or None, max_staleness=args.vision_max_age)
+
+
+def parse_rate_limits(specs):
+    """{model: {"rpm": ..., "tpm": ...}} from MODEL=RPM[:TPM] arguments."""
+    limits = {}
+    for spec in specs:
+        model, _, rates = spec.partition("=")
+        rpm, _, tpm = rates.partition(":")
+        limits[model] = {"rpm": float(rpm) if rpm else None, "tpm": float(tpm) if tpm else None}
+    return limits
+
+
+def start_threads(args):
+    message_pool = create_pool(args)
+
     guardian_agent = GuardianAgent(message_pool)
     guardian_agent.start()
-    navigator_agent = NavigatorAgent(message_pool)
+    navigator_agent = NavigatorAgent(message_pool, pipelined=args.pipelined, speculative=args.speculative)
     navigator_agent.start()
-    vision_agent = VisionAgent(message_pool)
+    vision_agent = VisionAgent(message_pool, frame_cache=create_frame_cache(args),
+                               frame_settings=create_frame_settings(args),
+                               local_perception=create_local_perception(args),
+                               prefetch=create_prefetch(args))
     vision_agent.start()
-    
-    time.sleep(1)
-    mp = MissionPlannerAgent(message_pool)
-    mp.run()
+    return message_pool
+
+
+def start_processes(args):
+    # The broker process owns the pool; each agent gets its own interpreter
+    broker = start_broker(journal_dir=args.journal, **POOL_RETENTION)
+    agent_kwargs = {NavigatorAgent: {"pipelined": args.pipelined, "speculative": args.speculative},
+                    VisionAgent: {"frame_cache": create_frame_cache(args),
+                                  "frame_settings": create_frame_settings(args),
+                                  "local_perception": create_local_perception(args),
+                                  "prefetch": create_prefetch(args)}}
+    for agent_class in (GuardianAgent, NavigatorAgent, VisionAgent):
+        multiprocessing.Process(
+            target=run_agent,
+            args=(agent_class, broker.address),
+            kwargs=agent_kwargs.get(agent_class, {}),
+            name=agent_class.__name__,
+            daemon=True,
+        ).start()
+    return RemoteMessagePool(broker.address)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drone mission agents")
+    parser.add_argument("--journal", metavar="DIR",
+                        help="journal the message pool to DIR and resume unfinished missions from it")
+    navigation = parser.add_mutually_exclusive_group()
+    navigation.add_argument("--pipelined", action="store_true",
+                            help="translate all steps of a mission concurrently and post their actions in step order")
+    navigation.add_argument("--speculative", action="store_true",
+                            help="translate the next step while Guardian validates the current one; "
+                                 "rejected steps are translated again with the reason")
+    parser.add_argument("--plan-cache", metavar="FILE",
+                        help="keep cached mission plans in FILE across runs")
+    parser.add_argument("--no-plan-cache", action="store_true",
+                        help="always ask the LLM for a new mission plan")
+    parser.add_argument("--no-frame-cache", action="store_true",
+                        help="describe every camera frame, even when the scene has not changed")
+    parser.add_argument("--no-local-perception", action="store_true",
+                        help="ask the vision LLM about every frame, even when OpenCV alone can tell "
+                             "whether the way ahead is clear or blocked")
+    frames = parser.add_argument_group("camera frames sent to the vision LLM")
+    frames.add_argument("--frame-width", type=int, metavar="PX", help="scale frames down to at most PX wide")
+    frames.add_argument("--frame-height", type=int, metavar="PX", help="scale frames down to at most PX high")
+    frames.add_argument("--frame-quality", type=int, metavar="Q", help="re-encode frames at JPEG quality Q (1-100)")
+    frames.add_argument("--frame-roi", type=parse_roi, metavar="X0,Y0,X1,Y1",
+                        help="crop frames to this region, in fractions of the frame, e.g. 0,0.25,1,1")
+    frames.add_argument("--frame-gray", action="store_true", help="send grayscale frames")
+    frames.add_argument("--image-detail", choices=DETAIL_LEVELS, default="auto",
+                        help="OpenAI image detail level; low is billed 85 tokens per frame")
+    frames.add_argument("--prepare-frames-on", choices=PREPARE_ON, default="agent",
+                        help="prepare frames in the Vision agent or have /camera_image send them prepared")
+    parser.add_argument("--prefetch-vision", type=float, metavar="SECONDS",
+                        help="describe the scene in the background every SECONDS (0: only when telemetry "
+                             "shows the drone moved or turned) and attach it to missions at once")
+    parser.add_argument("--vision-max-age", type=float, default=MAX_STALENESS, metavar="SECONDS",
+                        help="with --prefetch-vision, describe the scene again when the prefetched frame is older; "
+                             "the age includes the vision LLM call")
+    parser.add_argument("--stream-plan", action="store_true",
+                        help="post mission steps while the planner LLM is still generating the plan")
+    parser.add_argument("--warm-llm", action="store_true",
+                        help="open connections to the LLM API at startup instead of on the first request")
+    parser.add_argument("--llm-concurrency", type=int, default=llm_scheduler.DEFAULT_CONCURRENCY, metavar="N",
+                        help="concurrent calls per LLM model; further calls queue by agent priority, which only "
+                             "orders calls for the same model (see --llm-total-concurrency)")
+    parser.add_argument("--llm-total-concurrency", type=int, metavar="N",
+                        help="concurrent calls across all models, e.g. per API key; when reached, waiting calls "
+                             "start by agent priority whatever their model (Guardian before Navigator)")
+    parser.add_argument("--llm-rate-limit", action="append", default=[], metavar="MODEL=RPM[:TPM]",
+                        help="requests (and tokens) per minute for MODEL, e.g. gpt-4=500:30000; repeatable")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve per-agent LLM metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-json", metavar="FILE",
+                        help="write a JSON snapshot of the LLM metrics to FILE every 10 seconds")
+    fixture = parser.add_mutually_exclusive_group()
+    fixture.add_argument("--record-llm", metavar="FILE",
+                         help="append every LLM request and response to FILE")
+    fixture.add_argument("--replay-llm", metavar="FILE",
+                         help="answer LLM requests from a FILE written by --record-llm, without network access")
+    parser.add_argument("--replay-latency", metavar="SECONDS|recorded",
+                        help="delay of each replayed LLM call (default: none)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--processes", action="store_true",
+                      help="run Guardian, Navigator and Vision in separate processes around a message broker")
+    mode.add_argument("--async", dest="use_async", action="store_true",
+                      help="run all agents as asyncio tasks on a single event loop")
+    args = parser.parse_args()
+
+    # run_mission("Leć do przodu i wyląduj.", image_path="person_img.jpeg")
+    # Before any agent asks the registry for a model; forked agent processes inherit it
+    if args.record_llm:
+        llm_registry.use_fixture("record", args.record_llm)
+    if args.replay_llm:
+        latency = args.replay_latency if args.replay_latency in (None, "recorded") else float(args.replay_latency)
+        llm_registry.use_fixture("replay", args.replay_llm, latency=latency)
+        # Nothing to warm up when no request leaves the process
+        args.warm_llm = False
+    # Forked agent processes inherit the configuration but schedule their own calls
+    llm_scheduler.configure(rate_limits=parse_rate_limits(args.llm_rate_limit),
+                            default_concurrency=args.llm_concurrency,
+                            total_concurrency=args.llm_total_concurrency)
+    # Metrics cover the agents in this process; with --processes that is the MissionPlanner
+    if args.metrics_port:
+        llm_metrics.start_http_server(args.metrics_port)
+    if args.metrics_json:
+        llm_metrics.start_snapshot_writer(args.metrics_json)
+    if args.use_async:
+        asyncio.run(run_agents(create_pool(args), pipelined=args.pipelined,
+                               plan_cache=create_plan_cache(args), streaming=args.stream_plan,
+                               warm_llm=args.warm_llm, speculative=args.speculative,
+                               frame_cache=create_frame_cache(args),
+                               frame_settings=create_frame_settings(args),
+                               local_perception=create_local_perception(args),
+                               prefetch=create_prefetch(args)))
+    else:
+        if args.warm_llm:
+            # Agent processes have their own registry; this warms the planner's and the agent threads'
+            threading.Thread(target=llm_registry.warm_up, daemon=True).start()
+        message_pool = start_processes(args) if args.processes else start_threads(args)
 
+        time.sleep(1)
+        mp = MissionPlannerAgent(message_pool, plan_cache=create_plan_cache(args), streaming=args.stream_plan)
+        mp.run()
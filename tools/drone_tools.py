@@ -1,3 +1,4 @@
+import httpx
 import requests
 
 API_URL = "http://localhost:5002"
@@ -28,4 +29,60 @@ def land():
             return "Drone landing."
         return f"Land failed: {resp.text}"
     except Exception as e:
-        return f"Land error: {e}"
\ No newline at end of file
+        return f"Land error: {e}"
+
+def succeeded(reply):
+    """True when ``reply`` of takeoff/fly_to/land (or their async variants) says the backend accepted the action."""
+    return reply in ("Drone taking off.", "Drone landing.") or reply.startswith("Drone flying to")
+
+def telemetry():
+    """Position (north, east, down), yaw and battery state from the backend, or None."""
+    try:
+        resp = requests.get(f"{API_URL}/telemetry", timeout=5)
+        return resp.json() if resp.ok else None
+    except Exception:
+        return None
+
+# --- asyncio variants (agents.async_runtime) --------------------------------
+_async_client = None
+
+def _client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(base_url=API_URL, timeout=5)
+    return _async_client
+
+async def atakeoff(altitude=2.0):
+    try:
+        resp = await _client().post("/takeoff", json={"altitude": altitude})
+        if resp.is_success:
+            return "Drone taking off."
+        return f"Takeoff failed: {resp.text}"
+    except Exception as e:
+        return f"Takeoff error: {e}"
+
+async def afly_to(parameters):
+    north, east, down = parameters
+    try:
+        resp = await _client().post("/goto_relative", json={"north": north, "east": east, "down": down})
+        if resp.is_success:
+            return f"Drone flying to (N:{north}, E:{east}, D:{down})"
+        return f"Fly to failed: {resp.text}"
+    except Exception as e:
+        return f"Fly to error: {e}"
+
+async def aland():
+    try:
+        resp = await _client().post("/land")
+        if resp.is_success:
+            return "Drone landing."
+        return f"Land failed: {resp.text}"
+    except Exception as e:
+        return f"Land error: {e}"
+
+async def atelemetry():
+    try:
+        resp = await _client().get("/telemetry")
+        return resp.json() if resp.is_success else None
+    except Exception:
+        return None